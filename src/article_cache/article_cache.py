@@ -23,4 +23,10 @@ class ArticleCache(ABC):
     is valid until datetime.now() + "ttl" timedelta
     """
     raise NotImplementedError
-  
\ No newline at end of file
+
+
+  def close(self) -> None:
+    """
+    Releases the connections and files of the cache, it isn't used after this.
+    """
+    pass
@@ -1,5 +1,8 @@
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+import fcntl
 import json
+import os
 from pathlib import Path
 from article_cache import ArticleCache
 from utils import log_utils
@@ -22,11 +25,17 @@ class FileArticleCache(ArticleCache):
     self.configure_logging(log_level)
 
     self.__cache_file_path = cache_file_path
+    # the scraper processes sharing the cache file lock this one, it has the number of times the cache file was rewritten
+    self.__lock_file_path = cache_file_path + ".lock"
     self.__cache = {} 
+    # the size and the generation of the file when it was last read, the scraper processes append to the same file
+    self.__file_size = 0
+    self.__generation = None
     self.__create_cache_file()
-    self.__load_cache()
-    # prune old entries
-    self.__recreate_cache()
+    with self.__lock(fcntl.LOCK_EX) as lock_file:
+      self.__read_changes(lock_file)
+      # prune old entries
+      self.__recreate_cache(lock_file)
   
   def __create_cache_file(self):
     file = Path(self.__cache_file_path)
@@ -34,12 +43,46 @@ class FileArticleCache(ArticleCache):
     file.touch(exist_ok=True)
     self.log.info(f"created/asserted cache file: {self.__cache_file_path}")
 
-  def __load_cache(self):
-    with open(self.__cache_file_path, "r") as f:
+  @contextmanager
+  def __lock(self, operation: int):
+    """
+    Locks the cache file for the other scraper processes, the appends and rewrites take an exclusive lock
+    so they don't drop each other's entries, reading the changes takes a shared lock so it doesn't see half a rewrite.
+    Closing the lock file releases the lock.
+    """
+    with open(self.__lock_file_path, "a+b") as lock_file:
+      fcntl.flock(lock_file, operation)
+      yield lock_file
+
+  def __load_cache(self, offset: int = 0):
+    with open(self.__cache_file_path, "rb") as f:
+      f.seek(offset)
       for line in f:
+        if not line.endswith(b"\n"):
+          # another process is still writing it
+          break
         url, exp_date = self.__parse_line(line)
         self.__cache[url] = exp_date 
+        offset += len(line)
+    self.__file_size = offset
     self.log.debug(f"loaded cache from file")
+
+  def __load_changes(self):
+    if os.stat(self.__cache_file_path).st_size != self.__file_size:
+      with self.__lock(fcntl.LOCK_SH) as lock_file:
+        self.__read_changes(lock_file)
+
+  def __read_changes(self, lock_file):
+    # load the entries stored by the other processes since the file was last read, the caller holds the lock
+    lock_file.seek(0)
+    generation = lock_file.read()
+    if generation != self.__generation:
+      # rewritten by another process
+      self.__cache = {}
+      self.__load_cache()
+      self.__generation = generation
+    elif os.stat(self.__cache_file_path).st_size > self.__file_size:
+      self.__load_cache(self.__file_size)
   
   def __parse_line(self, line: str) -> tuple[str, str]:
     try:
@@ -51,27 +94,40 @@ class FileArticleCache(ArticleCache):
       raise ValueError(f"Invalid cache file: {self.__cache_file_path}, key {e.args} not found in line {line}")
 
   def contains(self, article_url: str) -> bool:
+    self.__load_changes()
     if article_url in self.__cache:
       if self.__cache[article_url] > datetime.now():
         return True
       else:
         # trigger a prune in case the TTL has expired
         self.log.debug(f"pruning expired cache entries because of {article_url}")
-        self.__recreate_cache()
+        with self.__lock(fcntl.LOCK_EX) as lock_file:
+          self.__read_changes(lock_file)
+          self.__recreate_cache(lock_file)
     return False
   
-  def __recreate_cache(self):
+  def __recreate_cache(self, lock_file, force: bool = False):
+    # the caller holds the exclusive lock and has read the changes, so the rewrite keeps the entries of the other processes
     self.log.debug(f"recreating cache for entries with valid TTLs")
-    self.__recreate_valid_file()
-    self.__load_cache()
+    if self.__recreate_valid_file(force):
+      lock_file.seek(0)
+      generation = str(int(lock_file.read() or 0) + 1).encode()
+      lock_file.truncate(0)
+      lock_file.write(generation)
+      lock_file.flush()
+      self.__cache = {}
+      self.__load_cache()
+      self.__generation = generation
         
-  def __recreate_valid_file(self):
-    # recreates the file with only the valid entries
+  def __recreate_valid_file(self, force: bool) -> bool:
+    # recreates the file with only the valid entries, 'force' rewrites it even if none of them expired
     valid_ttls = [(url, exp_date) for url, exp_date in self.__cache.items() if exp_date > datetime.now()]
-    if len(valid_ttls) < len(self.__cache):
-      with open(self.__cache_file_path, "w") as f:
-        for url, exp_date in valid_ttls:
-          self.__write_line_to_file(f, url, exp_date)
+    if not force and len(valid_ttls) == len(self.__cache):
+      return False
+    with open(self.__cache_file_path, "w") as f:
+      for url, exp_date in valid_ttls:
+        self.__write_line_to_file(f, url, exp_date)
+    return True
 
   def store(self, article_url: str, ttl: timedelta = timedelta(weeks=1)) -> None:
     # prevent overflow
@@ -81,24 +137,27 @@ class FileArticleCache(ArticleCache):
     else:
       exp_date = datetime.now() + ttl
       
-    if article_url in self.__cache:
-      # update the cache and trigger a prune (easy fix instead of changing a specific line in the file)
-      self.log.debug(f"cache hit for {article_url}, updating cache")
-      self.__cache[article_url] = exp_date
-      self.__recreate_cache()
-    else:
-      # append to the cache file
-      self.log.debug(f"cache miss for {article_url}, appending to cache")
-      self.__cache[article_url] = exp_date
-      with open(self.__cache_file_path, "a") as f:
-        self.__write_line_to_file(f, article_url, exp_date)
+    with self.__lock(fcntl.LOCK_EX) as lock_file:
+      self.__read_changes(lock_file)
+      if article_url in self.__cache:
+        # update the cache and trigger a prune (easy fix instead of changing a specific line in the file)
+        self.log.debug(f"cache hit for {article_url}, updating cache")
+        self.__cache[article_url] = exp_date
+        self.__recreate_cache(lock_file, force=True)
+      else:
+        # append to the cache file, everything before it has just been read
+        self.log.debug(f"cache miss for {article_url}, appending to cache")
+        self.__cache[article_url] = exp_date
+        with open(self.__cache_file_path, "a") as f:
+          self.__file_size += self.__write_line_to_file(f, article_url, exp_date)
       
-  def __write_line_to_file(self, fdesc, article_url: str, exp_date: datetime) -> None:
+  def __write_line_to_file(self, fdesc, article_url: str, exp_date: datetime) -> int:
     d = {
       "url": article_url,
       "expiration_date": exp_date.isoformat()
     }
-    fdesc.write(json.dumps(d) + "\n")
+    # the json is ascii, the number of characters written is the number of bytes
+    return fdesc.write(json.dumps(d) + "\n")
   
 
 class FileArticleCacheFactory(ClickCliAware):
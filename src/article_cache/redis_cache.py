@@ -40,6 +40,9 @@ class RedisArticleCache(ArticleCache):
   def store(self, article_url: str, ttl: timedelta = timedelta(weeks=1)) -> None:
     key = f"scraper_cache:article:{article_url}"
     self.__redis.set(key, "", ex=ttl)
+
+  def close(self) -> None:
+    self.__redis.close()
   
 
 class RedisArticleCacheFactory(ClickCliAware):
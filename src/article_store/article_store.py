@@ -11,4 +11,10 @@ class ArticleStore(ABC):
     Stores the article.
     """
     raise NotImplementedError
-  
\ No newline at end of file
+
+
+  def close(self) -> None:
+    """
+    Releases the connections and files of the store, it isn't used after this.
+    """
+    pass
@@ -59,6 +59,9 @@ class MongoDBArticleStore(ArticleStore):
       self.log.error(f"error when inserting article into mongodb collection {self.collection_name}")
       raise e
 
+  def close(self) -> None:
+    self.__mc.close()
+
 
 class MongoDBArticleStoreFactory(ClickCliAware):
 
@@ -49,6 +49,9 @@ class RedisStreamArticleStore(ArticleStore):
       self.log.error(f"error when adding article to stream")
       raise e
 
+  def close(self) -> None:
+    self.__redis.close()
+
 
 class RedisStreamArticleStoreFactory(ClickCliAware):
 
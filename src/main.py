@@ -1,14 +1,23 @@
-from scraper.config import ConfigFactory
+from scraper.config import ConfigFactory, RateLimitConfig, ScheduleConfig
+from scraper.retry import RetryPolicy
 from scraper.scraper import ScrapeOptions, Scraper
 from scraper_manager.notifier import *
 import logging
 from scraper_manager import ScraperManager
+from scraper_manager.scheduler import Scheduler
 from article_cache import ArticleCacheFactory
 from article_store import ArticleStoreFactory
+from validator_cache import ValidatorCacheFactory
 from utils import log_utils
+from utils.http_utils import HttpConnectionPoolFactory, BodyPolicy
+from utils.http_archive import HttpArchiveFactory
+from scraper.parser_backend import parser_backends, default_parser_backend
 
 import click
 import multiprocessing as mp
+import signal
+import threading
+import time
 
 log = log_utils.create_console_logger("main")
 
@@ -16,6 +25,30 @@ def run_proc(**kwargs):
   
   proc_count = kwargs['processes']
 
+  # global per-host limits, scrape configs can override them
+  host_rate_limit = RateLimitConfig({
+    RateLimitConfig.prop_requests_per_second: kwargs['host_requests_per_second'],
+    RateLimitConfig.prop_burst: kwargs['host_burst'],
+    RateLimitConfig.prop_max_in_flight: kwargs['host_max_in_flight'],
+  })
+
+  retry_policy = RetryPolicy(
+    kwargs['retries'],
+    kwargs['retry_backoff'],
+    kwargs['retry_max_backoff'],
+    kwargs['retry_statuses'],
+  )
+
+  body_policy = BodyPolicy(
+    int(kwargs['max_body_size'] * 1024 * 1024),
+    kwargs['allowed_content_types'],
+  )
+
+  # 0 disables the limits
+  task_timeout = kwargs['task_timeout'] or None
+  run_timeout = kwargs['run_timeout'] or None
+  max_tasks_per_child = kwargs['max_tasks_per_child'] or None
+
   # create configs and scrape options
   config_paths = kwargs['config']
   options_list = []
@@ -28,13 +61,57 @@ def run_proc(**kwargs):
     options_kwargs = {
       "article_limit": kwargs['limit'],
       "log_level": kwargs['log_level'],
+      "fetch_concurrency": kwargs['fetch_concurrency'],
       "article_cache_factory": ArticleCacheFactory,
       "article_store_factory": ArticleStoreFactory,
+      "http_pool_factory": HttpConnectionPoolFactory,
+      "http_archive_factory": HttpArchiveFactory,
+      "validator_cache_factory": ValidatorCacheFactory,
+      "host_rate_limit": host_rate_limit,
+      "retry_policy": retry_policy,
+      "circuit_breaker_threshold": kwargs['circuit_breaker_threshold'],
+      "circuit_breaker_reset_timeout": kwargs['circuit_breaker_reset_timeout'],
+      "body_policy": body_policy,
+      "parser": kwargs['parser'],
+      "task_timeout": task_timeout,
+      "max_tasks_per_child": max_tasks_per_child,
     }
     options_list.append(options_kwargs)
   
   notifier = NotifierFactory.create()
-  ScraperManager(notifier, proc_count).scrape(config_list, options_list)
+  manager = ScraperManager(
+    notifier,
+    proc_count,
+    kwargs['parse_processes'],
+    kwargs['parse_queue_size'],
+    task_timeout,
+    run_timeout,
+  )
+  if not kwargs['daemon']:
+    manager.scrape(config_list, options_list)
+    return
+
+  # the default schedule of the configs, they can override it
+  default_schedule = ScheduleConfig({
+    ScheduleConfig.prop_interval: kwargs['interval'],
+    ScheduleConfig.prop_jitter: kwargs['interval_jitter'],
+  })
+  scheduler = Scheduler([config.schedule for config in config_list], default_schedule, time.monotonic())
+
+  # stop after the ongoing runs on SIGTERM (docker stop) or SIGINT (sent to the whole process group),
+  # the child processes inherit the handlers, so they finish their tasks too.
+  # The manager sends SIGTERM to a stuck child process, they replace that handler with their own.
+  stop_event = threading.Event()
+  def stop(signum, frame):
+    if mp.parent_process() is not None:
+      # the child processes are stopped by the manager when they finished their tasks
+      return
+    log.info(f"got signal {signum}, stopping after the ongoing runs")
+    stop_event.set()
+  signal.signal(signal.SIGTERM, stop)
+  signal.signal(signal.SIGINT, stop)
+
+  manager.scrape_periodically(config_list, options_list, scheduler, stop_event)
   
 
 def main():
@@ -55,7 +132,78 @@ def main():
       default=1,
       envvar="SCRAPER_PROCESSES",
       show_envvar=True,
-      help="Number of scraper processes to start. Upper limit is the number of available cores.",
+      help="Number of scraper processes to start, the articles are distributed among them. Upper limit is the number of available cores, unless --parse-processes is set.",
+    ),
+    click.Option(
+      param_decls=["--parse-processes"],
+      type=click.IntRange(min=0),
+      default=0,
+      show_default=True,
+      envvar="SCRAPER_PARSE_PROCESSES",
+      show_envvar=True,
+      help="Number of processes selecting the components of the articles downloaded by the scraper processes. 0 selects them in the scraper processes. Upper limit is the number of available cores.",
+    ),
+    click.Option(
+      param_decls=["--parse-queue-size"],
+      type=click.IntRange(min=1),
+      default=64,
+      show_default=True,
+      envvar="SCRAPER_PARSE_QUEUE_SIZE",
+      show_envvar=True,
+      help="Maximum number of downloaded articles waiting for the parser processes, the downloads are paused while it's full.",
+    ),
+    click.Option(
+      param_decls=["--task-timeout"],
+      type=click.FloatRange(min=0),
+      default=600,
+      show_default=True,
+      envvar="SCRAPER_TASK_TIMEOUT",
+      show_envvar=True,
+      help="Seconds after which finding the article urls of a page config or scraping an article is cancelled. A scraper process which doesn't finish a task long after that is restarted. 0 disables the limit.",
+    ),
+    click.Option(
+      param_decls=["--run-timeout"],
+      type=click.FloatRange(min=0),
+      default=0,
+      show_default=True,
+      envvar="SCRAPER_RUN_TIMEOUT",
+      show_envvar=True,
+      help="Seconds after which the unfinished articles of a run are abandoned, the 'done' notification is sent with the articles scraped so far. 0 disables the limit.",
+    ),
+    click.Option(
+      param_decls=["--max-tasks-per-child"],
+      type=click.IntRange(min=0),
+      default=0,
+      show_default=True,
+      envvar="SCRAPER_MAX_TASKS_PER_CHILD",
+      show_envvar=True,
+      help="Number of tasks after which a scraper process is replaced by a new one, which frees the memory it accumulated. 0 disables the limit.",
+    ),
+    click.Option(
+      param_decls=["--daemon"],
+      is_flag=True,
+      default=False,
+      envvar="SCRAPER_DAEMON",
+      show_envvar=True,
+      help="Keep running and scrape the configs periodically instead of once, the processes, connections and caches are reused between the runs.",
+    ),
+    click.Option(
+      param_decls=["--interval"],
+      type=click.FloatRange(min=1),
+      default=300,
+      show_default=True,
+      envvar="SCRAPER_INTERVAL",
+      show_envvar=True,
+      help="Seconds between the runs of a config in daemon mode. Can be overridden by 'schedule' in the config file.",
+    ),
+    click.Option(
+      param_decls=["--interval-jitter"],
+      type=click.FloatRange(min=0),
+      default=30,
+      show_default=True,
+      envvar="SCRAPER_INTERVAL_JITTER",
+      show_envvar=True,
+      help="Maximum random delay of the runs in daemon mode in seconds, so the configs don't all run at once. Can be overridden by 'schedule' in the config file.",
     ),
     click.Option(
       param_decls=["-l", "--limit"],
@@ -64,6 +212,124 @@ def main():
       show_envvar=True,
       help="Limits the number of articles to scrape. By default all articles will be scraped.",
     ),
+    click.Option(
+      param_decls=["--fetch-concurrency"],
+      type=click.IntRange(min=1),
+      default=1,
+      show_default=True,
+      envvar="SCRAPER_FETCH_CONCURRENCY",
+      show_envvar=True,
+      help="Maximum number of pages downloaded concurrently by one scraper process. 1 downloads pages one at a time.",
+    ),
+    click.Option(
+      param_decls=["--host-requests-per-second"],
+      type=click.FloatRange(min=0),
+      default=0,
+      show_default=True,
+      envvar="SCRAPER_HOST_REQUESTS_PER_SECOND",
+      show_envvar=True,
+      help="Average number of requests per second sent to a single host. 0 disables the limit. Can be overridden by 'rate_limit' in the config file. The pages of a limited host are all downloaded by the same scraper process.",
+    ),
+    click.Option(
+      param_decls=["--host-burst"],
+      type=click.IntRange(min=1),
+      default=1,
+      show_default=True,
+      envvar="SCRAPER_HOST_BURST",
+      show_envvar=True,
+      help="Number of requests which can be sent to a single host at once before --host-requests-per-second applies.",
+    ),
+    click.Option(
+      param_decls=["--host-max-in-flight"],
+      type=click.IntRange(min=0),
+      default=4,
+      show_default=True,
+      envvar="SCRAPER_HOST_MAX_IN_FLIGHT",
+      show_envvar=True,
+      help="Maximum number of concurrent requests sent to a single host. 0 disables the limit. The pages of a limited host are all downloaded by the same scraper process.",
+    ),
+    click.Option(
+      param_decls=["--retries"],
+      type=click.IntRange(min=0),
+      default=2,
+      show_default=True,
+      envvar="SCRAPER_RETRIES",
+      show_envvar=True,
+      help="Number of times a failed request is retried.",
+    ),
+    click.Option(
+      param_decls=["--retry-backoff"],
+      type=click.FloatRange(min=0),
+      default=1,
+      show_default=True,
+      envvar="SCRAPER_RETRY_BACKOFF",
+      show_envvar=True,
+      help="Base of the exponential backoff between retries in seconds, the actual waits are randomized (jitter).",
+    ),
+    click.Option(
+      param_decls=["--retry-max-backoff"],
+      type=click.FloatRange(min=0),
+      default=30,
+      show_default=True,
+      envvar="SCRAPER_RETRY_MAX_BACKOFF",
+      show_envvar=True,
+      help="Maximum wait between retries in seconds. Requests with a longer Retry-After are not retried.",
+    ),
+    click.Option(
+      param_decls=["--retry-statuses"],
+      type=click.INT,
+      multiple=True,
+      default=RetryPolicy.default_retry_statuses,
+      show_default=True,
+      envvar="SCRAPER_RETRY_STATUSES",
+      show_envvar=True,
+      help="Http status codes which are retried, connection errors and timeouts are always retried.",
+    ),
+    click.Option(
+      param_decls=["--circuit-breaker-threshold"],
+      type=click.IntRange(min=0),
+      default=5,
+      show_default=True,
+      envvar="SCRAPER_CIRCUIT_BREAKER_THRESHOLD",
+      show_envvar=True,
+      help="Number of consecutive failed requests after which a host is not requested anymore. 0 disables the circuit breaker.",
+    ),
+    click.Option(
+      param_decls=["--circuit-breaker-reset-timeout"],
+      type=click.FloatRange(min=0),
+      default=60,
+      show_default=True,
+      envvar="SCRAPER_CIRCUIT_BREAKER_RESET_TIMEOUT",
+      show_envvar=True,
+      help="Seconds after which a single request is sent again to a host cut off by the circuit breaker.",
+    ),
+    click.Option(
+      param_decls=["--max-body-size"],
+      type=click.FloatRange(min=0, min_open=True),
+      default=BodyPolicy.default_max_size / (1024 * 1024),
+      show_default=True,
+      envvar="SCRAPER_MAX_BODY_SIZE",
+      show_envvar=True,
+      help="Maximum size of a decompressed response body in MiB, larger downloads are aborted.",
+    ),
+    click.Option(
+      param_decls=["--allowed-content-types"],
+      multiple=True,
+      default=BodyPolicy.default_content_types,
+      show_default=True,
+      envvar="SCRAPER_ALLOWED_CONTENT_TYPES",
+      show_envvar=True,
+      help="Content types of the html pages which are downloaded, other responses are closed before reading their body. Feeds and sitemaps accept xml content types.",
+    ),
+    click.Option(
+      param_decls=["--parser"],
+      type=click.Choice(parser_backends.keys()),
+      default=default_parser_backend,
+      show_default=True,
+      envvar="SCRAPER_PARSER",
+      show_envvar=True,
+      help="Html parser used to build the trees the selectors are applied to, lxml is faster. Can be overridden by 'parser' in the config file.",
+    ),
     click.Option(
       param_decls=["--log-level"],
       type=click.Choice([l for l in logging._nameToLevel.keys()]),
@@ -78,7 +344,10 @@ def main():
   # register any other cli options defined by the plugins, also configure the plugins
   opts.extend(ArticleCacheFactory.register_cli_options())
   opts.extend(ArticleStoreFactory.register_cli_options())
+  opts.extend(ValidatorCacheFactory.register_cli_options())
   opts.extend(NotifierFactory.register_cli_options())
+  opts.extend(HttpConnectionPoolFactory.register_cli_options())
+  opts.extend(HttpArchiveFactory.register_cli_options())
 
   # create and run the command by using a callback
   cmd = click.Command(
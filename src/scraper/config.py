@@ -1,6 +1,9 @@
 import json
+import re
 import yaml
 import jsonpath_ng.ext as jsonpath_ng_ext
+from scraper.parser_backend import parser_backends
+from scraper.feed_parser import feed_content_types
 
 
 # TODO: use pydantic models instead of implementing the same thing, but worse... 
@@ -34,6 +37,10 @@ class ConfigValidator:
     if len(value) == 0:
       raise ConfigValidationException(f"'{property}' field must not be empty")
 
+  def must_be_at_least(property: str, value, minimum):
+    if value < minimum:
+      raise ConfigValidationException(f"'{property}' field must be at least {minimum}")
+
 
 class ConfigValidationException(Exception):
   pass
@@ -46,12 +53,14 @@ class Config:
     "version": "1.0.0",
     "pages": ScrapeConfig[],
     <optional> "common_selectors": CommonComponentSelectorsConfig,
+    <optional> "schedule": ScheduleConfig,
   }
   """
 
   prop_version = "version"
   prop_pages = "pages"
   prop_common_selectors = "common_selectors"
+  prop_schedule = "schedule"
 
   def __init__(self, config: dict, file_path: str = None):
 
@@ -83,6 +92,14 @@ class Config:
     self.common_selectors = CommonComponentSelectorsConfig(common_selectors)
     print(self.common_selectors.common_selectors)
 
+    # how often the config is scraped in daemon mode, the global defaults are used if it's empty
+    schedule = config.get(Config.prop_schedule)
+    if schedule is not None:
+      ConfigValidator.must_have_type(Config.prop_schedule, schedule, dict)
+      self.schedule = ScheduleConfig(schedule)
+    else:
+      self.schedule = None
+
     # check for loops after initializing everything
     for sc in self.scrape_configs:
       self.check_loops(sc.selectors)
@@ -147,14 +164,35 @@ class ScrapeConfig:
     <optional> "metadata": dict,
     "urls": [str],
     "url_selectors": ComponentSelector,
+    ---------------------------- OR (the article urls are the links of the html pages)
+    "links": LinksConfig,
+    ---------------------------- OR (the urls are RSS/Atom feeds or sitemaps instead of html pages)
+    "feed": FeedConfig,
     "selectors": ComponentSelector,
+    <optional> "rate_limit": RateLimitConfig,
+    <optional> "parser": "html.parser" | "lxml",
+    <optional> "partial_parse": bool,
+    <optional> "incremental_parse": bool,
   }
+  "parser" overrides the parser backend of the run for the pages of this config.
+  "partial_parse" only parses the elements matched by the top-level selector of "selectors" and "url_selectors"
+  if it's a simple selector like 'div.article', which is much faster for large pages. It should only be enabled 
+  if the child selectors don't depend on the ancestors of the top-level element.
+  "incremental_parse" parses the articles while they are downloaded, and stops downloading them as soon as 
+  the result of "selectors" can't change anymore, e.g. when all 'select: first' selectors found their match.
+  Only the html.parser backend parses incrementally.
   """
 
   prop_metadata = "metadata"
   prop_urls = "urls"
   prop_url_selectors = "url_selectors"
+  prop_links = "links"
+  prop_feed = "feed"
   prop_selectors = "selectors"
+  prop_rate_limit = "rate_limit"
+  prop_parser = "parser"
+  prop_partial_parse = "partial_parse"
+  prop_incremental_parse = "incremental_parse"
 
   def __init__(self, scrape_config_dict: dict):
     # metadata
@@ -168,18 +206,168 @@ class ScrapeConfig:
     ConfigValidator.must_not_be_empty(ScrapeConfig.prop_urls, self.urls)
     ConfigValidator.iterable_must_have_types(ScrapeConfig.prop_urls, self.urls, [str])
 
-    # url selectors
-    url_selectors = scrape_config_dict.get(ScrapeConfig.prop_url_selectors)
-    ConfigValidator.must_not_be_none(ScrapeConfig.prop_url_selectors, url_selectors)
-    ConfigValidator.must_not_be_empty(ScrapeConfig.prop_url_selectors, url_selectors)
-    ConfigValidator.must_have_type(ScrapeConfig.prop_url_selectors, url_selectors, dict) 
-    self.url_selectors = ComponentSelectorConfig(url_selectors)
+    # feed, if present the article urls are read from feeds or sitemaps instead of using url selectors
+    feed = scrape_config_dict.get(ScrapeConfig.prop_feed)
+    if feed is not None:
+      ConfigValidator.must_have_type(ScrapeConfig.prop_feed, feed, dict)
+      self.feed = FeedConfig(feed)
+      self.links = None
+      self.url_selectors = None
+    elif scrape_config_dict.get(ScrapeConfig.prop_links) is not None:
+      # links, the article urls are the links of the pages instead of the ones found by the url selectors
+      links = scrape_config_dict.get(ScrapeConfig.prop_links)
+      ConfigValidator.must_have_type(ScrapeConfig.prop_links, links, dict)
+      self.feed = None
+      self.links = LinksConfig(links)
+      self.url_selectors = None
+    else:
+      self.feed = None
+      self.links = None
+
+      # url selectors
+      url_selectors = scrape_config_dict.get(ScrapeConfig.prop_url_selectors)
+      ConfigValidator.must_not_be_none(ScrapeConfig.prop_url_selectors, url_selectors)
+      ConfigValidator.must_not_be_empty(ScrapeConfig.prop_url_selectors, url_selectors)
+      ConfigValidator.must_have_type(ScrapeConfig.prop_url_selectors, url_selectors, dict) 
+      self.url_selectors = ComponentSelectorConfig(url_selectors)
 
     # selectors object
     selectors = scrape_config_dict.get(ScrapeConfig.prop_selectors)
     ConfigValidator.must_have_type(ScrapeConfig.prop_selectors, selectors, dict)
     self.selectors = ComponentSelectorConfig(selectors)
 
+    # per-host rate limits, the global defaults are used if it's empty
+    rate_limit = scrape_config_dict.get(ScrapeConfig.prop_rate_limit)
+    if rate_limit is not None:
+      ConfigValidator.must_have_type(ScrapeConfig.prop_rate_limit, rate_limit, dict)
+      self.rate_limit = RateLimitConfig(rate_limit)
+    else:
+      self.rate_limit = None
+
+    # parser backend, the one of the run is used if it's empty
+    self.parser = scrape_config_dict.get(ScrapeConfig.prop_parser)
+    if self.parser is not None:
+      ConfigValidator.must_have_value(ScrapeConfig.prop_parser, self.parser, list(parser_backends.keys()))
+
+    # partial parsing, false by default
+    self.partial_parse = scrape_config_dict.get(ScrapeConfig.prop_partial_parse, False)
+    ConfigValidator.must_have_type(ScrapeConfig.prop_partial_parse, self.partial_parse, bool)
+
+    # incremental parsing, false by default
+    self.incremental_parse = scrape_config_dict.get(ScrapeConfig.prop_incremental_parse, False)
+    ConfigValidator.must_have_type(ScrapeConfig.prop_incremental_parse, self.incremental_parse, bool)
+
+
+class FeedConfig:
+  """
+  {
+    <optional> "max_age_hours": int | float,
+    <optional> "content_types": [str],
+  }
+  The urls of the scrape config are RSS or Atom feeds, sitemaps or sitemap indexes, gzipped sitemaps (.xml.gz) too.
+  Entries which are older than "max_age_hours" based on their 
+  pubDate/updated/lastmod dates are skipped, all entries are used by default.
+  "content_types" are the accepted Content-Types of the responses, the xml and gzip ones by default,
+  an empty list accepts all of them.
+  """
+
+  prop_max_age_hours = "max_age_hours"
+  prop_content_types = "content_types"
+
+  def __init__(self, config: dict):
+    self.max_age_hours = config.get(FeedConfig.prop_max_age_hours)
+    if self.max_age_hours is not None:
+      ConfigValidator.must_have_types(FeedConfig.prop_max_age_hours, self.max_age_hours, [int, float])
+      ConfigValidator.must_be_at_least(FeedConfig.prop_max_age_hours, self.max_age_hours, 0)
+
+    self.content_types = config.get(FeedConfig.prop_content_types, feed_content_types)
+    ConfigValidator.must_have_type(FeedConfig.prop_content_types, self.content_types, list)
+    ConfigValidator.iterable_must_have_types(FeedConfig.prop_content_types, self.content_types, [str])
+    self.content_types = [t.lower() for t in self.content_types]
+
+
+class LinksConfig:
+  """
+  {
+    <optional> "container": str,
+  }
+  The article urls are the links (<a href>) of the html pages, resolved against the url of the page.
+  If "container" is a css selector, only the links inside the elements matching it are used.
+  Simple containers like 'main', 'div.articles' or '#news' are matched without building the tree of the page,
+  which is much faster than "url_selectors" for pages with lots of links.
+  """
+
+  prop_container = "container"
+
+  def __init__(self, config: dict):
+    self.container = config.get(LinksConfig.prop_container)
+    if self.container is not None:
+      ConfigValidator.must_have_type(LinksConfig.prop_container, self.container, str)
+      ConfigValidator.must_not_be_empty(LinksConfig.prop_container, self.container.strip())
+
+
+class RateLimitConfig:
+  """
+  {
+    <optional> "requests_per_second": int | float,
+    <optional> "burst": int,
+    <optional> "max_in_flight": int,
+  }
+  Limits the requests sent to a single host. 
+  Missing fields fall back to the global defaults, 0 means no limit.
+  """
+
+  prop_requests_per_second = "requests_per_second"
+  prop_burst = "burst"
+  prop_max_in_flight = "max_in_flight"
+
+  def __init__(self, config: dict):
+    # requests per second refilling the token bucket
+    self.requests_per_second = config.get(RateLimitConfig.prop_requests_per_second)
+    if self.requests_per_second is not None:
+      ConfigValidator.must_have_types(RateLimitConfig.prop_requests_per_second, self.requests_per_second, [int, float])
+      ConfigValidator.must_be_at_least(RateLimitConfig.prop_requests_per_second, self.requests_per_second, 0)
+
+    # size of the token bucket, the number of requests which can be sent at once after being idle
+    self.burst = config.get(RateLimitConfig.prop_burst)
+    if self.burst is not None:
+      ConfigValidator.must_have_type(RateLimitConfig.prop_burst, self.burst, int)
+      ConfigValidator.must_be_at_least(RateLimitConfig.prop_burst, self.burst, 1)
+
+    # number of concurrent requests
+    self.max_in_flight = config.get(RateLimitConfig.prop_max_in_flight)
+    if self.max_in_flight is not None:
+      ConfigValidator.must_have_type(RateLimitConfig.prop_max_in_flight, self.max_in_flight, int)
+      ConfigValidator.must_be_at_least(RateLimitConfig.prop_max_in_flight, self.max_in_flight, 0)
+
+
+class ScheduleConfig:
+  """
+  {
+    <optional> "interval": int | float,
+    <optional> "jitter": int | float,
+  }
+  In daemon mode the config is scraped every "interval" seconds, each run is delayed by a random
+  number of seconds up to "jitter", so the configs with the same interval don't all run at once.
+  Missing fields fall back to the global defaults.
+  """
+
+  prop_interval = "interval"
+  prop_jitter = "jitter"
+
+  def __init__(self, config: dict):
+    # seconds between the starts of two runs
+    self.interval = config.get(ScheduleConfig.prop_interval)
+    if self.interval is not None:
+      ConfigValidator.must_have_types(ScheduleConfig.prop_interval, self.interval, [int, float])
+      ConfigValidator.must_be_at_least(ScheduleConfig.prop_interval, self.interval, 1)
+
+    # maximum random delay of a run in seconds
+    self.jitter = config.get(ScheduleConfig.prop_jitter)
+    if self.jitter is not None:
+      ConfigValidator.must_have_types(ScheduleConfig.prop_jitter, self.jitter, [int, float])
+      ConfigValidator.must_be_at_least(ScheduleConfig.prop_jitter, self.jitter, 0)
+
 
 class CommonComponentSelectorsConfig:
   """
@@ -477,3 +665,35 @@ class RegexModifierConfig:
     else:
       # by default return the original string
       self.return_type = RegexModifierConfig.prop_return_original
+
+    # compile the patterns here, so they are validated with the config and compiled only once
+    self.patterns = [RegexModifierConfig._compile(pattern) for pattern in self.regex]
+
+    # only "original" doesn't care which pattern matched, so its patterns can be searched in a single pass
+    self.combined_pattern = None
+    if self.return_type == RegexModifierConfig.prop_return_original and len(self.patterns) > 1:
+      self.combined_pattern = RegexModifierConfig._combine(self.patterns)
+
+  @staticmethod
+  def _compile(pattern: str) -> re.Pattern:
+    try:
+      return re.compile(pattern)
+    except re.error as e:
+      raise ConfigValidationException(f"'{RegexModifierConfig.prop_regex}' field has an invalid pattern: {pattern}, {e}")
+
+  @staticmethod
+  def _combine(patterns: list[re.Pattern]) -> re.Pattern | None:
+    """
+    Returns a single alternation matching wherever any of the patterns match, 
+    or None if the patterns can't be merged without changing their meaning.
+    """
+    default_flags = re.compile("").flags
+    for pattern in patterns:
+      # group numbers and names would clash, global flags would apply to all the patterns
+      if pattern.groups > 0 or pattern.flags != default_flags:
+        return None
+
+    try:
+      return re.compile("|".join(f"(?:{pattern.pattern})" for pattern in patterns))
+    except re.error:
+      return None
@@ -0,0 +1,182 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import xml.etree.ElementTree as ET
+import zlib
+from dateutil.parser import isoparse
+from utils.http_utils import HttpResponse, HttpException, BodyTooLargeException
+
+
+class FeedEntry:
+  """
+  A link found in a feed or sitemap, 'is_sitemap' is true
+  for the entries of sitemap indexes, which point to other sitemaps.
+  """
+
+  def __init__(self, url: str, date: datetime | None, is_sitemap: bool = False):
+    self.url = url
+    self.date = date
+    self.is_sitemap = is_sitemap
+
+
+# content types feeds and sitemaps are served with, gzipped sitemaps (.xml.gz) have the gzip ones
+feed_content_types = [
+  "application/xml",
+  "text/xml",
+  "application/rss+xml",
+  "application/atom+xml",
+  "application/rdf+xml",
+  "application/gzip",
+  "application/x-gzip",
+]
+
+_gzip_magic = b"\x1f\x8b"
+# the largest piece a compressed chunk is decompressed into at once
+_gzip_output_size = 64 * 1024
+
+# elements containing a single entry
+_rss_item = "item"
+_atom_entry = "entry"
+_sitemap_url = "url"
+_sitemap_index_entry = "sitemap"
+
+# date elements of the entries, in order of preference
+_date_tags = {
+  _rss_item: ["pubDate", "date"],
+  _atom_entry: ["updated", "published"],
+  _sitemap_url: ["lastmod", "publication_date"],
+  _sitemap_index_entry: ["lastmod"],
+}
+
+
+def read_feed(res: HttpResponse, max_size: int = None, content_types: list[str] = feed_content_types) -> list[FeedEntry]:
+  """
+  Parses an RSS/Atom feed, sitemap or sitemap index while it's being downloaded.
+  The elements of an entry are discarded as soon as the entry is read.
+  Gzipped files, e.g. 'sitemap.xml.gz', are decompressed, 'max_size' limits their decompressed size too.
+  """
+  res.check_content_type(content_types)
+  parser = ET.XMLPullParser(events=("end",))
+  entries = []
+  for chunk in _iter_decompressed(res.iter_chunks(max_size), res.url, max_size):
+    parser.feed(chunk)
+    _collect_entries(parser, entries)
+  parser.close()
+  _collect_entries(parser, entries)
+  return entries
+
+
+def _iter_decompressed(chunks, url: str, max_size: int | None):
+  """
+  Yields the chunks as they are, or decompressed if they are a gzip file. A gzipped body isn't
+  a Content-Encoding, the http response only removes that one.
+  """
+  decompressor = None
+  head = b""
+  size = 0
+  try:
+    for chunk in chunks:
+      if decompressor is None:
+        head += chunk
+        if len(head) < len(_gzip_magic):
+          continue
+        if not head.startswith(_gzip_magic):
+          yield head
+          yield from chunks
+          return
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        chunk = head
+
+      # limit the output, a small compressed chunk can decompress to a lot of data
+      while chunk:
+        data = decompressor.decompress(chunk, _gzip_output_size)
+        chunk = decompressor.unconsumed_tail
+        size += len(data)
+        if max_size is not None and size > max_size:
+          raise BodyTooLargeException(url, max_size)
+        yield data
+
+    if decompressor is None:
+      # shorter than the magic number
+      if head:
+        yield head
+      return
+
+    data = decompressor.flush()
+    size += len(data)
+    if max_size is not None and size > max_size:
+      raise BodyTooLargeException(url, max_size)
+    yield data
+  except zlib.error as e:
+    raise HttpException(f"failed to decompress gzipped feed {url}: {e}")
+
+
+def _collect_entries(parser: ET.XMLPullParser, entries: list[FeedEntry]) -> None:
+  for _, elem in parser.read_events():
+    tag = _local_name(elem.tag)
+    if tag not in _date_tags:
+      continue
+
+    url = _get_entry_url(tag, elem)
+    if url is not None:
+      entries.append(FeedEntry(url, _get_entry_date(tag, elem), tag == _sitemap_index_entry))
+    elem.clear()
+
+
+def _local_name(tag: str) -> str:
+  # strip the namespace, e.g. '{http://www.w3.org/2005/Atom}entry'
+  return tag.rsplit("}", 1)[-1]
+
+
+def _find_text(elem: ET.Element, name: str) -> str | None:
+  for child in elem.iter():
+    if child is not elem and _local_name(child.tag) == name and child.text is not None and child.text.strip():
+      return child.text.strip()
+  return None
+
+
+def _get_entry_url(tag: str, elem: ET.Element) -> str | None:
+  if tag == _atom_entry:
+    for child in elem:
+      if _local_name(child.tag) == "link" and child.get("rel", "alternate") == "alternate" and child.get("href"):
+        return child.get("href")
+    return None
+
+  if tag == _rss_item:
+    link = _find_text(elem, "link")
+    if link is not None:
+      return link
+    # guids are permalinks by default
+    for child in elem:
+      if _local_name(child.tag) == "guid" and child.get("isPermaLink", "true") == "true" and child.text:
+        return child.text.strip()
+    return None
+
+  return _find_text(elem, "loc")
+
+
+def _get_entry_date(tag: str, elem: ET.Element) -> datetime | None:
+  for name in _date_tags[tag]:
+    text = _find_text(elem, name)
+    if text is None:
+      continue
+    date = parse_feed_date(text)
+    if date is not None:
+      return date
+  return None
+
+
+def parse_feed_date(text: str) -> datetime | None:
+  """
+  Parses RFC 822 (RSS) and ISO 8601 (Atom, sitemaps) dates, dates without a timezone are treated as UTC.
+  """
+  try:
+    date = parsedate_to_datetime(text)
+  except (TypeError, ValueError):
+    try:
+      date = isoparse(text)
+    except ValueError:
+      return None
+
+  if date.tzinfo is None:
+    date = date.replace(tzinfo=timezone.utc)
+  return date
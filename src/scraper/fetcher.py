@@ -0,0 +1,92 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from utils import http_utils
+from scraper.config import RateLimitConfig
+from scraper.host_scheduler import HostScheduler
+from scraper.retry import RetryPolicy, CircuitBreaker
+
+
+class AsyncFetcher:
+  """
+  Downloads pages concurrently from an asyncio event loop.
+
+  The blocking http calls are run on a thread pool and share the connections
+  of 'http_pool', 'concurrency' limits the number of downloads that can be 
+  in flight at the same time. Requests to the same host are also limited by
+  the per-host limits of 'host_scheduler'.
+
+  Failed requests are retried according to 'retry_policy', and hosts failing 
+  repeatedly are cut off by 'circuit_breaker' instead of waiting for every timeout.
+  """
+
+  def __init__(
+      self, 
+      http_pool: http_utils.HttpConnectionPool, 
+      concurrency: int = 1,
+      host_scheduler: HostScheduler = None,
+      retry_policy: RetryPolicy = None,
+      circuit_breaker: CircuitBreaker = None,
+  ):
+    if concurrency < 1:
+      raise ValueError(f"fetch concurrency must be at least 1, provided: {concurrency}")
+
+    self.http_pool = http_pool
+    self.concurrency = concurrency
+    self.host_scheduler = host_scheduler if host_scheduler is not None else HostScheduler()
+    self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy(max_retries=0)
+    self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker(failure_threshold=0)
+    self.__semaphore = asyncio.Semaphore(concurrency)
+    self.__executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="fetcher")
+
+  async def fetch(
+      self, 
+      url: str, 
+      headers: dict[str, str] = None, 
+      rate_limit: RateLimitConfig = None,
+      read_body = http_utils.HttpResponse.text,
+  ) -> http_utils.Page:
+    """
+    Downloads 'url', 'read_body' is called with the HttpResponse on the fetcher's thread pool 
+    and its return value becomes the content of the page.
+    """
+    attempt = 0
+    while True:
+      trial = self.circuit_breaker.check(url)
+      try:
+        page = await self.__fetch_once(url, headers, rate_limit, read_body)
+        self.circuit_breaker.record_success(url)
+        return page
+      except Exception as e:
+        if self.retry_policy.is_retryable(e):
+          self.circuit_breaker.record_failure(url)
+        elif isinstance(e, http_utils.HttpStatusException):
+          # the host is up, it just doesn't have the page
+          self.circuit_breaker.record_success(url)
+
+        delay = self.retry_policy.get_delay(attempt, e)
+        if delay is None:
+          raise
+      finally:
+        # cancelled, or failed with an error which says nothing about the host
+        if trial:
+          self.circuit_breaker.release_trial(url)
+      
+      await asyncio.sleep(delay)
+      attempt += 1
+
+  async def __fetch_once(
+      self, 
+      url: str, 
+      headers: dict[str, str] = None, 
+      rate_limit: RateLimitConfig = None,
+      read_body = http_utils.HttpResponse.text,
+  ) -> http_utils.Page:
+    # wait for the host before taking a global slot, 
+    # so requests to other hosts can go ahead in the meantime
+    async with self.host_scheduler.slot(url, rate_limit):
+      async with self.__semaphore:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.__executor, http_utils.fetch, url, self.http_pool, headers, read_body)
+
+  def close(self) -> None:
+    self.__executor.shutdown(wait=True)
@@ -0,0 +1,96 @@
+import asyncio
+import contextlib
+import time
+from urllib.parse import urlparse
+from scraper.config import RateLimitConfig
+
+
+class TokenBucket:
+  """
+  Allows 'rate' requests per second on average, and at most 'capacity' requests at once.
+  """
+
+  def __init__(self, rate: float, capacity: int):
+    self.rate = rate
+    self.capacity = capacity
+    self.tokens = capacity
+    self.updated = time.monotonic()
+
+  def take(self) -> float:
+    """
+    Takes a token and returns 0 if one is available, 
+    otherwise returns the number of seconds until the next token.
+    """
+    now = time.monotonic()
+    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+    self.updated = now
+
+    if self.tokens >= 1:
+      self.tokens -= 1
+      return 0
+    return (1 - self.tokens) / self.rate
+
+
+class _HostState:
+
+  def __init__(self, requests_per_second: float, burst: int, max_in_flight: int):
+    self.bucket = TokenBucket(requests_per_second, burst) if requests_per_second > 0 else None
+    self.in_flight = asyncio.Semaphore(max_in_flight) if max_in_flight > 0 else None
+
+
+class HostScheduler:
+  """
+  Limits the requests sent to every host with a token bucket and a maximum number of requests in flight.
+
+  The limits of a host are decided by its first request: the limits of the 
+  request's scrape config, falling back to 'default_limits' for missing values.
+  """
+
+  def __init__(self, default_limits: RateLimitConfig = None):
+    self.default_limits = default_limits if default_limits is not None else RateLimitConfig({})
+    self.__hosts: dict[str, _HostState] = {}
+
+  @contextlib.asynccontextmanager
+  async def slot(self, url: str, limits: RateLimitConfig = None):
+    """
+    Waits until a request can be sent to the host of 'url' without exceeding its limits.
+    The request is counted as in flight until the context is exited.
+    """
+    host = self.__get_host_state(url, limits)
+
+    if host.in_flight is not None:
+      await host.in_flight.acquire()
+    try:
+      if host.bucket is not None:
+        wait = host.bucket.take()
+        while wait > 0:
+          await asyncio.sleep(wait)
+          wait = host.bucket.take()
+      yield
+    finally:
+      if host.in_flight is not None:
+        host.in_flight.release()
+
+  def __get_host_state(self, url: str, limits: RateLimitConfig = None) -> _HostState:
+    host = urlparse(url).netloc.lower()
+    state = self.__hosts.get(host)
+    if state is None:
+      state = _HostState(
+        self.__get_limit(limits, "requests_per_second", 0),
+        self.__get_limit(limits, "burst", 1),
+        self.__get_limit(limits, "max_in_flight", 0),
+      )
+      self.__hosts[host] = state
+    return state
+
+  def is_limited(self, limits: RateLimitConfig = None) -> bool:
+    """
+    Tells if the requests to a host with the 'limits' of a scrape config are limited by the rate or the number in flight.
+    """
+    return self.__get_limit(limits, "requests_per_second", 0) > 0 or self.__get_limit(limits, "max_in_flight", 0) > 0
+
+  def __get_limit(self, limits: RateLimitConfig, name: str, no_limit):
+    for l in [limits, self.default_limits]:
+      if l is not None and getattr(l, name) is not None:
+        return getattr(l, name)
+    return no_limit
@@ -0,0 +1,224 @@
+from html.parser import HTMLParser
+import re
+from typing import Iterator
+from urllib.parse import urljoin, urldefrag, urlsplit
+from lxml import etree
+import soupsieve
+from scraper.parser_backend import get_parser_backend, default_parser_backend, LxmlParserBackend
+
+
+# elements which never have an end tag
+_void_elements = {
+  "area", "base", "br", "col", "embed", "hr", "img", "input",
+  "link", "meta", "param", "source", "track", "wbr",
+}
+
+# simple selectors which can be matched on the start tags: tag, tag.class, tag#id, .class.other_class, ...
+_simple_selector_pattern = re.compile(r"^(?P<tag>[a-zA-Z][\w-]*)?(?P<rest>(?:[.#][\w-]+)*)$")
+
+
+class SimpleSelector:
+  """
+  A css selector made of a tag name, an id and classes, which can be tested on a start tag.
+  """
+
+  def __init__(self, tag: str | None, id: str | None, classes: set[str]):
+    self.tag = tag
+    self.id = id
+    self.classes = classes
+
+  @staticmethod
+  def parse(css_selector: str) -> "SimpleSelector | None":
+    """
+    Returns the simple selector, or None if the css selector is more complex than that.
+    """
+    match = _simple_selector_pattern.match(css_selector.strip())
+    if match is None or match.group("tag") is None and match.group("rest") == "":
+      return None
+
+    id = None
+    classes = set()
+    for part in re.findall(r"[.#][\w-]+", match.group("rest")):
+      if part.startswith("#"):
+        if id is not None and id != part[1:]:
+          # can't match anything, leave it to soupsieve
+          return None
+        id = part[1:]
+      else:
+        classes.add(part[1:])
+
+    tag = match.group("tag").lower() if match.group("tag") is not None else None
+    return SimpleSelector(tag, id, classes)
+
+  def matches(self, tag: str, attrs) -> bool:
+    if self.tag is not None and self.tag != tag:
+      return False
+    if self.id is not None and self.id != attrs.get("id"):
+      return False
+    if self.classes:
+      return self.classes.issubset((attrs.get("class") or "").split())
+    return True
+
+
+class LinkCollector:
+  """
+  Collects the resolved href attributes of the <a> elements from the start and end tags of a document.
+  If 'container' is set, only the links inside the elements matching it are collected.
+  It's the parser target of lxml, and html.parser is adapted to it by HtmlParserLinkFeeder.
+  """
+
+  def __init__(self, base_url: str, container: SimpleSelector | None = None):
+    self.container = container
+    self.__links = []
+    self.__set_base_url(base_url)
+    self.__has_base = False
+    # names of the open elements, and the positions of the open containers among them
+    self.__open_tags = []
+    self.__open_containers = []
+
+  def start(self, tag: str, attrs) -> None:
+    if tag == "a":
+      if self.container is None or len(self.__open_containers) > 0:
+        self.__add_link(attrs.get("href"))
+    elif tag == "base" and not self.__has_base and attrs.get("href"):
+      # only the first <base> counts
+      self.__has_base = True
+      self.__set_base_url(urljoin(self.base_url, attrs["href"].strip()))
+
+    if tag in _void_elements or self.container is None:
+      return
+
+    if self.container.matches(tag, attrs):
+      self.__open_containers.append(len(self.__open_tags))
+    self.__open_tags.append(tag)
+
+  def end(self, tag: str) -> None:
+    if self.container is None:
+      return
+
+    # close the element and the ones left open inside it, stray end tags are ignored
+    for i in range(len(self.__open_tags) - 1, -1, -1):
+      if self.__open_tags[i] == tag:
+        del self.__open_tags[i:]
+        while len(self.__open_containers) > 0 and self.__open_containers[-1] >= i:
+          self.__open_containers.pop()
+        return
+
+  def close(self) -> None:
+    pass
+
+  def pop_links(self) -> list[str]:
+    """
+    Returns the links collected since the last call.
+    """
+    links = self.__links
+    self.__links = []
+    return links
+
+  def __set_base_url(self, base_url: str) -> None:
+    self.base_url = base_url
+    parts = urlsplit(base_url)
+    self.__origin = f"{parts.scheme}://{parts.netloc}" if parts.scheme in ("http", "https") else None
+
+  def __add_link(self, href: str | None) -> None:
+    if href is None:
+      return
+    href = href.strip()
+    if href == "" or href.startswith("#"):
+      return
+
+    if href.startswith("/") and not href.startswith("//") and self.__origin is not None \
+        and "/." not in href and "#" not in href:
+      # the most common case, a path on the same host, which urljoin would just append to the origin
+      self.__links.append(self.__origin + href)
+      return
+
+    url = urljoin(self.base_url, href)
+    if "#" in url:
+      url, _ = urldefrag(url)
+    if url.startswith("http://") or url.startswith("https://"):
+      self.__links.append(url)
+
+
+class HtmlParserLinkFeeder(HTMLParser):
+  """
+  Feeds the tags parsed by html.parser to a LinkCollector, without building a tree.
+  """
+
+  def __init__(self, collector: LinkCollector):
+    super().__init__(convert_charrefs=True)
+    self.collector = collector
+
+  def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+    self.collector.start(tag, dict(attrs))
+
+  def handle_startendtag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+    # a self-closing tag doesn't open anything
+    self.collector.start(tag, dict(attrs))
+    if tag not in _void_elements:
+      self.collector.end(tag)
+
+  def handle_endtag(self, tag: str) -> None:
+    self.collector.end(tag)
+
+
+class LinkExtractor:
+  """
+  Extracts the article links of listing pages: the href attributes of the <a> elements,
+  optionally only the ones inside the elements matching the 'container' css selector.
+  The links are resolved against the url of the page (or its <base>),
+  links which aren't http or https and fragments are dropped.
+
+  Simple containers like 'main', 'div.articles' or '#news' are matched while the page is parsed,
+  without building a tree. Any other css selector requires building the tree with the parser backend.
+  """
+
+  # the size of the pieces the page is parsed in, between which the found links are yielded
+  chunk_size = 64 * 1024
+
+  def __init__(self, container: str | None = None):
+    self.container = container
+    self.simple_container = None
+    self.css_selector = None
+    if container is not None:
+      self.simple_container = SimpleSelector.parse(container)
+      if self.simple_container is None:
+        self.css_selector = soupsieve.compile(f":is({container}) a[href]")
+
+  def iter_links(self, html: str, base_url: str, parser: str = default_parser_backend) -> Iterator[str]:
+    """
+    Yields the links of the page in document order while it's being parsed,
+    so the rest of the page isn't parsed if the caller stops early.
+    """
+    if self.css_selector is not None:
+      yield from self.__iter_links_in_tree(html, base_url, parser)
+      return
+
+    if len(html) == 0:
+      # lxml fails on empty documents
+      return
+
+    collector = LinkCollector(base_url, self.simple_container)
+    if isinstance(get_parser_backend(parser), LxmlParserBackend):
+      # lxml calls the collector directly as its parser target
+      feeder = etree.HTMLParser(target=collector)
+    else:
+      feeder = HtmlParserLinkFeeder(collector)
+
+    for start in range(0, len(html), self.chunk_size):
+      feeder.feed(html[start:start + self.chunk_size])
+      yield from collector.pop_links()
+    feeder.close()
+    yield from collector.pop_links()
+
+  def __iter_links_in_tree(self, html: str, base_url: str, parser: str) -> Iterator[str]:
+    soup = get_parser_backend(parser).parse(html)
+    collector = LinkCollector(base_url)
+
+    base = soup.find("base", href=True)
+    if base is not None:
+      collector.start("base", {"href": base["href"]})
+
+    for a in self.css_selector.select(soup):
+      collector.start("a", {"href": a["href"]})
+      yield from collector.pop_links()
@@ -0,0 +1,116 @@
+from abc import ABC, abstractmethod
+import re
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder._htmlparser import BeautifulSoupHTMLParser
+
+
+class ParserBackend(ABC):
+  """
+  Builds the tree of an html document which the selectors are applied to.
+  All backends build BeautifulSoup trees, so css selection and the extractors work the same with each of them.
+  Only the elements matching 'parse_only' and their descendants are built if it's provided.
+  """
+
+  name: str
+
+  @abstractmethod
+  def parse(self, html: str, parse_only: SoupStrainer = None) -> BeautifulSoup:
+    raise NotImplementedError
+
+  def create_incremental_parser(self, parse_only: SoupStrainer = None) -> "IncrementalParser | None":
+    """
+    Returns a parser which builds the tree chunk by chunk, or None if the backend doesn't support it.
+    """
+    return None
+
+
+class IncrementalParser:
+  """
+  Builds the tree of a document while it's fed in chunks, the tree can be queried between the chunks.
+  Elements are added to the tree when their start tag is parsed, 'is_open' tells if their end tag was parsed too.
+  It drives the html.parser builder of bs4 through its internals, the bs4 version is pinned for it.
+  """
+
+  def __init__(self, parse_only: SoupStrainer = None):
+    # an empty document, which is left in the same state as before parsing any markup
+    self.soup = BeautifulSoup("", "html.parser", parse_only=parse_only)
+    self.soup.builder.soup = self.soup
+    args, kwargs = self.soup.builder.parser_args
+    self.__parser = BeautifulSoupHTMLParser(*args, **kwargs)
+    self.__parser.soup = self.soup
+
+  def feed(self, html: str) -> None:
+    self.__parser.feed(html)
+
+  def close(self) -> None:
+    # same as the end of BeautifulSoup's parsing, close out the unfinished strings and open tags
+    self.__parser.close()
+    self.__parser.already_closed_empty_element = []
+    self.soup.endData()
+    while self.soup.currentTag.name != self.soup.ROOT_TAG_NAME:
+      self.soup.popTag()
+
+  def get_open_elements(self) -> set[int]:
+    """
+    Returns the ids of the elements whose end tag wasn't parsed yet.
+    """
+    return {id(tag) for tag in self.soup.tagStack}
+
+
+class HtmlParserBackend(ParserBackend):
+  """
+  Python's built-in html.parser, slow but always available.
+  """
+
+  name = "html.parser"
+
+  def parse(self, html: str, parse_only: SoupStrainer = None) -> BeautifulSoup:
+    return BeautifulSoup(html, "html.parser", parse_only=parse_only)
+
+  def create_incremental_parser(self, parse_only: SoupStrainer = None) -> IncrementalParser:
+    return IncrementalParser(parse_only)
+
+
+class LxmlParserBackend(ParserBackend):
+  """
+  lxml's C parser, several times faster than html.parser.
+
+  Unlike html.parser, lxml inserts the <head> and <body> elements which are missing from the document.
+  They are unwrapped again, so selectors like '*' match the same elements as with html.parser.
+  """
+
+  name = "lxml"
+
+  _head_pattern = re.compile(r"<head[\s/>]", re.IGNORECASE)
+  _body_pattern = re.compile(r"<body[\s/>]", re.IGNORECASE)
+
+  def parse(self, html: str, parse_only: SoupStrainer = None) -> BeautifulSoup:
+    soup = BeautifulSoup(html, "lxml", parse_only=parse_only)
+    root = soup.find("html", recursive=False)
+    if root is None:
+      return soup
+
+    if self._head_pattern.search(html) is None:
+      LxmlParserBackend._unwrap_child(root, "head")
+    if self._body_pattern.search(html) is None:
+      LxmlParserBackend._unwrap_child(root, "body")
+    return soup
+
+  @staticmethod
+  def _unwrap_child(root, name: str) -> None:
+    child = root.find(name, recursive=False)
+    if child is not None:
+      child.unwrap()
+
+
+parser_backends = {
+  backend.name: backend for backend in [HtmlParserBackend(), LxmlParserBackend()]
+}
+
+default_parser_backend = HtmlParserBackend.name
+
+def get_parser_backend(name: str) -> ParserBackend:
+  backend = parser_backends.get(name)
+  if backend is None:
+    raise ValueError(f"unknown parser backend: {name}, available backends: {list(parser_backends.keys())}")
+  return backend
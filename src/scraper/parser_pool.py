@@ -0,0 +1,202 @@
+import asyncio
+import multiprocessing as mp
+import os
+import queue
+import signal
+import threading
+from scraper.config import Config
+from scraper.selector_processor import ScrapePlan, set_log_levels
+from utils import log_utils
+
+
+class ParserException(Exception):
+  """
+  Raised when the parser process failed to select the components of a page.
+  """
+  pass
+
+
+class ParserQueues:
+  """
+  The queues between the scraper processes, which download the pages, and the parser processes,
+  which select their components.
+
+  The requests are (front-end index, nonce, request id, config index, scrape config index, html, parser, partial parse)
+  tuples in a single bounded queue shared by all the parser processes, None tells a parser process to exit.
+  A scraper process waits while the queue is full, so the downloads can't run ahead of the parsing.
+  Every scraper process has its own result queue with (nonce, request id, components, error) tuples,
+  None stops the thread reading it. A restarted scraper process reads the same result queue, the nonce
+  tells its results from the late ones of the previous process, whose request ids start from 0 too.
+
+  Every parser process records the (front-end index, nonce, request id) of the page it's parsing in shared memory,
+  so the request can be failed if the process dies while parsing it.
+  """
+
+  def __init__(self, front_end_count: int, maxsize: int, parser_count: int = 1):
+    self.request_queue = mp.Queue(maxsize)
+    self.result_queues = [mp.Queue() for _ in range(front_end_count)]
+    # only written by the parser process, and only read by the manager after the process died
+    self.in_progress = [mp.RawArray("q", [-1, -1, -1]) for _ in range(parser_count)]
+
+  def set_in_progress(self, parser_index: int, front_end_index: int, nonce: int, request_id: int) -> None:
+    self.in_progress[parser_index][:] = [front_end_index, nonce, request_id]
+
+  def clear_in_progress(self, parser_index: int) -> None:
+    self.in_progress[parser_index][:] = [-1, -1, -1]
+
+  def fail_in_progress(self, parser_index: int, error: str) -> bool:
+    """
+    Sends 'error' as the result of the request the parser process was working on, returns False if there was none.
+    """
+    front_end_index, nonce, request_id = self.in_progress[parser_index]
+    if request_id < 0:
+      return False
+    self.clear_in_progress(parser_index)
+    self.result_queues[front_end_index].put((nonce, request_id, None, error))
+    return True
+
+  def close(self) -> None:
+    self.request_queue.close()
+    for q in self.result_queues:
+      q.close()
+
+
+class Parser:
+  """
+  Selects the components of the pages sent by the scraper processes, it runs in a parser process.
+  The configs are referred to by their index, every parser process receives all of them when it starts.
+  """
+
+  def __init__(self, id: str, log_level: int):
+    self.id = str(id)
+    self.log = log_utils.create_console_logger(
+      name=f"{self.__class__.__name__}-{self.id}",
+      level=log_level
+    )
+    set_log_levels(log_level)
+
+  def parse_from_queue(self, configs: list[Config], parser_queues: ParserQueues, parser_index: int = 0) -> None:
+    if threading.current_thread() is threading.main_thread():
+      # signal handlers can only be set in the main thread, it may run in a thread of its own
+      signal.signal(signal.SIGTERM, self.__exit_on_signal)
+    self.log.info("listening for pages")
+
+    # compiled when a scrape config is first needed, then reused for all of its pages
+    scrape_plans = {}
+    while True:
+      request = parser_queues.request_queue.get()
+      if request is None:
+        break
+
+      front_end_index, nonce, request_id, config_index, scrape_config_index, html, parser, partial_parse = request
+      parser_queues.set_in_progress(parser_index, front_end_index, nonce, request_id)
+      components = None
+      error = None
+      try:
+        key = (config_index, scrape_config_index)
+        if key not in scrape_plans:
+          config = configs[config_index]
+          scrape_plans[key] = ScrapePlan(config.scrape_configs[scrape_config_index], config.common_selectors)
+        components = scrape_plans[key].selectors.process_html(html, parser, partial_parse)
+      except Exception as e:
+        # the exception may not be picklable, only its message is sent back
+        self.log.exception(f"error while selecting the components of a page of config {config_index}")
+        error = f"{type(e).__name__}: {e}"
+      parser_queues.result_queues[front_end_index].put((nonce, request_id, components, error))
+      parser_queues.clear_in_progress(parser_index)
+
+    self.log.info("got None page, exiting")
+
+  def __exit_on_signal(self, signum, frame):
+    # unlike being killed, the process releases the locks of the queues on the way out
+    self.log.warning(f"got signal {signum}, exiting")
+    raise SystemExit(1)
+
+
+class AsyncParserClient:
+  """
+  Sends the pages of a scraper process to the parser processes from its asyncio event loop.
+  A thread waits for the results and resolves the futures of the requests on the loop.
+  The manager fails the requests of the parser processes which died, a request without
+  a result after 'result_timeout' seconds, e.g. one lost with its process, fails too.
+  """
+
+  # seconds between trying to send a page while the request queue is full
+  poll_interval = 0.05
+  # seconds to wait for the result of a page after it was sent
+  result_timeout = 120
+
+  def __init__(self, parser_queues: ParserQueues, front_end_index: int):
+    self.parser_queues = parser_queues
+    self.front_end_index = front_end_index
+    # tells the results of this process from the ones of the previous process with the same front-end index
+    self.__nonce = os.getpid()
+    self.__loop = None
+    self.__futures = {}
+    self.__next_request_id = 0
+    self.__thread = None
+
+  def start(self) -> None:
+    self.__loop = asyncio.get_running_loop()
+    self.__thread = threading.Thread(target=self.__read_results, name="parser-results", daemon=True)
+    self.__thread.start()
+
+  async def parse(
+      self,
+      config_index: int,
+      scrape_config_index: int,
+      html: str,
+      parser: str,
+      partial_parse: bool,
+  ) -> dict | None:
+    """
+    Returns the components of the page selected by the scrape plan of the scrape config, see SelectorProcessor.process_html.
+    """
+    request_id = self.__next_request_id
+    self.__next_request_id += 1
+    future = self.__loop.create_future()
+    self.__futures[request_id] = future
+
+    request = (self.front_end_index, self.__nonce, request_id, config_index, scrape_config_index, html, parser, partial_parse)
+    try:
+      while True:
+        try:
+          self.parser_queues.request_queue.put_nowait(request)
+          break
+        except queue.Full:
+          await asyncio.sleep(self.poll_interval)
+
+      try:
+        components, error = await asyncio.wait_for(future, self.result_timeout)
+      except asyncio.TimeoutError:
+        raise ParserException(f"no result from the parser processes in {self.result_timeout} seconds")
+    finally:
+      self.__futures.pop(request_id, None)
+
+    if error is not None:
+      raise ParserException(error)
+    return components
+
+  def close(self) -> None:
+    if self.__thread is None:
+      return
+    self.parser_queues.result_queues[self.front_end_index].put(None)
+    self.__thread.join()
+    self.__thread = None
+
+  def __read_results(self) -> None:
+    result_queue = self.parser_queues.result_queues[self.front_end_index]
+    while True:
+      result = result_queue.get()
+      if result is None:
+        return
+      nonce, request_id, components, error = result
+      if nonce != self.__nonce:
+        # sent to the previous process, it was restarted before getting it
+        continue
+      self.__loop.call_soon_threadsafe(self.__resolve, request_id, components, error)
+
+  def __resolve(self, request_id: int, components: dict | None, error: str | None) -> None:
+    future = self.__futures.get(request_id)
+    if future is not None and not future.done():
+      future.set_result((components, error))
@@ -0,0 +1,120 @@
+import random
+import time
+from http import client
+from urllib.parse import urlparse
+from utils.http_utils import HttpException, HttpStatusException
+
+
+class CircuitOpenException(HttpException): pass
+
+
+class RetryPolicy:
+  """
+  Decides if a failed request should be retried, and how long to wait before that.
+
+  Waits are exponential backoffs with full jitter, 
+  unless the server asked for a specific wait with Retry-After.
+  """
+
+  default_retry_statuses = [429, 500, 502, 503, 504]
+
+  def __init__(
+      self, 
+      max_retries: int = 2, 
+      backoff: float = 1, 
+      max_backoff: float = 30, 
+      retry_statuses: list[int] = default_retry_statuses,
+  ):
+    self.max_retries = max_retries
+    self.backoff = backoff
+    self.max_backoff = max_backoff
+    self.retry_statuses = set(retry_statuses)
+
+  def is_retryable(self, error: Exception) -> bool:
+    if isinstance(error, HttpStatusException):
+      return error.status in self.retry_statuses
+    # connection errors and timeouts, or the connection closed in the middle of a response
+    return isinstance(error, (OSError, client.HTTPException))
+
+  def get_delay(self, attempt: int, error: Exception) -> float | None:
+    """
+    Returns the seconds to wait before retrying after the failed 'attempt' (counted from 0),
+    or None if the request shouldn't be retried.
+    """
+    if attempt >= self.max_retries or not self.is_retryable(error):
+      return None
+
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+      # don't block the run for servers asking for a long break
+      return retry_after if retry_after <= self.max_backoff else None
+
+    return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+class _Circuit:
+
+  def __init__(self):
+    self.failures = 0
+    self.opened_at = None
+    self.trial_in_progress = False
+
+
+class CircuitBreaker:
+  """
+  Fails requests to a host fast after 'failure_threshold' consecutive failures.
+
+  After 'reset_timeout' seconds a single trial request is let through, 
+  the circuit is closed again if it succeeds. A threshold of 0 disables the breaker.
+  The trial must be concluded by record_success, record_failure or release_trial,
+  otherwise no other request to the host is let through.
+  """
+
+  def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60):
+    self.failure_threshold = failure_threshold
+    self.reset_timeout = reset_timeout
+    self.__circuits: dict[str, _Circuit] = {}
+
+  def check(self, url: str) -> bool:
+    """
+    Raises CircuitOpenException if requests to the host of 'url' should not be sent.
+    Returns True if the request is the trial request of the host.
+    """
+    circuit = self.__get_circuit(url)
+    if circuit.opened_at is None:
+      return False
+
+    if circuit.trial_in_progress:
+      raise CircuitOpenException(f"circuit open for host of {url}, waiting for the result of a trial request")
+    if time.monotonic() - circuit.opened_at < self.reset_timeout:
+      raise CircuitOpenException(f"circuit open for host of {url} after {circuit.failures} consecutive failures")
+    circuit.trial_in_progress = True
+    return True
+
+  def release_trial(self, url: str) -> None:
+    """
+    Ends the trial request of the host without a result, e.g. it was cancelled, 
+    or it failed with an error which says nothing about the host. The next request is a trial again.
+    """
+    self.__get_circuit(url).trial_in_progress = False
+
+  def record_success(self, url: str) -> None:
+    circuit = self.__get_circuit(url)
+    circuit.failures = 0
+    circuit.opened_at = None
+    circuit.trial_in_progress = False
+
+  def record_failure(self, url: str) -> None:
+    circuit = self.__get_circuit(url)
+    circuit.failures += 1
+    circuit.trial_in_progress = False
+    if self.failure_threshold > 0 and circuit.failures >= self.failure_threshold:
+      circuit.opened_at = time.monotonic()
+
+  def __get_circuit(self, url: str) -> _Circuit:
+    host = urlparse(url).netloc.lower()
+    circuit = self.__circuits.get(host)
+    if circuit is None:
+      circuit = _Circuit()
+      self.__circuits[host] = circuit
+    return circuit
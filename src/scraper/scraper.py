@@ -1,18 +1,30 @@
+import asyncio
+import functools
 import hashlib
-from urllib import request
 from urllib.parse import urlparse
 from urllib.parse import urljoin
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 from datetime import timedelta
 import multiprocessing as mp
+import signal
+from typing import Callable, Iterator
 
-from scraper.config import Config, ScrapeConfig, ComponentSelectorConfig, CommonComponentSelectorsConfig
+from scraper.config import Config, ScrapeConfig, ComponentSelectorConfig, RateLimitConfig
 from utils import log_utils
+from scraper.fetcher import AsyncFetcher
+from scraper.host_scheduler import HostScheduler
+from scraper.feed_parser import read_feed, feed_content_types
+from scraper.retry import RetryPolicy, CircuitBreaker, CircuitOpenException
 from utils import http_utils
-from scraper.selector_processor import SelectorProcessor, set_log_levels
+from utils.http_utils import HttpConnectionPool, BodyPolicy, ContentTypeException, BodyTooLargeException
+from scraper.selector_processor import ScrapePlan, set_log_levels
+from scraper.parser_backend import default_parser_backend
+from scraper.work_queues import ScrapeTask, WorkQueues
+from scraper.parser_pool import ParserQueues, AsyncParserClient
 from article_cache import ArticleCache, NoOpArticleCache
 from article_store import ArticleStore, NoOpArticleStore
+from validator_cache import ValidatorCache, NoOpValidatorCache
 
 class ScrapeOptions:
 
@@ -23,6 +35,17 @@ class ScrapeOptions:
       article_cache: ArticleCache = NoOpArticleCache(),
       article_stores: ArticleStore = [NoOpArticleStore()],
       log_level: int = logging.INFO,
+      fetch_concurrency: int = 1,
+      http_pool: HttpConnectionPool = None,
+      validator_cache: ValidatorCache = NoOpValidatorCache(),
+      host_rate_limit: RateLimitConfig = None,
+      retry_policy: RetryPolicy = RetryPolicy(),
+      circuit_breaker_threshold: int = 5,
+      circuit_breaker_reset_timeout: float = 60,
+      body_policy: BodyPolicy = BodyPolicy(),
+      parser: str = default_parser_backend,
+      task_timeout: float | None = None,
+      max_tasks_per_child: int | None = None,
   ): 
     if article_limit is None:
       self.article_limit = float("inf")
@@ -33,9 +56,78 @@ class ScrapeOptions:
     self.article_cache = article_cache
     self.article_stores = article_stores
     self.log_level = log_level
+    self.fetch_concurrency = fetch_concurrency
+    self.http_pool = http_pool if http_pool is not None else HttpConnectionPool()
+    self.validator_cache = validator_cache
+    self.host_rate_limit = host_rate_limit
+    self.retry_policy = retry_policy
+    self.circuit_breaker_threshold = circuit_breaker_threshold
+    self.circuit_breaker_reset_timeout = circuit_breaker_reset_timeout
+    self.body_policy = body_policy
+    self.parser = parser
+    self.task_timeout = task_timeout
+    self.max_tasks_per_child = max_tasks_per_child
+
+class WorkerResources:
+  """
+  The connections, caches and stores of a scraper process. They are created once when the process starts,
+  in the process, since they may not be picklable. All the configs and tasks of the process share them.
+  'feed_content_types' are the content types of the feeds of the configs, which the http archive records too.
+  """
+
+  def __init__(self, scrape_options_kwargs: dict, feed_content_types: list[str] = feed_content_types):
+    self.http_pool = None
+    self.article_cache = None
+    self.article_stores = []
+    self.validator_cache = None
+    try:
+      self.http_pool = scrape_options_kwargs['http_archive_factory'].wrap(
+        scrape_options_kwargs['http_pool_factory'].create(),
+        self.__create_recording_policy(scrape_options_kwargs['body_policy'], feed_content_types),
+      )
+      self.article_cache = scrape_options_kwargs['article_cache_factory'].create()
+      self.article_stores = scrape_options_kwargs['article_store_factory'].create()
+      self.validator_cache = scrape_options_kwargs['validator_cache_factory'].create()
+    except Exception:
+      # don't leak the ones created so far
+      self.close()
+      raise
+
+  @staticmethod
+  def __create_recording_policy(body_policy: BodyPolicy, feed_content_types: list[str]) -> BodyPolicy:
+    # the feeds and sitemaps are recorded too, an empty list allows every content type
+    if len(body_policy.content_types) == 0 or len(feed_content_types) == 0:
+      return BodyPolicy(body_policy.max_size, [])
+    return BodyPolicy(body_policy.max_size, body_policy.content_types + feed_content_types)
+
+  def close(self) -> None:
+    """
+    Closes all the resources, even if some of them fail to close. The first error is raised after that.
+    """
+    error = None
+    for resource in [self.http_pool, self.article_cache, *self.article_stores, self.validator_cache]:
+      if resource is None:
+        continue
+      try:
+        resource.close()
+      except Exception as e:
+        error = error or e
+
+    if error is not None:
+      raise error
+
 
 class Scraper:
 
+  # messages of the scraper processes
+  message_started = "started"
+  message_found = "found"
+  message_listed = "listed"
+  message_done = "done"
+
+  # seconds between checking the work queues when there are no tasks
+  poll_interval = 0.05
+
   def __init_logging(self, log_level: int):
     name = self.__class__.__name__
     if self.id is not None:
@@ -50,177 +142,489 @@ class Scraper:
     self.id = str(id) # just to make sure
     self.__init_logging(logging.INFO)
   
-  def scrape_articles_from_queue(self, input_queue: mp.Queue, output_queue: mp.Queue):
+  def scrape_tasks_from_queues(
+      self,
+      configs: list[Config],
+      scrape_options_kwargs_list: list[dict],
+      work_queues: WorkQueues,
+      worker_index: int,
+      output_queue: mp.Queue,
+      parser_queues: ParserQueues = None,
+  ) -> None:
+    """
+    Runs the tasks of the worker's queue, and the ones stolen from the other workers, until it gets (None, None),
+    or until it ran 'max_tasks_per_child' tasks, then the manager replaces it with a new process.
+    Every task is announced by (message_started, task id, worker index), the article urls found by the tasks are sent
+    to 'output_queue' as (message_found, task id, ScrapeTask), and every task is concluded by (message_done, task id, scraped meta).
+    The validators of the listing pages whose article urls were all found are sent as (message_listed, task id, (url, validators)),
+    the manager stores them once the articles were scraped.
+    Tasks running longer than 'task_timeout' seconds are cancelled.
+    If 'parser_queues' is set, the components of the articles are selected by the parser processes.
+
+    SIGTERM makes the process exit without concluding its running tasks, the manager puts them back into the queues.
+    """
+    signal.signal(signal.SIGTERM, self.__exit_on_signal)
     self.log.info("listening for work")
-    config, scrape_options_kwargs = input_queue.get()
-    while config is not None and scrape_options_kwargs is not None:
-      scrape_options = ScrapeOptions(
-        article_limit=scrape_options_kwargs['article_limit'],
-        log_level=scrape_options_kwargs['log_level'],
-        article_cache=scrape_options_kwargs['article_cache_factory'].create(),
-        article_stores=scrape_options_kwargs['article_store_factory'].create(),
-      )
-      self.scrape_articles(config, scrape_options, output_queue)
-      self.log.info("listening for work")
-      config, scrape_options_kwargs = input_queue.get()
-    self.log.info("got None work, exiting")
-
-  def scrape_articles(
-      self, 
-      config: Config, 
-      scrape_options: ScrapeOptions,
-      queue: mp.Queue,
+    asyncio.run(self._scrape_tasks_async(configs, scrape_options_kwargs_list, work_queues, worker_index, output_queue, parser_queues))
+    self.log.info("exiting")
+
+  def __exit_on_signal(self, signum, frame):
+    # unlike being killed, the process releases the locks of the queues and sends its buffered messages on the way out
+    self.log.warning(f"got signal {signum}, exiting")
+    raise SystemExit(1)
+
+  async def _scrape_tasks_async(
+      self,
+      configs: list[Config],
+      scrape_options_kwargs_list: list[dict],
+      work_queues: WorkQueues,
+      worker_index: int,
+      output_queue: mp.Queue,
+      parser_queues: ParserQueues = None,
   ) -> None:
+    # connections, caches and stores are kept across all the configs and tasks this process runs,
+    # the options of the run (concurrency, limits, retries) are the same for all configs
+    resources = WorkerResources(scrape_options_kwargs_list[0], self.__get_feed_content_types(configs))
+
+    # created when a config or scrape config is first needed, then reused for all of its tasks
+    scrape_options = {}
+    scrape_plans = {}
+
+    def get_scrape_options(config_index: int) -> ScrapeOptions:
+      if config_index not in scrape_options:
+        scrape_options[config_index] = self._create_scrape_options(scrape_options_kwargs_list[config_index], resources)
+      return scrape_options[config_index]
+
+    def get_scrape_plan(config_index: int, scrape_config_index: int) -> ScrapePlan | None:
+      key = (config_index, scrape_config_index)
+      if key not in scrape_plans:
+        config = configs[config_index]
+        scrape_config = config.scrape_configs[scrape_config_index]
+        try:
+          scrape_plans[key] = ScrapePlan(scrape_config, config.common_selectors)
+        except Exception:
+          self.log.exception(f"failed to compile the selectors for {scrape_config.urls}")
+          scrape_plans[key] = None
+      return scrape_plans[key]
+
+    run_options = get_scrape_options(0)
+    self.log.setLevel(run_options.log_level)
+    fetcher = self._create_fetcher(run_options)
+
+    parser_client = None
+    if parser_queues is not None:
+      parser_client = AsyncParserClient(parser_queues, worker_index)
+      parser_client.start()
+
+    async def execute(task_id: int, task: ScrapeTask) -> list[dict]:
+      scrape_config = configs[task.config_index].scrape_configs[task.scrape_config_index]
+      options = get_scrape_options(task.config_index)
+      scrape_plan = get_scrape_plan(task.config_index, task.scrape_config_index)
+      if scrape_plan is None:
+        return []
+
+      if task.article_url is None:
+        def on_listed(listing_url: str, validators: dict) -> None:
+          output_queue.put((Scraper.message_listed, task_id, (listing_url, validators)))
+
+        async for listing_url, article_url in self._find_article_urls(scrape_config, scrape_plan, options, fetcher, on_listed):
+          found = ScrapeTask(task.config_index, task.scrape_config_index, article_url, listing_url)
+          output_queue.put((Scraper.message_found, task_id, found))
+        return []
+
+      parse_html = None
+      if parser_client is not None:
+        parse_html = functools.partial(parser_client.parse, task.config_index, task.scrape_config_index)
+      return await self._scrape_and_store_article(
+        scrape_config, scrape_plan, options, fetcher, task.article_url, parse_html
+      )
 
-    self.log.setLevel(scrape_options.log_level)
+    async def run(task_id: int, task: ScrapeTask) -> None:
+      scraped_meta = []
+      try:
+        scraped_meta = await asyncio.wait_for(execute(task_id, task), run_options.task_timeout)
+      except asyncio.TimeoutError:
+        self.log.error(f"{task} didn't finish in {run_options.task_timeout} seconds, cancelled it")
+      except Exception:
+        self.log.exception(f"error while running {task}")
+      # not concluded if it's cancelled because the process is exiting, the manager runs it again
+      output_queue.put((Scraper.message_done, task_id, scraped_meta))
+
+    async def run_in_slot(task_id: int, task: ScrapeTask) -> None:
+      try:
+        await run(task_id, task)
+      finally:
+        slots.release()
+
+    # at most 'fetch_concurrency' articles are scraped at once, the rest of the tasks 
+    # are left in the queues, where the other workers can steal them
+    slots = asyncio.Semaphore(fetcher.concurrency)
+    running = set()
+    task_count = 0
+    try:
+      while task_count != run_options.max_tasks_per_child:
+        await slots.acquire()
+        item = work_queues.get_nowait(worker_index)
+        while item is None:
+          await asyncio.sleep(self.poll_interval)
+          item = work_queues.get_nowait(worker_index)
+
+        task_id, task = item
+        if task_id is None:
+          break
+
+        # right away, the manager restarts the process if the task doesn't finish long after its deadline,
+        # and puts the task back into the queues if the process exits without finishing it
+        output_queue.put((Scraper.message_started, task_id, worker_index))
+        if task.article_url is None:
+          # finding the urls mostly waits for the listing pages, it doesn't take a slot
+          slots.release()
+          t = asyncio.create_task(run(task_id, task))
+        else:
+          t = asyncio.create_task(run_in_slot(task_id, task))
+        running.add(t)
+        t.add_done_callback(running.discard)
+        task_count += 1
+
+      if task_count == run_options.max_tasks_per_child:
+        # the memory of the parsers isn't always returned to the os, a new process starts from scratch
+        self.log.info(f"ran {task_count} tasks, exiting to be replaced by a new process")
+      await asyncio.gather(*running)
+    finally:
+      for t in running:
+        t.cancel()
+      fetcher.close()
+      if parser_client is not None:
+        parser_client.close()
+      try:
+        resources.close()
+      except Exception:
+        self.log.exception("failed to close the connections, caches and stores")
+
+  def __get_feed_content_types(self, configs: list[Config]) -> list[str]:
+    content_types = set(feed_content_types)
+    for config in configs:
+      for scrape_config in config.scrape_configs:
+        if scrape_config.feed is None:
+          continue
+        if len(scrape_config.feed.content_types) == 0:
+          # the config accepts every content type
+          return []
+        content_types.update(scrape_config.feed.content_types)
+    return sorted(content_types)
+
+  def _create_scrape_options(self, scrape_options_kwargs: dict, resources: WorkerResources) -> ScrapeOptions:
+    return ScrapeOptions(
+      article_limit=scrape_options_kwargs['article_limit'],
+      log_level=scrape_options_kwargs['log_level'],
+      article_cache=resources.article_cache,
+      article_stores=resources.article_stores,
+      fetch_concurrency=scrape_options_kwargs['fetch_concurrency'],
+      http_pool=resources.http_pool,
+      validator_cache=resources.validator_cache,
+      host_rate_limit=scrape_options_kwargs['host_rate_limit'],
+      retry_policy=scrape_options_kwargs['retry_policy'],
+      circuit_breaker_threshold=scrape_options_kwargs['circuit_breaker_threshold'],
+      circuit_breaker_reset_timeout=scrape_options_kwargs['circuit_breaker_reset_timeout'],
+      body_policy=scrape_options_kwargs['body_policy'],
+      parser=scrape_options_kwargs['parser'],
+      task_timeout=scrape_options_kwargs['task_timeout'],
+      max_tasks_per_child=scrape_options_kwargs['max_tasks_per_child'],
+    )
 
-    scrape_config_to_article_urls: dict[ScrapeConfig, list[str]] = {}
-    for scrape_config in config.scrape_configs:
-      scrape_config_to_article_urls[scrape_config] = self._find_article_urls(
-        scrape_config, 
-        config.common_selectors,
-        scrape_options,
-      )
+  def _create_fetcher(self, scrape_options: ScrapeOptions) -> AsyncFetcher:
+    return AsyncFetcher(
+      scrape_options.http_pool, 
+      scrape_options.fetch_concurrency,
+      HostScheduler(scrape_options.host_rate_limit),
+      scrape_options.retry_policy,
+      CircuitBreaker(scrape_options.circuit_breaker_threshold, scrape_options.circuit_breaker_reset_timeout),
+    )
 
-    # at this point all urls are valid and can be scraped
+  async def _scrape_and_store_article(
+      self,
+      scrape_config: ScrapeConfig,
+      scrape_plan: ScrapePlan,
+      scrape_options: ScrapeOptions,
+      fetcher: AsyncFetcher,
+      article_url: str,
+      parse_html = None,
+  ) -> list[dict]:
+    self.log.info(f"trying to scrape {article_url}")
+
+    scrape_result = await self._scrape_article(scrape_config, scrape_plan, article_url, scrape_options, fetcher, parse_html)
+    if scrape_result is None:
+      self.log.warning(f"no article components found for {article_url}")
+      return []
+      
+    # add metadata as the first key, if it existed
+    article_result = {}
+    if scrape_config.metadata is not None:
+      article_result |= {
+        "metadata": scrape_config.metadata
+      }
+    
+    # add other keys and the result
+    # article id is a hash of the domain of the url and the content
+    url_domain = urlparse(article_url).netloc 
+    article_id = hashlib.sha1(f"{url_domain}-{scrape_result}".encode()).hexdigest() 
+    article_result |= {
+      "id":  article_id,
+      "url": article_url,
+      "scrape_time": datetime.now().isoformat(),
+      "components": scrape_result,
+    }
+
+    # store in every article store
     scraped_meta = []
-    for scrape_config, urls in scrape_config_to_article_urls.items():
-      for article_url in urls:
-        self.log.info(f"trying to scrape {article_url}")
-
-        scrape_result = self._scrape_article(scrape_config.selectors, config.common_selectors, article_url)
-        if scrape_result is None:
-          self.log.warning(f"no article components found for {article_url}")
-          continue
-          
-        # add metadata as the first key, if it existed
-        article_result = {}
-        if scrape_config.metadata is not None:
-          article_result |= {
-            "metadata": scrape_config.metadata
-          }
+    for s in scrape_options.article_stores:
+      try: 
+        s.store(article_url, article_result)
         
-        # add other keys and the result
-        # article id is a hash of the domain of the url and the content
-        url_domain = urlparse(article_url).netloc 
-        article_id = hashlib.sha1(f"{url_domain}-{scrape_result}".encode()).hexdigest() 
-        article_result |= {
-          "id":  article_id,
-          "url": article_url,
-          "scrape_time": datetime.now().isoformat(),
-          "components": scrape_result,
-        }
-
-        # store in every article store
-        for s in scrape_options.article_stores:
-          try: 
-            s.store(article_url, article_result)
-            
-            # TODO: change this dict to be a data class
-            scraped_meta.append({
-              "id": article_id,
-            })
-          except Exception:
-            self.log.exception(f"error while trying to store article {article_url}")
-            continue
-        
-        # store in cache after knowing scraping was successful
-        scrape_options.article_cache.store(article_url, scrape_options.ttl)
-
-        self.log.info(f"finished scraping {article_url}, id {article_id}")  
+        # TODO: change this dict to be a data class
+        scraped_meta.append({
+          "id": article_id,
+        })
+      except Exception:
+        self.log.exception(f"error while trying to store article {article_url}")
+        continue
     
-    # return the ids to parent process if there is one
-    if queue is not None:
-      self.log.info(f"adding {len(scraped_meta)} items to parent's queue")
-      # TODO: could hang indefinitely
-      queue.put(scraped_meta)
+    # store in cache after knowing scraping was successful
+    scrape_options.article_cache.store(article_url, scrape_options.ttl)
+
+    self.log.info(f"finished scraping {article_url}, id {article_id}")  
+    return scraped_meta
     
-  def _scrape_article(
+  async def _scrape_article(
     self, 
-    selector: ComponentSelectorConfig, 
-    common_selectors: CommonComponentSelectorsConfig,
+    scrape_config: ScrapeConfig, 
+    scrape_plan: ScrapePlan,
     article_url: str,
+    scrape_options: ScrapeOptions,
+    fetcher: AsyncFetcher,
+    parse_html = None,
   ) -> dict | None:
+    """
+    Returns the components of the article. They are selected by 'parse_html' (html, parser, partial parse) 
+    if it's set, the incrementally parsed pages are always selected here while they are downloaded.
+    """
+    parser = self._get_parser(scrape_config, scrape_options)
     try:
-      req = http_utils.create_request(article_url)
-      page = request.urlopen(req, timeout=15)
-      html = page.read().decode("utf-8")
+      if scrape_config.incremental_parse:
+        # select the components while the article is downloaded, the page content is the result
+        read_body = lambda res: scrape_plan.selectors.process_chunks(
+          scrape_options.body_policy.iter_text(res),
+          parser,
+          scrape_config.partial_parse,
+        )
+        page = await fetcher.fetch(article_url, rate_limit=scrape_config.rate_limit, read_body=read_body)
+        return page.content
+
+      page = await fetcher.fetch(article_url, rate_limit=scrape_config.rate_limit, read_body=scrape_options.body_policy.read_text)
       self.log.debug("trying to select article components")
-      return SelectorProcessor.process_html(selector, common_selectors, html)
+      if parse_html is not None:
+        return await parse_html(page.content, parser, scrape_config.partial_parse)
+      return scrape_plan.selectors.process_html(page.content, parser, scrape_config.partial_parse)
+    except (CircuitOpenException, ContentTypeException, BodyTooLargeException) as e:
+      self.log.warning(f"not scraping {article_url}: {e}")
+      return None
     except Exception:
       self.log.exception(f"error while trying to scrape {article_url}")
       return None
 
 
-  def _find_article_urls(
+  async def _find_article_urls(
       self, 
       scrape_config: ScrapeConfig, 
-      common_selectors: CommonComponentSelectorsConfig,
+      scrape_plan: ScrapePlan,
       scrape_options: ScrapeOptions,
-  ) -> list:
-    urls = scrape_config.urls
-    scraped_urls = set()
-
-    for url in urls:
-      self.log.info(f"finding article urls for {url}")
-
+      fetcher: AsyncFetcher,
+      on_listed: Callable[[str, dict], None],
+  ):
+    """
+    Yields the (listing page url, article url) pairs of the new articles of a scrape config as soon as the listing page
+    containing them is processed. Listing pages are html pages processed with the url selectors, or feeds and sitemaps.
+    'on_listed' gets the url and the validators of every completely processed listing page, they are only stored
+    after its articles were scraped, otherwise a failed article would never be found again.
+    Sitemap indexes don't get them, so the sitemaps they list are always checked.
+    """
+    urls = []
+    for url in scrape_config.urls:
       if not self._is_url_valid(url):
         self.log.warning(f"url {url} is invalid, not finding any links for it")
         continue
+      urls.append(url)
 
-      try:
-        req = http_utils.create_request(url)
-        page = request.urlopen(req, timeout=15)
-        html = page.read().decode("utf-8")
-
-        # select all urls using the specified selectors
-        url_dict = SelectorProcessor.process_html(scrape_config.url_selectors, common_selectors, html)
-        if url_dict is None:
-          self.log.warning(f"url_selectors found no urls for {url}")
-          continue
-
-        url_list = self._flatten_dict_to_list(url_dict)
-
-        self.log.debug(f"using article limit {scrape_options.article_limit}")
-        
-        for scraped_url in url_list:
+    # download the listing pages concurrently, and process them in the order they arrive
+    listing_urls = set(urls)
+    listing_tasks = {
+      asyncio.create_task(self._fetch_listing_page(url, scrape_config, scrape_options, fetcher)) 
+      for url in urls
+    }
 
-          absolute_url = self._create_absolute_link(scraped_url, url)
-          if not self._is_url_valid(absolute_url):
-            self.log.warning(f"created absolute url {absolute_url} is invalid, skipping")
+    try:
+      scraped_urls = set()
+      while len(listing_tasks) > 0:
+        done, listing_tasks = await asyncio.wait(listing_tasks, return_when=asyncio.FIRST_COMPLETED)
+        for listing_task in done:
+          url, page = listing_task.result()
+          if page is None:
             continue
 
-          # check the cache
-          if scrape_options.article_cache.contains(absolute_url):
-            self.log.info(f"url {absolute_url} already in cache, skipping")
+          try:
+            url_list, nested_listing_urls = self._extract_listing_urls(scrape_config, scrape_plan, scrape_options, page)
+          except Exception as e:
+            self.log.exception(f"error while finding article urls for {url}") 
+            continue
+          if url_list is None:
             continue
 
-          scraped_urls.add(absolute_url)
+          # sitemap indexes point to other sitemaps, download those too
+          for nested_url in nested_listing_urls:
+            nested_url = self._create_absolute_link(nested_url, url)
+            if nested_url in listing_urls or not self._is_url_valid(nested_url):
+              continue
+            listing_urls.add(nested_url)
+            listing_tasks.add(asyncio.create_task(self._fetch_listing_page(nested_url, scrape_config, scrape_options, fetcher)))
 
-          if len(scraped_urls) >= scrape_options.article_limit:
-            self.log.debug(f"reached article limit {scrape_options.article_limit} when finding urls")
-            return list(scraped_urls)
-    
-      except Exception as e:
-        self.log.exception(f"error while finding article urls for {url}") 
+          self.log.debug(f"using article limit {scrape_options.article_limit}")
+          
+          for scraped_url in url_list:
+
+            absolute_url = self._create_absolute_link(scraped_url, url)
+            if not self._is_url_valid(absolute_url):
+              self.log.warning(f"created absolute url {absolute_url} is invalid, skipping")
+              continue
+
+            # check the cache and skip the duplicates
+            if absolute_url in scraped_urls:
+              continue
+            if scrape_options.article_cache.contains(absolute_url):
+              self.log.info(f"url {absolute_url} already in cache, skipping")
+              continue
+
+            scraped_urls.add(absolute_url)
+            yield url, absolute_url
+
+            if len(scraped_urls) >= scrape_options.article_limit:
+              self.log.debug(f"reached article limit {scrape_options.article_limit} when finding urls")
+              return
+
+          # only remember the validators of completely processed pages, 
+          # otherwise the urls after the article limit would never be found
+          validators = http_utils.get_validators(page)
+          if validators is not None and len(nested_listing_urls) == 0:
+            on_listed(url, validators)
+          elif validators is not None:
+            # a sitemap index is downloaded every time, it may be unchanged while the sitemaps it lists get new articles
+            self.log.debug(f"not remembering the validators of sitemap index {url}")
+
+    finally:
+      # stop downloading the remaining listing pages after reaching the article limit
+      for listing_task in listing_tasks:
+        listing_task.cancel()
+
+  def _extract_listing_urls(
+      self,
+      scrape_config: ScrapeConfig, 
+      scrape_plan: ScrapePlan,
+      scrape_options: ScrapeOptions,
+      page: http_utils.Page,
+  ) -> tuple[list[str] | None, list[str]]:
+    """
+    Returns the article urls of a listing page and the urls of the other listing pages it refers to.
+    """
+    if scrape_config.links is not None:
+      # the links are found while the page is parsed, the rest of it isn't parsed after reaching the article limit
+      return self._iter_links(scrape_plan, page, self._get_parser(scrape_config, scrape_options)), []
+
+    if scrape_config.feed is None:
+      # select all urls using the specified selectors
+      url_dict = scrape_plan.url_selectors.process_html(
+        page.content, 
+        self._get_parser(scrape_config, scrape_options), 
+        scrape_config.partial_parse,
+      )
+      if url_dict is None:
+        self.log.warning(f"url_selectors found no urls for {page.url}")
+        return None, []
+      return self._flatten_dict_to_list(url_dict), []
+
+    # skip the entries which are too old, keep the ones without a date
+    min_date = None
+    if scrape_config.feed.max_age_hours is not None:
+      min_date = datetime.now(timezone.utc) - timedelta(hours=scrape_config.feed.max_age_hours)
+
+    article_urls = []
+    sitemap_urls = []
+    for entry in page.content:
+      if min_date is not None and entry.date is not None and entry.date < min_date:
+        continue
+      if entry.is_sitemap:
+        sitemap_urls.append(entry.url)
+      else:
+        article_urls.append(entry.url)
+
+    self.log.debug(f"found {len(article_urls)} article urls and {len(sitemap_urls)} sitemaps in feed {page.url}")
+    return article_urls, sitemap_urls
+
+  async def _fetch_listing_page(
+      self, 
+      url: str, 
+      scrape_config: ScrapeConfig,
+      scrape_options: ScrapeOptions, 
+      fetcher: AsyncFetcher,
+  ) -> tuple[str, http_utils.Page | None]:
+    self.log.info(f"finding article urls for {url}")
+    try:
+      # only download the page if it changed since the last time
+      validators = scrape_options.validator_cache.get(url)
+      if scrape_config.feed is None:
+        read_body = scrape_options.body_policy.read_text
+      else:
+        read_body = functools.partial(
+          read_feed,
+          max_size=scrape_options.body_policy.max_size,
+          content_types=scrape_config.feed.content_types,
+        )
+      page = await fetcher.fetch(url, http_utils.create_conditional_headers(validators), scrape_config.rate_limit, read_body)
+    except (CircuitOpenException, ContentTypeException, BodyTooLargeException) as e:
+      self.log.warning(f"not finding article urls for {url}: {e}")
+      return url, None
+    except Exception:
+      self.log.exception(f"error while finding article urls for {url}")
+      return url, None
 
-    return list(scraped_urls)
+    if page.not_modified:
+      self.log.info(f"listing page {url} not modified since the last run, skipping it")
+      return url, None
+    return url, page
 
   
-  def _flatten_dict_to_list(self, d: dict | None) -> dict:
-    if d is None:
-      return []
+  def _get_parser(self, scrape_config: ScrapeConfig, scrape_options: ScrapeOptions) -> str:
+    # the parser of the config overrides the one of the run
+    return scrape_config.parser if scrape_config.parser is not None else scrape_options.parser
+
+  def _iter_links(self, scrape_plan: ScrapePlan, page: http_utils.Page, parser: str) -> Iterator[str]:
+    try:
+      yield from scrape_plan.links.iter_links(page.content, page.url, parser)
+    except Exception:
+      self.log.exception(f"error while finding links in {page.url}")
 
+  def _flatten_dict_to_list(self, d: dict | None) -> list:
     result = []
-    for k, v in d.items():
+    if d is not None:
+      self._flatten_dict_into(d, result)
+    return result
+
+  def _flatten_dict_into(self, d: dict, result: list) -> None:
+    for v in d.values():
       if isinstance(v, dict):
-        result = [*result, *self._flatten_dict_to_list(v)]
+        self._flatten_dict_into(v, result)
       elif isinstance(v, list):
-        result = [*result, *v]
+        result.extend(v)
       else:
         result.append(v)
-
-    return result
   
     
   def _create_absolute_link(self, absolute_or_relative_url: str, base_url: str) -> str:
@@ -1,12 +1,20 @@
 from scraper.config import *
-from bs4 import BeautifulSoup, Tag
+from scraper.parser_backend import get_parser_backend, default_parser_backend
+from scraper.link_extractor import LinkExtractor
+from bs4 import SoupStrainer, Tag
+import soupsieve
+import functools
 import utils.log_utils as log_utils
 import logging
 from dateutil.parser import parse
-from datetime import datetime
+from datetime import date, datetime, time, timezone
 import re
 import jsonpath_ng
 import json
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
 
 
   
@@ -33,6 +41,10 @@ class SelectorProcessor:
     level=logging.INFO
   )
 
+  _prefix_unstable_pattern = re.compile(r":(?:last-|nth-last-|only-|empty|has|-soup-contains|contains)")
+  # pseudo-classes and combinators which depend on the siblings of the elements, '~=' is an attribute selector
+  _sibling_dependent_pattern = re.compile(r":(?:first-|last-|nth-|only-)|\+|~(?!=)")
+
   @classmethod
   def set_log_level(cls, level: int):
     cls.loglevel = level
@@ -46,12 +58,51 @@ class SelectorProcessor:
     config: ComponentSelectorConfig, 
     common_selectors: CommonComponentSelectorsConfig,   
     html: str,
+    parser: str = default_parser_backend,
   ) -> dict | None:
-    root = BeautifulSoup(html, "html.parser").select_one("html")
-    if root is None:
-      SelectorProcessor.log.error(f"no root 'html' element found when processing selector: {config.key}")
-      return None
-    return SelectorProcessor.process(config, common_selectors, root)
+    """
+    Parses 'html' with the 'parser' backend and applies the selectors to its root 'html' element.
+    Compile the config with 'compile' instead when processing multiple documents.
+    """
+    return SelectorProcessor.compile(config, common_selectors).process_html(html, parser)
+
+  @staticmethod
+  def process_many(
+    config: ComponentSelectorConfig, 
+    common_selectors: CommonComponentSelectorsConfig,   
+    html_iterable: Iterable[str],
+    processes: int = None,
+    parser: str = default_parser_backend,
+    partial: bool = False,
+  ) -> Iterator[dict | None]:
+    """
+    Yields the results of 'process_html' for every document of 'html_iterable', in the same order.
+    The documents are processed by a pool of 'processes' worker processes (the number of cpus by default),
+    each worker compiles the config once. Only a few documents per worker are read ahead from the iterable,
+    so it can be a lazy stream of any length. Documents failing to process yield None.
+    Raises concurrent.futures.process.BrokenProcessPool if a worker process dies, e.g. it's killed by the os.
+    """
+    if processes is None:
+      processes = mp.cpu_count()
+
+    if processes == 1:
+      plan = SelectorProcessor.compile(config, common_selectors)
+      for html in html_iterable:
+        yield _process_html_safely(plan, html, parser, partial)
+      return
+
+    # unlike mp.Pool, whose results never arrive if a worker dies, the futures fail then
+    with ProcessPoolExecutor(processes, initializer=_init_process_many_worker, initargs=(config, common_selectors, parser, partial)) as pool:
+      # keep every worker busy, but don't read the whole iterable ahead
+      max_pending = 2 * processes
+      pending = deque()
+      for html in html_iterable:
+        pending.append(pool.submit(_process_html_in_worker, html))
+        if len(pending) >= max_pending:
+          yield pending.popleft().result()
+
+      while len(pending) > 0:
+        yield pending.popleft().result()
 
   @staticmethod
   def process(
@@ -59,60 +110,282 @@ class SelectorProcessor:
     common_selectors: CommonComponentSelectorsConfig,
     element: Tag,
   ) -> dict | None:
-    if element is None:
-      return None
+    return SelectorProcessor.compile(config, common_selectors).process(element)
 
+  @staticmethod
+  def compile(
+    config: ComponentSelectorConfig,
+    common_selectors: CommonComponentSelectorsConfig,
+    compiled: dict = None,
+  ) -> "SelectorPlan":
+    """
+    Compiles a selector config into a plan which can be applied to any number of documents.
+    'compiled' maps the already compiled configs to their plans, so shared common selectors are compiled once.
+    """
+    if compiled is None:
+      compiled = {}
 
     # Note: infinite loop check should have happended when parsing the config
     while config.type == ComponentSelectorConfig.type_ref:
       config = common_selectors.common_selectors[config.common_selector]
 
+    plan = compiled.get(id(config))
+    if plan is not None:
+      return plan
+
+    # register the plan before compiling the children, they might refer to it
+    plan = SelectorPlan(config.key, config.css_selector, config.select, config.type, config.include_self)
+    compiled[id(config)] = plan
+
+    SelectorProcessor.log.debug(f"compiling selector for key: {config.key}, css_selector: {config.css_selector}")
 
     # decides to select only the first, or all matches based on the 'select' config
-    # delegates to a specific selector processor based on the config (single, multi, leaf)
-
-    selector_root = SelectorProcessor._get_selector_root(config, element)
-
-    process = {
-      ComponentSelectorConfig.prop_select_value_first: {
-        ComponentSelectorConfig.type_single: lambda config, x : SingleChildSelectorProcessor.select_one(config, common_selectors, x),
-        ComponentSelectorConfig.type_multi: lambda config, x : MultiChildSelectorProcessor.select_one(config, common_selectors, x),
-        ComponentSelectorConfig.type_leaf: lambda config, x : LeafSelectorProcessor.select_one(config, x),
-      },
-      ComponentSelectorConfig.prop_select_value_all: {
-        ComponentSelectorConfig.type_single: lambda config, x : SingleChildSelectorProcessor.select_all(config, common_selectors, x),
-        ComponentSelectorConfig.type_multi: lambda config, x : MultiChildSelectorProcessor.select_all(config, common_selectors, x),
-        ComponentSelectorConfig.type_leaf: lambda config, x : LeafSelectorProcessor.select_all(config, x),
-      }
-    }
+    # binds a specific selector processor based on the config (single, multi, leaf)
+    select_first = config.select == ComponentSelectorConfig.prop_select_value_first
+    if config.type == ComponentSelectorConfig.type_single:
+      plan.run, plan.settled = SingleChildSelectorProcessor.compile(config, common_selectors, compiled, select_first)
+    elif config.type == ComponentSelectorConfig.type_multi:
+      plan.run, plan.settled = MultiChildSelectorProcessor.compile(config, common_selectors, compiled, select_first)
+    else:
+      plan.run, plan.settled = LeafSelectorProcessor.compile(config, select_first)
+
+    child_configs = []
+    if config.type == ComponentSelectorConfig.type_single:
+      child_configs = [config.child_selector_config]
+    elif config.type == ComponentSelectorConfig.type_multi:
+      child_configs = config.child_selector_configs
+    plan.sibling_dependent = SelectorProcessor._is_sibling_dependent(config.css_selector) or any(
+      SelectorProcessor.compile(c, common_selectors, compiled).sibling_dependent for c in child_configs
+    )
+
+    # the strained document only has the matches and their descendants: the children of a multi-child selector
+    # selecting the first match are applied to the whole document, and the siblings of the elements are missing
+    if plan.sibling_dependent or (select_first and config.type == ComponentSelectorConfig.type_multi):
+      plan.strainer = None
+    return plan
+
+  @staticmethod
+  def _is_sibling_dependent(css_selector: str | None) -> bool:
+    return css_selector is not None and SelectorProcessor._sibling_dependent_pattern.search(css_selector) is not None
+
+  @staticmethod
+  def _is_prefix_stable(css_selector: str) -> bool:
+    """
+    Tells if the first match of the selector in a partially parsed document stays its first match
+    in the whole document. Selectors depending on the following siblings or on the contents of elements 
+    which might not be parsed yet are not.
+    """
+    return SelectorProcessor._prefix_unstable_pattern.search(css_selector) is None
+
+  @staticmethod
+  def _select_one_settled(css_selector: soupsieve.SoupSieve, prefix_stable: bool, element: Tag, open_elements: set[int]):
+    """
+    Returns the first match of the css selector and if it is final: the match is a closed element, 
+    or there is no match and the element which was searched is closed.
+    """
+    if not prefix_stable:
+      return None, SelectorPlan.is_element_closed(element, open_elements)
+
+    elem = css_selector.select_one(element)
+    if elem is None:
+      return None, SelectorPlan.is_element_closed(element, open_elements)
+    return elem, SelectorPlan.is_element_closed(elem, open_elements)
+
+  @staticmethod
+  def _select_one(css_selector: soupsieve.SoupSieve, element: Tag, include_self: bool) -> Tag | None:
+    """
+    Returns the first match of the css selector among the descendants of the element, 
+    or the element itself if 'include_self' is set and it matches.
+    """
+    if include_self and css_selector.match(element):
+      return element
+    return css_selector.select_one(element)
+
+  @staticmethod
+  def _select(css_selector: soupsieve.SoupSieve, element: Tag, include_self: bool) -> list[Tag]:
+    """
+    Returns the matches of the css selector among the descendants of the element in document order, 
+    preceded by the element itself if 'include_self' is set and it matches.
+    """
+    matches = css_selector.select(element)
+    if include_self and css_selector.match(element):
+      matches.insert(0, element)
+    return matches
+
+
+# the compiled plan and options of a process_many worker process
+_worker_plan = None
+_worker_options = None
+
+def _init_process_many_worker(
+  config: ComponentSelectorConfig, 
+  common_selectors: CommonComponentSelectorsConfig, 
+  parser: str, 
+  partial: bool,
+) -> None:
+  global _worker_plan, _worker_options
+  _worker_plan = SelectorProcessor.compile(config, common_selectors)
+  _worker_options = (parser, partial)
+
+def _process_html_in_worker(html: str) -> dict | None:
+  return _process_html_safely(_worker_plan, html, *_worker_options)
+
+def _process_html_safely(plan: "SelectorPlan", html: str, parser: str, partial: bool) -> dict | None:
+  try:
+    return plan.process_html(html, parser, partial)
+  except Exception:
+    SelectorProcessor.log.exception(f"failed to process document with selector: {plan.key}")
+    return None
+
+
+class SelectorPlan:
+  """
+  A compiled selector config: common selector references are resolved, the css selectors are
+  precompiled with soupsieve and the extractor and modifier functions are bound. 
+  'run' applies the selector to an element (and the element itself if 'include_self' is set) and returns the value of 'key'.
+  """
+
+  # simple selectors which can be turned into a SoupStrainer: tag, tag.class, tag#id, .class.other_class, ...
+  _strainable_selector_pattern = re.compile(r"^(?P<tag>[a-zA-Z][\w-]*)?(?P<rest>(?:[.#][\w-]+)*)$")
+
+  def __init__(self, key: str, css_selector: str, select: str, type: int, include_self: bool):
+    self.key = key
+    self.select = select
+    self.type = type
+    self.include_self = include_self
+    self.strainer = SelectorPlan._create_strainer(css_selector, include_self)
+    # tells if any selector of the plan depends on the siblings of the elements
+    self.sibling_dependent = False
+    self.run = None
+    # tells if the result of 'run' can't change anymore while the document is being parsed
+    self.settled = None
+
+  @staticmethod
+  def _create_strainer(css_selector: str, include_self: bool) -> SoupStrainer | None:
+    """
+    Creates a SoupStrainer which keeps at least the elements matching the css selector,
+    or returns None if the selector is too complex for it.
+    The strainer may keep more elements, they are filtered by the css selector afterwards.
+    """
+    match = SelectorPlan._strainable_selector_pattern.match(css_selector.strip())
+    # the root 'html' element is never matched by the selectors, only its descendants
+    if include_self or match is None or (match.group("tag") or "").lower() == "html":
+      return None
+
+    attrs = {}
+    for part in re.findall(r"[.#][\w-]+", match.group("rest")):
+      if part.startswith("#"):
+        attrs["id"] = part[1:]
+      elif "class" not in attrs:
+        # an element having one of the classes is enough to keep it,
+        # the strainer sees the whole class attribute while parsing
+        attrs["class"] = functools.partial(SelectorPlan._has_class, part[1:])
+
+    if match.group("tag") is None and len(attrs) == 0:
+      return None
+    return SoupStrainer(match.group("tag"), attrs)
+
+  @staticmethod
+  def _has_class(name: str, value: str | None) -> bool:
+    return value is not None and name in value.split()
+
+  def process_html(self, html: str, parser: str = default_parser_backend, partial: bool = False) -> dict | None:
+    """
+    With 'partial', only the elements which can match the selector and their descendants are parsed 
+    if the selector is simple enough. The rest of the document is not built, so the child selectors
+    mustn't depend on elements outside of them, e.g. 'body p'. The whole document is parsed for the
+    multi-child selectors selecting the first match, whose children are applied to the whole document,
+    and for the plans with selectors depending on the siblings of the elements.
+    """
+    if partial and self.strainer is not None:
+      return self.process(get_parser_backend(parser).parse(html, self.strainer))
+
+    root = get_parser_backend(parser).parse(html).select_one("html")
+    if root is None:
+      SelectorProcessor.log.error(f"no root 'html' element found when processing selector: {self.key}")
+      return None
+    return self.process(root)
+
+  def process_chunks(self, chunks, parser: str = default_parser_backend, partial: bool = False) -> dict | None:
+    """
+    Parses the document while its chunks arrive, and stops consuming them as soon as the result can't change anymore,
+    e.g. when every 'select: first' selector found a complete match. The result is the same as the one of 'process_html'.
+    Backends which can't parse incrementally parse the whole document instead.
+    """
+    strainer = self.strainer if partial else None
+    incremental_parser = get_parser_backend(parser).create_incremental_parser(strainer)
+    if incremental_parser is None:
+      return self.process_html("".join(chunks), parser, partial)
+
+    root = None
+    for chunk in chunks:
+      incremental_parser.feed(chunk)
+      if root is None:
+        root = incremental_parser.soup if strainer is not None else incremental_parser.soup.find("html")
+      if root is not None and self.is_settled(root, incremental_parser.get_open_elements()):
+        SelectorProcessor.log.debug(f"selector {self.key} settled, not parsing the rest of the document")
+        return self.process(root)
+
+    incremental_parser.close()
+    if root is None:
+      root = incremental_parser.soup if strainer is not None else incremental_parser.soup.find("html")
+    if root is None:
+      SelectorProcessor.log.error(f"no root 'html' element found when processing selector: {self.key}")
+      return None
+    return self.process(root)
+
+  def is_settled(self, element: Tag, open_elements: set[int]) -> bool:
+    """
+    Tells if the result of the selector applied to the partially parsed 'element' is final, 
+    'open_elements' are the ids of the elements whose end tag wasn't parsed yet.
+    """
+    if self.include_self:
+      return SelectorPlan.is_element_closed(element, open_elements)
+    return self.settled(element, open_elements)
+
+  @staticmethod
+  def is_element_closed(element: Tag, open_elements: set[int]) -> bool:
+    return id(element) not in open_elements
+
+  def process(self, element: Tag, include_self: bool = False) -> dict | None:
+    """
+    Applies the selector to the descendants of the element, and to the element itself 
+    if the selector or the caller ('include_self') says so.
+    """
+    if element is None:
+      return None
 
     try:
-      res = process[config.select][config.type](config, selector_root)
+      res = self.run(element, self.include_self or include_self)
     except Exception as e:
-      raise SelectorProcessorException(f"failed to process: {config.select}, {config.type}", e)
+      raise SelectorProcessorException(f"failed to process: {self.select}, {self.type}", e)
     
     if res == None:
       return None
 
-    # truncate the output to 15 characters
-    SelectorProcessor.log.debug(f"setting key: {config.key}, value: {str(res)[:15]}...")
+    if SelectorProcessor.log.isEnabledFor(logging.DEBUG):
+      # truncate the output to 15 characters
+      SelectorProcessor.log.debug(f"setting key: {self.key}, value: {str(res)[:15]}...")
 
     return {
-      config.key: res
+      self.key: res
     }
 
 
-  @staticmethod
-  def _get_selector_root(config: ComponentSelectorConfig, element: Tag) -> Tag:
-    # include this element in the selector by creating a container parent div which
-    # the selector will be applied to
-    if config.include_self:
-      SelectorProcessor.log.debug("including self, creating container div")
-      container_div = BeautifulSoup("", "html.parser").new_tag("div")
-      container_div.append(element)
-      return container_div
-    else:
-      return element
+class ScrapePlan:
+  """
+  The compiled selectors and url selectors (or link extractor) of a scrape config, reused for all of its pages.
+  """
+
+  def __init__(self, scrape_config: ScrapeConfig, common_selectors: CommonComponentSelectorsConfig):
+    compiled = {}
+    self.selectors = SelectorProcessor.compile(scrape_config.selectors, common_selectors, compiled)
+    self.url_selectors = None
+    if scrape_config.url_selectors is not None:
+      self.url_selectors = SelectorProcessor.compile(scrape_config.url_selectors, common_selectors, compiled)
+    self.links = None
+    if scrape_config.links is not None:
+      self.links = LinkExtractor(scrape_config.links.container)
 
   
 class SingleChildSelectorProcessor:
@@ -131,35 +404,46 @@ class SingleChildSelectorProcessor:
     )
 
   @staticmethod
-  def select_one(config: ComponentSelectorConfig, common_selectors: CommonComponentSelectorsConfig, element: Tag) -> dict | None:
-    SingleChildSelectorProcessor.log.debug(f"selecting one for key: {config.key}, css_selector: {config.css_selector}")
-
-    # select the first match from the html
-    elem = element.select_one(config.css_selector)
-    if elem is None:
-      return None
-    
-    return SelectorProcessor.process(config.child_selector_config, common_selectors, elem)
+  def compile(
+    config: ComponentSelectorConfig, 
+    common_selectors: CommonComponentSelectorsConfig, 
+    compiled: dict,
+    select_first: bool,
+  ):
+    css_selector = soupsieve.compile(config.css_selector)
+    prefix_stable = SelectorProcessor._is_prefix_stable(config.css_selector)
+    child = SelectorProcessor.compile(config.child_selector_config, common_selectors, compiled)
+
+    def select_one(element: Tag, include_self: bool) -> dict | None:
+      # select the first match from the html
+      elem = SelectorProcessor._select_one(css_selector, element, include_self)
+      if elem is None:
+        return None
+      
+      return child.process(elem)
   
-  @staticmethod
-  def select_all(config: ComponentSelectorConfig, common_selectors: CommonComponentSelectorsConfig, element: Tag) -> list | None:
-    SingleChildSelectorProcessor.log.debug(f"selecting all for key: {config.key}, css_selector: {config.css_selector}")
+    def select_all(element: Tag, include_self: bool) -> list | None:
+      # select all matches from the html
+      results = []
+      for elem in SelectorProcessor._select(css_selector, element, include_self): 
+        res = child.process(elem)
+        if res is not None:
+          results.append(res)
 
-    # select all matches from the html
-    elements = element.select(config.css_selector)
-    if elements is None or len(elements) == 0:
-      return None
-    
-    results = []
-    for elem in elements: 
-      res = SelectorProcessor.process(config.child_selector_config, common_selectors, elem)
-      if res is not None:
-        results.append(res)
+      if len(results) == 0:
+        return None
 
-    if len(results) == 0:
-      return None
+      return results
 
-    return results
+    def select_one_settled(element: Tag, open_elements: set[int]) -> bool:
+      elem, settled = SelectorProcessor._select_one_settled(css_selector, prefix_stable, element, open_elements)
+      if elem is None or settled:
+        return settled
+      return child.is_settled(elem, open_elements)
+
+    if select_first:
+      return select_one, select_one_settled
+    return select_all, SelectorPlan.is_element_closed
     
 class MultiChildSelectorProcessor:
   
@@ -177,43 +461,56 @@ class MultiChildSelectorProcessor:
     )
 
   @staticmethod
-  def select_one(config: ComponentSelectorConfig, common_selectors: CommonComponentSelectorsConfig, element: Tag) -> list | None:
-    MultiChildSelectorProcessor.log.debug(f"selecting one for key: {config.key}, css_selector: {config.css_selector}")
-
-    elem = element.select_one(config.css_selector)
-    if elem is None:
-      return None
+  def compile(
+    config: ComponentSelectorConfig, 
+    common_selectors: CommonComponentSelectorsConfig, 
+    compiled: dict,
+    select_first: bool,
+  ):
+    css_selector = soupsieve.compile(config.css_selector)
+    prefix_stable = SelectorProcessor._is_prefix_stable(config.css_selector)
+    children = [SelectorProcessor.compile(c, common_selectors, compiled) for c in config.child_selector_configs]
+
+    def select_one(element: Tag, include_self: bool) -> list | None:
+      elem = SelectorProcessor._select_one(css_selector, element, include_self)
+      if elem is None:
+        return None
 
-    results = []
-    for c in config.child_selector_configs:
-      res = SelectorProcessor.process(c, common_selectors, element)
-      if res is not None:
-        results.append(res)
+      results = []
+      for c in children:
+        # the children are applied to the element, not to the match, so they include it too
+        res = c.process(element, include_self)
+        if res is not None:
+          results.append(res)
+      
+      if len(results) == 0:
+        return None
     
-    if len(results) == 0:
-      return None
-  
-    return results
+      return results
   
-  @staticmethod
-  def select_all(config: ComponentSelectorConfig, common_selectors: CommonComponentSelectorsConfig, element: Tag) -> list | None:
-    MultiChildSelectorProcessor.log.debug(f"selecting all for key: {config.key}, css_selector: {config.css_selector}")
+    def select_all(element: Tag, include_self: bool) -> list | None:
+      results = []
+      for elem in SelectorProcessor._select(css_selector, element, include_self): 
+        for c in children:
+          res = c.process(elem)
+          if res is not None:
+            results.append(res)
+
+      if len(results) == 0:
+        return None
 
-    elements = element.select(config.css_selector)
-    if elements is None or len(elements) == 0:
-      return None
-    
-    results = []
-    for elem in elements: 
-      for c in config.child_selector_configs:
-        res = SelectorProcessor.process(c, common_selectors, elem)
-        if res is not None:
-          results.append(res)
+      return results
 
-    if len(results) == 0:
-      return None
+    def select_one_settled(element: Tag, open_elements: set[int]) -> bool:
+      elem, settled = SelectorProcessor._select_one_settled(css_selector, prefix_stable, element, open_elements)
+      if elem is None:
+        return settled
+      # the children are applied to the element, not to the match
+      return all(c.is_settled(element, open_elements) for c in children)
 
-    return results
+    if select_first:
+      return select_one, select_one_settled
+    return select_all, SelectorPlan.is_element_closed
 
 
 class LeafSelectorProcessor:
@@ -232,60 +529,67 @@ class LeafSelectorProcessor:
     )
 
   @staticmethod
-  def select_one(config: ComponentSelectorConfig, element: Tag) -> str | None:
-    LeafSelectorProcessor.log.debug(f"selecting one for key: {config.key}, css_selector: {config.css_selector}")
-
-    # select the first match from the html
-    elem = element.select_one(config.css_selector)
-    if elem is None:
-      return None
-
-    # try to extract some info
-    info = ExtractorProcessor.process(config.leaf_selector_config.extract, elem) 
-
-    if info is None:
+  def compile(config: ComponentSelectorConfig, select_first: bool):
+    css_selector = soupsieve.compile(config.css_selector)
+    prefix_stable = SelectorProcessor._is_prefix_stable(config.css_selector)
+    extract = ExtractorProcessor.bind(config.leaf_selector_config.extract)
+    modifiers = []
+    for m in config.leaf_selector_config.modifiers:
+      process = ModifierProcessor.bind(m)
+      modifiers.append((m.type, process, ModifierProcessor.bind_all(m, process)))
+
+    def log_no_info():
       LeafSelectorProcessor.log.debug(f"no info found for component: {config.key}, selector: {config.css_selector}, extract type: {config.leaf_selector_config.extract.type}")
-      return None
 
-    info = LeafSelectorProcessor.process_modifiers(config.leaf_selector_config, info)
+    def select_one(element: Tag, include_self: bool) -> str | None:
+      # select the first match from the html
+      elem = SelectorProcessor._select_one(css_selector, element, include_self)
+      if elem is None:
+        return None
 
-    if info is None:
-      LeafSelectorProcessor.log.debug(f"no info found for component: {config.key}, selector: {config.css_selector}, extract type: {config.leaf_selector_config.extract.type}")
-    
-    return info
-  
-  @staticmethod
-  def select_all(config: ComponentSelectorConfig, element: Tag) -> list | None:
-    LeafSelectorProcessor.log.debug(f"selecting all for key: {config.key}, css_selector: {config.css_selector}")
+      # try to extract some info
+      info = extract(elem) 
 
-    elements = element.select(config.css_selector)
-    if elements is None or len(elements) == 0:
-      return None
+      if info is None:
+        log_no_info()
+        return None
+
+      info = LeafSelectorProcessor.process_modifiers(modifiers, info)
 
-    results = []
-    for elem in elements: 
-      info = ExtractorProcessor.process(config.leaf_selector_config.extract, elem)
       if info is None:
-        continue
+        log_no_info()
+      
+      return info
+  
+    def select_all(element: Tag, include_self: bool) -> list | None:
+      matches = SelectorProcessor._select(css_selector, element, include_self)
+      infos = [info for info in map(extract, matches) if info is not None]
+      results = LeafSelectorProcessor.process_modifiers_all(modifiers, infos)
 
-      info = LeafSelectorProcessor.process_modifiers(config.leaf_selector_config, info)
+      if len(results) == 0:
+        log_no_info()
+        return None
 
-      if info is not None:
-        results.append(info)
+      return results
 
-    if len(results) == 0:
-      LeafSelectorProcessor.log.debug(f"no info found for component: {config.key}, selector: {config.css_selector}, extract type: {config.leaf_selector_config.extract.type}")
-      return None
+    def select_one_settled(element: Tag, open_elements: set[int]) -> bool:
+      _, settled = SelectorProcessor._select_one_settled(css_selector, prefix_stable, element, open_elements)
+      return settled
 
-    return results
+    if select_first:
+      return select_one, select_one_settled
+    return select_all, SelectorPlan.is_element_closed
   
   @staticmethod
-  def process_modifiers(config: LeafComponentSelectorConfig, info: str | list[str]) -> str | list[str] | None:
+  def process_modifiers(modifiers: list, info: str | list[str]) -> str | list[str] | None:
+    """
+    Applies the bound 'modifiers', a list of (type, modifier function, list modifier function) tuples, to the info.
+    """
     if type(info) == list:
 
       modified_info = []
       for i in info:
-        res = LeafSelectorProcessor.process_modifiers_single_info(config, i)
+        res = LeafSelectorProcessor.process_modifiers_single_info(modifiers, i)
         if res is None:
           continue
         modified_info.append(res)
@@ -294,20 +598,37 @@ class LeafSelectorProcessor:
         return None
       return modified_info
     
-    return LeafSelectorProcessor.process_modifiers_single_info(config, info)
+    return LeafSelectorProcessor.process_modifiers_single_info(modifiers, info)
 
   
   @staticmethod
-  def process_modifiers_single_info(config: LeafComponentSelectorConfig, info: str) -> str | None:
-    for m in config.modifiers:
+  def process_modifiers_all(modifiers: list, infos: list[str | list[str]]) -> list[str | list[str]]:
+    """
+    Applies the bound 'modifiers' to the infos of every selected element, leaving out the ones which end up None.
+    Each modifier is applied to the whole list at once, instead of applying the chain to the infos one by one.
+    """
+    if any(type(info) == list for info in infos):
+      results = [LeafSelectorProcessor.process_modifiers(modifiers, info) for info in infos]
+      return [info for info in results if info is not None]
+
+    for _, _, modify_all in modifiers:
+      if len(infos) == 0:
+        break
+      infos = modify_all(infos)
+
+    return infos
+
+  @staticmethod
+  def process_modifiers_single_info(modifiers: list, info: str) -> str | None:
+    for modifier_type, modify, _ in modifiers:
       try:
-        info = ModifierProcessor.process(m, info)
+        info = modify(info)
       except Exception as e:
-        LeafSelectorProcessor.log.exception(f"failed to process modifier: {m.type}, info {info}")
+        LeafSelectorProcessor.log.exception(f"failed to process modifier: {modifier_type}, info {info}")
         return None
 
       if info is None:
-        LeafSelectorProcessor.log.debug(f"no info found after modifier: {m.type} applied to: {info}")
+        LeafSelectorProcessor.log.debug(f"no info found after modifier: {modifier_type} applied to: {info}")
         return None
     
     return info
@@ -331,30 +652,42 @@ class ExtractorProcessor:
 
   @staticmethod
   def process(config: ExtractConfig, element: Tag) -> str | list[str] | None:
-    # try to process with the specific processor
-    try:
-      if config.type == ExtractConfig.prop_type_value_text:
-        info = TextExtractorProcessor.process(element)
-      elif config.type == ExtractConfig.prop_type_value_html:
-        info = HtmlExtractorProcessor.process(element)
-      elif config.type == ExtractConfig.prop_type_value_attribute:
-        info = AttributeExtractorProcessor.process(config, element)
-      elif config.type == ExtractConfig.prop_type_value_jsonpath:
-        info = JsonpathExtractorProcessor.process(config, element)
-    except Exception:
-      ExtractorProcessor.log.exception(f"failed to process extractor: {config.type}")
-      return None
+    return ExtractorProcessor.bind(config)(element)
 
-    if info is None:
-      return None
-    elif type(info) == list:
-      # remove whitespace from start and end
-      info = [i.strip() for i in info]
-    else:
-      # remove whitespace from start and end
-      info = info.strip()
-    
-    return info
+  @staticmethod
+  def bind(config: ExtractConfig):
+    """
+    Returns the extractor function of the config, which takes an element and returns the stripped info.
+    """
+    if config.type == ExtractConfig.prop_type_value_text:
+      extract = TextExtractorProcessor.process
+    elif config.type == ExtractConfig.prop_type_value_html:
+      extract = HtmlExtractorProcessor.process
+    elif config.type == ExtractConfig.prop_type_value_attribute:
+      extract = functools.partial(AttributeExtractorProcessor.process, config)
+    elif config.type == ExtractConfig.prop_type_value_jsonpath:
+      extract = JsonpathExtractorProcessor.bind(config)
+
+    def process(element: Tag) -> str | list[str] | None:
+      # try to process with the specific processor
+      try:
+        info = extract(element)
+      except Exception:
+        ExtractorProcessor.log.exception(f"failed to process extractor: {config.type}")
+        return None
+
+      if info is None:
+        return None
+      elif type(info) == list:
+        # remove whitespace from start and end
+        info = [i.strip() for i in info]
+      else:
+        # remove whitespace from start and end
+        info = info.strip()
+      
+      return info
+
+    return process
 
 class TextExtractorProcessor:
 
@@ -375,18 +708,90 @@ class AttributeExtractorProcessor:
     return element.get(config.specific_extractor_config.attribute_key)
 
 class JsonpathExtractorProcessor:
-  
+
+  # the parsed json is stored on the element, so all the jsonpath leaves of a document parse it only once
+  _parsed_json_attribute = "_parsed_json"
+
   @staticmethod
   def process(config: ExtractConfig, element: Tag) -> str | list[str] | None: 
-    json_dict = json.loads(element.text)
+    return JsonpathExtractorProcessor.bind(config)(element)
+
+  @staticmethod
+  def bind(config: ExtractConfig):
     jsonpath_expr: jsonpath_ng.jsonpath.Child = config.specific_extractor_config.jsonpath_expr
-    matches = [str(match.value) for match in jsonpath_expr.find(json_dict)]
+    steps = JsonpathExtractorProcessor.compile_simple_path(jsonpath_expr)
+    if steps is not None:
+      find = functools.partial(JsonpathExtractorProcessor.find_simple_path, steps)
+    else:
+      find = lambda json_dict: [match.value for match in jsonpath_expr.find(json_dict)]
 
-    if len(matches) == 0:
-      return None
-    elif len(matches) == 1:
-      return matches[0]
-    return matches
+    def process(element: Tag) -> str | list[str] | None:
+      json_dict = JsonpathExtractorProcessor.load_json(element)
+      matches = [str(value) for value in find(json_dict)]
+
+      if len(matches) == 0:
+        return None
+      elif len(matches) == 1:
+        return matches[0]
+      return matches
+
+    return process
+
+  @staticmethod
+  def load_json(element: Tag):
+    # look in __dict__ directly, unknown Tag attributes are looked up as child tags
+    cached = element.__dict__.get(JsonpathExtractorProcessor._parsed_json_attribute)
+    if cached is None:
+      try:
+        cached = (json.loads(element.text), None)
+      except Exception as e:
+        cached = (None, e)
+      setattr(element, JsonpathExtractorProcessor._parsed_json_attribute, cached)
+
+    json_dict, error = cached
+    if error is not None:
+      raise error
+    return json_dict
+
+  @staticmethod
+  def compile_simple_path(jsonpath_expr) -> list[tuple[bool, str | int]] | None:
+    """
+    Turns paths made of single fields and indexes, like $.foo['bar'][0], into a list of (is_field, field or index) steps.
+    Returns None for other paths, which are evaluated by jsonpath_ng.
+    """
+    if isinstance(jsonpath_expr, jsonpath_ng.jsonpath.Root):
+      return []
+    if isinstance(jsonpath_expr, jsonpath_ng.jsonpath.Child):
+      left = JsonpathExtractorProcessor.compile_simple_path(jsonpath_expr.left)
+      right = JsonpathExtractorProcessor.compile_simple_path(jsonpath_expr.right)
+      if left is None or right is None:
+        return None
+      return left + right
+    if type(jsonpath_expr) == jsonpath_ng.jsonpath.Fields and len(jsonpath_expr.fields) == 1 and jsonpath_expr.fields[0] != "*":
+      return [(True, jsonpath_expr.fields[0])]
+    if type(jsonpath_expr) == jsonpath_ng.jsonpath.Index:
+      return [(False, jsonpath_expr.index)]
+    return None
+
+  @staticmethod
+  def find_simple_path(steps: list[tuple[bool, str | int]], json_value) -> list:
+    """
+    Follows the steps of a simple path with the same semantics as jsonpath_ng, returns the matched values.
+    """
+    for is_field, step in steps:
+      if is_field:
+        try:
+          json_value = json_value.get(step, JsonpathExtractorProcessor)
+        except (TypeError, AttributeError):
+          return []
+        # the class itself marks the missing fields, json values can't be classes
+        if json_value is JsonpathExtractorProcessor:
+          return []
+      else:
+        if not json_value or len(json_value) <= step:
+          return []
+        json_value = json_value[step]
+    return [json_value]
     
 
 class ModifierProcessor:
@@ -405,14 +810,51 @@ class ModifierProcessor:
 
   @staticmethod
   def process(config: ModifierConfig, info: str) -> str | None:
-    try:
-      if config.type == ModifierConfig.prop_type_iso_date_parser:
-        return IsoDateParserModifierProcessor.process(info)
-      if config.type == ModifierConfig.prop_type_regex:
-        return RegexModifierProcessor.process(config, info)
-    except Exception as e:
-      ModifierProcessor.log.exception(f"failed to process modifier: {config.type} on {info}")
-      return None
+    return ModifierProcessor.bind(config)(info)
+
+  @staticmethod
+  def bind(config: ModifierConfig):
+    """
+    Returns the modifier function of the config, which takes the info and returns the modified info.
+    """
+    if config.type == ModifierConfig.prop_type_iso_date_parser:
+      modify = IsoDateParserModifierProcessor.bind()
+    elif config.type == ModifierConfig.prop_type_regex:
+      modify = RegexModifierProcessor.bind(config)
+    else:
+      modify = lambda info: None
+
+    def process(info: str) -> str | None:
+      try:
+        return modify(info)
+      except Exception as e:
+        ModifierProcessor.log.exception(f"failed to process modifier: {config.type} on {info}")
+        return None
+
+    return process
+
+  @staticmethod
+  def bind_all(config: ModifierConfig, process=None):
+    """
+    Returns the modifier function of the config for lists of infos, which returns the modified infos 
+    in the same order, leaving out the ones which the modifier returned None for.
+    'process' is the function bind returned for the config, so both share the state of the source.
+    """
+    if process is None:
+      process = ModifierProcessor.bind(config)
+    if config.type == ModifierConfig.prop_type_regex:
+      modify_all = RegexModifierProcessor.bind_all(config)
+    else:
+      modify_all = lambda infos: [info for info in map(process, infos) if info is not None]
+
+    def process_all(infos: list[str]) -> list[str]:
+      try:
+        return modify_all(infos)
+      except Exception as e:
+        # modify them one by one, so only the failing infos are left out
+        return [info for info in map(process, infos) if info is not None]
+
+    return process_all
   
 class IsoDateParserModifierProcessor:
 
@@ -439,18 +881,98 @@ class IsoDateParserModifierProcessor:
     "AWST": 8 * 3600
   }
 
+  _timestamp_pattern = re.compile(r"^\d+$")
+
+  # strict ISO 8601 dates which datetime.fromisoformat parses the same way as dateutil
+  _iso_pattern = re.compile(
+    r"^\d{4}-\d{2}-\d{2}"
+    r"(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?(?:Z|[+-]\d{2}:\d{2})?)?$"
+  )
+
+  # common formats which strptime parses the same way as dateutil, with their timezone if it's not in the format
+  _formats = [
+    ("%a, %d %b %Y %H:%M:%S %z", None),
+    ("%a, %d %b %Y %H:%M:%S GMT", timezone.utc),
+    ("%a, %d %b %Y %H:%M:%S UTC", timezone.utc),
+    ("%d %b %Y %H:%M:%S %z", None),
+    ("%B %d, %Y", None),
+    ("%b %d, %Y", None),
+    ("%d %B %Y", None),
+    ("%d %b %Y", None),
+    ("%Y/%m/%d", None),
+  ]
+
+  # results of the fuzzy parser, which is orders of magnitude slower than the others
+  memo_size = 4096
+
   @staticmethod
   def process(info: str) -> str | None:
-    # if we're dealing with a UNIX timestamp
-    if re.match(r'^\d+$', info) and (len(info) == 13 or len(info) == 10):
+    return IsoDateParserModifierProcessor.bind()(info)
+
+  @staticmethod
+  def bind():
+    """
+    Returns a date parser for a single source (modifier config), which tries the format
+    that worked for the previous dates of the source first. The fuzzy parser is the last resort,
+    sources whose dates matched none of the formats go straight to it.
+    """
+    # index of the last successful format in _formats, -1 if none of them matched
+    learned_format = [None]
+
+    def process(info: str) -> str | None:
+      # if we're dealing with a UNIX timestamp
+      if (len(info) == 13 or len(info) == 10) and IsoDateParserModifierProcessor._timestamp_pattern.match(info):
+
+        # milliseconds are also included, ignore it
+        info = info[:10]
+        d = datetime.fromtimestamp(int(info))
+        return d.isoformat()
+
+      if IsoDateParserModifierProcessor._iso_pattern.match(info):
+        return datetime.fromisoformat(info).isoformat()
+
+      d = IsoDateParserModifierProcessor._parse_formats(info, learned_format)
+      if d is not None:
+        return d.isoformat()
 
-      # milliseconds are also included, ignore it
-      info = info[:10]
-      d = datetime.fromtimestamp(int(info))
-      return d.isoformat()
+      # try to parse it flexibly
+      return IsoDateParserModifierProcessor._parse_fuzzy(info)
 
-    # try to parse it flexibly
-    d = parse(info, fuzzy=True, tzinfos=IsoDateParserModifierProcessor.tz_seconds)
+    return process
+
+  @staticmethod
+  def _parse_formats(info: str, learned_format: list) -> datetime | None:
+    formats = IsoDateParserModifierProcessor._formats
+    order = range(len(formats))
+    if learned_format[0] == -1:
+      return None
+    if learned_format[0] is not None:
+      order = [learned_format[0], *order]
+
+    for i in order:
+      date_format, tz = formats[i]
+      try:
+        d = datetime.strptime(info, date_format)
+      except ValueError:
+        continue
+
+      learned_format[0] = i
+      if tz is not None:
+        d = d.replace(tzinfo=tz)
+      return d
+
+    learned_format[0] = -1
+    return None
+
+  @staticmethod
+  def _parse_fuzzy(info: str) -> str:
+    # the missing parts of the date are taken from today, so today is part of the memo key
+    return IsoDateParserModifierProcessor._parse_fuzzy_on(info, date.today())
+
+  @staticmethod
+  @functools.lru_cache(maxsize=memo_size)
+  def _parse_fuzzy_on(info: str, today: date) -> str:
+    d = parse(info, default=datetime.combine(today, time()), fuzzy=True, tzinfos=IsoDateParserModifierProcessor.tz_seconds)
     return d.isoformat()
     
 
@@ -462,32 +984,60 @@ class RegexModifierProcessor:
   )
 
   @staticmethod
-  def process(config: ModifierConfig, info: str) -> str:
-    # extract or match based on regex 
+  def process(config: ModifierConfig, info: str) -> str | None:
+    return RegexModifierProcessor.bind(config)(info)
+
+  @staticmethod
+  def bind(config: ModifierConfig):
+    """
+    Returns the regex modifier function of the config, using the patterns compiled with the config.
+    """
     regex_config = config.specific_modifier_config
-    for pattern in regex_config.regex:
 
-      try:
-        match = re.search(pattern, info)
-      except Exception as e:
-        RegexModifierProcessor.log.exception(f"failed to search regex: {pattern}, info {info}")
-        continue
+    if regex_config.return_type == RegexModifierConfig.prop_return_original:
+      # return the original string if any regex matches
+      searches = [p.search for p in regex_config.patterns]
+      if regex_config.combined_pattern is not None:
+        searches = [regex_config.combined_pattern.search]
 
-      if match:
-        # return the original string if any regex matches
-        if regex_config.return_type == RegexModifierConfig.prop_return_original:
-          return info
+      def process(info: str) -> str | None:
+        for search in searches:
+          if search(info):
+            return info
+        return None
 
-        # return only the first match if any regex matches
-        elif regex_config.return_type == RegexModifierConfig.prop_return_first:
-          try:
+    elif regex_config.return_type == RegexModifierConfig.prop_return_first:
+      # return only the first match of the first matching regex
+      searches = [p.search for p in regex_config.patterns]
+
+      def process(info: str) -> str | None:
+        for search in searches:
+          match = search(info)
+          if match:
             return match.group(0)
-          except Exception as e:
-            RegexModifierProcessor.log.exception(f"failed to get first match from regex: {pattern}, info {info}")
-            return None
-        
-        else:
-          raise Exception(f"invalid regex modifier return type: {regex_config.return_type}")
-    
-    # in any other case, return None
-    return None
\ No newline at end of file
+        return None
+
+    else:
+      raise Exception(f"invalid regex modifier return type: {regex_config.return_type}")
+
+    return process
+
+  @staticmethod
+  def bind_all(config: ModifierConfig):
+    """
+    Returns the regex modifier function for lists of infos, which modifies every info of the list in one go.
+    """
+    regex_config = config.specific_modifier_config
+
+    search = None
+    if regex_config.combined_pattern is not None:
+      search = regex_config.combined_pattern.search
+    elif regex_config.return_type == RegexModifierConfig.prop_return_original and len(regex_config.patterns) == 1:
+      search = regex_config.patterns[0].search
+
+    if search is not None:
+      # keep the infos which match as they are
+      return lambda infos: [info for info in infos if search(info)]
+
+    process = RegexModifierProcessor.bind(config)
+    return lambda infos: [info for info in map(process, infos) if info is not None]
\ No newline at end of file
@@ -0,0 +1,106 @@
+import multiprocessing as mp
+import queue
+import zlib
+from urllib.parse import urlparse
+
+
+class ScrapeTask:
+  """
+  A unit of work of the scraper processes. It finds the article urls of a scrape config if 'article_url' is None,
+  otherwise it scrapes a single article of the scrape config. The configs are referred to by their index,
+  every worker process receives all of them when it starts. 'listing_url' is the listing page the article was found on.
+  """
+
+  def __init__(
+      self,
+      config_index: int,
+      scrape_config_index: int,
+      article_url: str | None = None,
+      listing_url: str | None = None,
+  ):
+    self.config_index = config_index
+    self.scrape_config_index = scrape_config_index
+    self.article_url = article_url
+    self.listing_url = listing_url
+
+  def __repr__(self) -> str:
+    return f"ScrapeTask({self.config_index}, {self.scrape_config_index}, {self.article_url})"
+
+
+class WorkQueues:
+  """
+  One task queue per worker process. The items are (task id, ScrapeTask) pairs, (None, None) tells a worker to exit.
+
+  Tasks are routed by the host of their url, so the pages of a host are downloaded by the same worker,
+  which reuses its connections to the host. A worker whose queues are empty steals the tasks of the other workers,
+  so a single large site keeps all the workers busy instead of only the one it's routed to.
+  Tasks which aren't 'stealable' are only run by the worker they're routed to, e.g. the ones of rate limited hosts,
+  since every worker limits the requests to a host on its own.
+  """
+
+  def __init__(self, worker_count: int):
+    self.queues = [mp.Queue() for _ in range(worker_count)]
+    # the tasks which can't be stolen
+    self.pinned_queues = [mp.Queue() for _ in range(worker_count)]
+
+  def route(self, url: str) -> int:
+    # crc32 is the same in every process, unlike hash()
+    host = urlparse(url).netloc.lower()
+    return zlib.crc32(host.encode()) % len(self.queues)
+
+  def put(self, task_id: int, task: ScrapeTask, url: str, stealable: bool = True) -> None:
+    queues = self.queues if stealable else self.pinned_queues
+    queues[self.route(url)].put((task_id, task))
+
+  def put_sentinels(self) -> None:
+    for q in self.queues:
+      q.put((None, None))
+
+  def get_nowait(self, worker_index: int) -> tuple[int | None, ScrapeTask | None] | None:
+    """
+    Returns the next task of the worker, or a task stolen from the other workers if it has none.
+    Returns None if there are no tasks at the moment.
+    """
+    for q in [self.pinned_queues[worker_index], self.queues[worker_index]]:
+      try:
+        return q.get_nowait()
+      except queue.Empty:
+        continue
+    return self.steal(worker_index)
+
+  def steal(self, worker_index: int) -> tuple[int, ScrapeTask] | None:
+    """
+    Returns a stealable task of one of the other workers, or None if all their queues are empty.
+    """
+    count = len(self.queues)
+    for i in range(1, count):
+      q = self.queues[(worker_index + i) % count]
+      try:
+        task_id, task = q.get_nowait()
+      except queue.Empty:
+        continue
+
+      if task_id is None:
+        # the other worker's exit message, leave it there
+        q.put((None, None))
+        continue
+      return task_id, task
+
+    return None
+
+  def clear(self) -> list[tuple[int, ScrapeTask]]:
+    """
+    Removes and returns the tasks which haven't been taken by the workers yet.
+    """
+    items = []
+    for q in self.queues + self.pinned_queues:
+      while True:
+        try:
+          items.append(q.get_nowait())
+        except queue.Empty:
+          break
+    return items
+
+  def close(self) -> None:
+    for q in self.queues + self.pinned_queues:
+      q.close()
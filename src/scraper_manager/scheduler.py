@@ -0,0 +1,60 @@
+import heapq
+import random
+from scraper.config import ScheduleConfig
+
+
+class Scheduler:
+  """
+  Decides when the configs are scraped in daemon mode. A config runs 'interval' seconds after the previous
+  run started, delayed by a random number of seconds up to 'jitter'. The first runs are spread out by the
+  jitter too. The schedule of a config overrides the default schedule, field by field.
+  Times are in seconds, as returned by time.monotonic().
+  """
+
+  def __init__(
+      self,
+      schedules: list[ScheduleConfig | None],
+      default_schedule: ScheduleConfig,
+      now: float,
+      rng: random.Random = None,
+  ):
+    self.schedules = schedules
+    self.default_schedule = default_schedule
+    self.rng = rng if rng is not None else random.Random()
+
+    # (time of the next run, config index)
+    self.__next_runs = [(now + self.__get_jitter(i), i) for i in range(len(schedules))]
+    heapq.heapify(self.__next_runs)
+
+  def next_run_time(self) -> float | None:
+    if len(self.__next_runs) == 0:
+      return None
+    return self.__next_runs[0][0]
+
+  def pop_due(self, now: float) -> list[int]:
+    """
+    Returns the indexes of the configs which should run now, they are removed from the schedule
+    until 'schedule_next' is called for them.
+    """
+    due = []
+    while len(self.__next_runs) > 0 and self.__next_runs[0][0] <= now:
+      _, index = heapq.heappop(self.__next_runs)
+      due.append(index)
+    return due
+
+  def schedule_next(self, index: int, run_start: float) -> None:
+    next_run = run_start + self.__get_interval(index) + self.__get_jitter(index)
+    heapq.heappush(self.__next_runs, (next_run, index))
+
+  def __get_interval(self, index: int) -> float:
+    return self.__get_field(index, "interval")
+
+  def __get_jitter(self, index: int) -> float:
+    jitter = self.__get_field(index, "jitter") or 0
+    return self.rng.uniform(0, jitter)
+
+  def __get_field(self, index: int, name: str):
+    for s in [self.schedules[index], self.default_schedule]:
+      if s is not None and getattr(s, name) is not None:
+        return getattr(s, name)
+    return None
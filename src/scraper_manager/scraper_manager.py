@@ -1,80 +1,491 @@
+import queue
+import threading
+import time
 from scraper.config import Config
 from scraper.scraper import Scraper
+from scraper.work_queues import ScrapeTask, WorkQueues
+from scraper.host_scheduler import HostScheduler
+from scraper.parser_pool import Parser, ParserQueues
+from scraper_manager.scheduler import Scheduler
+from validator_cache import NoOpValidatorCacheFactory
 import multiprocessing as mp
 from utils import log_utils
 from scraper_manager.notifier import *
 
 
+class ScrapeRun:
+  """
+  A run of some of the configs: its unfinished tasks and the unique articles scraped so far.
+  The run is abandoned if it isn't finished by its 'deadline' (time.monotonic()).
+  """
+
+  def __init__(self, config_indexes: list[int], deadline: float | None = None):
+    self.config_indexes = config_indexes
+    self.deadline = deadline
+    self.pending = set()
+    self.ids = set()
+    self.scraped_meta = []
+    # (config index, scrape config index, article url) of the found articles,
+    # a task finding them again after its process died doesn't add them twice
+    self.found = set()
+    # the validators of the completely processed listing pages, and the listing pages with articles which weren't stored
+    self.listed = {}
+    self.failed_listings = set()
+
+  @property
+  def done(self) -> bool:
+    return len(self.pending) == 0
+
+  def add_scraped_meta(self, scraped_meta: list[dict]) -> None:
+    # only store the unique ones
+    for item in scraped_meta:
+      if item["id"] in self.ids:
+        continue
+
+      self.ids.add(item["id"])
+      self.scraped_meta.append(item)
+
+
+class SubmittedTask:
+  """
+  A task in the queues or in a scraper process, 'worker_index' is set when a process starts running it.
+  """
+
+  def __init__(self, run: ScrapeRun, task: ScrapeTask, url: str):
+    self.run = run
+    self.task = task
+    self.url = url
+    self.attempts = 1
+    self.worker_index = None
+    # the process is considered stuck if the task isn't done by then
+    self.deadline = None
+
+
 class ScraperManager:
+  """
+  Distributes the scraping of the configs to the scraper processes, one article at a time.
 
-  def __init__(self, notifier: Notifier, proc_count: int = 1):
+  First every scrape config gets a task which finds its article urls, then each of the found
+  urls becomes a task of its own. The tasks are routed to the processes by the host of their url
+  and idle processes steal the tasks of the busy ones (see WorkQueues), so the run takes about
+  as long as the total work divided by the number of processes, not as long as the largest site.
+  The tasks of the hosts with a rate or in flight limit aren't stolen, so the limits hold for all the processes.
+
+  'scrape' runs the configs once, 'scrape_periodically' keeps the processes running and scrapes
+  the configs on their schedules, reusing the connections, compiled selectors and caches of the processes.
+
+  If 'parse_proc_count' is more than 0, the scraper processes only download the pages and the components
+  of the articles are selected by that many parser processes. The downloads are I/O bound, so the number of
+  scraper processes isn't limited by the number of cores then, only the number of parser processes is.
+  The pages wait for the parser processes in a queue of at most 'parse_queue_size' pages.
+
+  The processes are supervised: the ones which died, or exited after their maximum number of tasks, are replaced
+  by new ones, the page a parser process was parsing when it died fails. The scraper processes cancel the tasks running longer than 'task_timeout' seconds themselves,
+  a process which doesn't finish a task 'stuck_grace' seconds after that is asked to exit with SIGTERM, and only
+  killed if it doesn't exit in 'kill_grace' seconds, since a killed process may leave the shared queues locked or
+  corrupted. The tasks a process announced but didn't finish are put back into the queues when it exits, they are run
+  at most 'max_task_attempts' times. The shared queues aren't touched, the other processes are taking tasks from them,
+  so a task the process took but died before announcing is only given up with its run.
+  A run not finished in 'run_timeout' seconds is abandoned, its 'done' notification has the articles scraped so far
+  and the messages of its remaining tasks are ignored.
+
+  The validators of a listing page are only stored when its run finishes and all the articles found on it were stored,
+  otherwise the page would be 'not modified' in the next run and the failed articles would never be found again.
+  """
+
+  # seconds between checking the processes and the deadlines
+  supervise_interval = 1
+  # seconds between checking if the periodic scraping should stop
+  stop_poll_interval = 1
+  # seconds after the task timeout before a process is considered stuck
+  stuck_grace = 30
+  # seconds a process gets to exit after SIGTERM before it's killed
+  kill_grace = 10
+  max_task_attempts = 2
+
+  def __init__(
+      self,
+      notifier: Notifier,
+      proc_count: int = 1,
+      parse_proc_count: int = 0,
+      parse_queue_size: int = 64,
+      task_timeout: float | None = None,
+      run_timeout: float | None = None,
+  ):
     self.log = log_utils.create_console_logger(__name__)
 
     self.proc_count = proc_count
-    if self.proc_count > mp.cpu_count():
+    if parse_proc_count == 0 and self.proc_count > mp.cpu_count():
       self.proc_count = mp.cpu_count()
       self.log.info(f"limiting number of processes to {self.proc_count} (number of cpu cores)")
 
+    self.parse_proc_count = parse_proc_count
+    if self.parse_proc_count > mp.cpu_count():
+      self.parse_proc_count = mp.cpu_count()
+      self.log.info(f"limiting number of parser processes to {self.parse_proc_count} (number of cpu cores)")
+    self.parse_queue_size = parse_queue_size
+
+    self.task_timeout = task_timeout
+    self.run_timeout = run_timeout
+
     self.notifier = notifier
 
+    self.__configs = []
+    self.__scrape_options_kwargs_list = []
+    self.__proc = []
+    self.__work_queues = None
+    self.__output_queue = None
+    self.__parser_proc = []
+    self.__parser_queues = None
+    self.__tasks = {}
+    # if the tasks of a scrape config can be stolen by the other processes, by (config index, scrape config index)
+    self.__stealable = {}
+    self.__validator_cache = None
+    # the ids of the tasks running in each scraper process
+    self.__worker_tasks = []
+    self.__runs = set()
+    self.__next_task_id = 0
+
   # TODO: unify config and scrape options
   def scrape(self, configs: list[Config], scrape_options_kwargs_list: list[dict]):
-    
-    proc_count = self.proc_count
-    if len(configs) < self.proc_count:
-      proc_count = len(configs)
-      self.log.info(f"limiting number of processes to {len(configs)} (number of configs)")
-    
-    # start processes
-    proc = [] 
-    input_queue = mp.Queue(maxsize=proc_count)
-    output_queue = mp.Queue(maxsize=len(configs))
-    for i in range(proc_count):
-      scraper = Scraper(id=i)
-      name = f"Scraper-{i}"
-      p = mp.Process(
-        name=name, 
-        target=scraper.scrape_articles_from_queue, 
-        args=(input_queue, output_queue)
-      )
-      p.start()
-      proc.append(p)
-      self.log.info(f"started process {name}")
-    
-    # put the work into the queue
-    # scrape options will be constructed in the child process to avoid unpicklable objects
-    for i in range(len(configs)):
-      input_queue.put((configs[i], scrape_options_kwargs_list[i]))
-
-    # wait for process responses, only store the unique ones
-    ids = set()
-    scraped_meta = []
-    for i in range(len(configs)):
-      # TODO: could hang indefinitely
-      meta = output_queue.get()
-      for item in meta:
-        if item["id"] in ids:
-          continue
+    """
+    Scrapes every config once, and sends a 'done' notification with the scraped articles.
+    """
+    if len(configs) == 0:
+      self.log.warning("no configs found, nothing to scrape")
+      return
+
+    self.start(configs, scrape_options_kwargs_list)
+    try:
+      run = self.start_run(list(range(len(configs))))
+      while not run.done:
+        self.process_message(self.supervise_interval)
+        self.supervise()
+    finally:
+      self.stop()
+
+  def scrape_periodically(
+      self,
+      configs: list[Config],
+      scrape_options_kwargs_list: list[dict],
+      scheduler: Scheduler,
+      stop_event: threading.Event,
+  ):
+    """
+    Scrapes the configs when the scheduler says so until 'stop_event' is set, then waits for the
+    ongoing runs. Every run sends its own 'done' notification. A config isn't started again while
+    its previous run is still going on, that run of it is skipped.
+    """
+    if len(configs) == 0:
+      self.log.warning("no configs found, nothing to scrape")
+      return
+
+    self.start(configs, scrape_options_kwargs_list)
+    try:
+      # the ongoing run of each config
+      runs = {}
+      while not stop_event.is_set():
+        now = time.monotonic()
+        for config_index in scheduler.pop_due(now):
+          scheduler.schedule_next(config_index, now)
+          if config_index in runs:
+            self.log.warning(f"previous run of config {self.__get_config_name(config_index)} is still going on, skipping this one")
+            continue
+          runs[config_index] = self.start_run([config_index])
+
+        timeout = min(self.stop_poll_interval, self.supervise_interval)
+        next_run_time = scheduler.next_run_time()
+        if next_run_time is not None:
+          timeout = min(timeout, max(next_run_time - time.monotonic(), 0))
+        try:
+          self.process_message(timeout)
+          self.supervise()
+        except Exception:
+          # keep going with the other runs
+          self.log.exception("error while processing the results of the scraper processes")
+
+        runs = {i: run for i, run in runs.items() if not run.done}
+
+      self.log.info(f"stopping, waiting for {len(runs)} ongoing runs")
+      while any(not run.done for run in runs.values()):
+        self.process_message(self.supervise_interval)
+        self.supervise()
+    finally:
+      self.stop()
+
+  def start(self, configs: list[Config], scrape_options_kwargs_list: list[dict]) -> None:
+    """
+    Starts the scraper processes, the configs are sent to all of them once.
+    """
+    self.__configs = configs
+    self.__scrape_options_kwargs_list = scrape_options_kwargs_list
+    self.__work_queues = WorkQueues(self.proc_count)
+    self.__output_queue = mp.Queue()
+    self.__tasks = {}
+    self.__stealable = {}
+    self.__runs = set()
+    self.__next_task_id = 0
+    factory = scrape_options_kwargs_list[0].get('validator_cache_factory', NoOpValidatorCacheFactory)
+    self.__validator_cache = factory.create()
+
+    self.__parser_proc = []
+    self.__parser_queues = None
+    if self.parse_proc_count > 0:
+      self.__parser_queues = ParserQueues(self.proc_count, self.parse_queue_size, self.parse_proc_count)
+      self.__parser_proc = [self.__start_parser(i) for i in range(self.parse_proc_count)]
+
+    self.__proc = [self.__start_worker(i) for i in range(self.proc_count)]
+    self.__worker_tasks = [set() for _ in range(self.proc_count)]
+
+  def stop(self) -> None:
+    """
+    Stops the scraper processes after they finish their tasks, the ones which don't finish in time are killed.
+    """
+    # the tasks still in the queues belong to abandoned runs
+    self.__work_queues.clear()
 
-        ids.add(item["id"])
-        scraped_meta.append(item)
-    
     # send 'done' messages
-    for i in range(proc_count):
-      input_queue.put((None, None))
-    
-    input_queue.close()
-    output_queue.close()
+    self.__work_queues.put_sentinels()
 
     # wait for processes
-    for i in range(proc_count):
-      p.join()
-      self.log.info(f"process {name} finished")
+    timeout = None if self.task_timeout is None else self.task_timeout + self.stuck_grace
+    for p in self.__proc:
+      self.__join(p, timeout)
     self.log.info(f"all scraper processes have finished")
 
-    if len(scraped_meta) == 0:
+    # the scraper processes don't send pages anymore
+    if self.__parser_queues is not None:
+      for _ in self.__parser_proc:
+        self.__parser_queues.request_queue.put(None)
+      for p in self.__parser_proc:
+        self.__join(p, timeout)
+      self.__parser_queues.close()
+
+    self.__work_queues.close()
+    self.__output_queue.close()
+    self.__proc = []
+    self.__parser_proc = []
+    try:
+      self.__validator_cache.close()
+    except Exception:
+      self.log.exception("failed to close the validator cache")
+
+  def start_run(self, config_indexes: list[int]) -> ScrapeRun:
+    """
+    Puts a task into the queues for every scrape config of the configs, which finds its article urls.
+    """
+    deadline = None if self.run_timeout is None else time.monotonic() + self.run_timeout
+    run = ScrapeRun(config_indexes, deadline)
+    self.__runs.add(run)
+    for config_index in config_indexes:
+      self.log.info(f"starting to scrape config {self.__get_config_name(config_index)}")
+      for scrape_config_index, scrape_config in enumerate(self.__configs[config_index].scrape_configs):
+        # routed by the host of its first url
+        self.__submit(run, ScrapeTask(config_index, scrape_config_index), scrape_config.urls[0])
+    return run
+
+  def process_message(self, timeout: float = None) -> bool:
+    """
+    Processes a message of the scraper processes: the found urls become new tasks of the same run, the validators
+    of the listing pages are kept until the run finishes, and the run is finished when all of its tasks are done.
+    Returns False after 'timeout' seconds without messages.
+    """
+    try:
+      message, task_id, payload = self.__output_queue.get(timeout=timeout)
+    except queue.Empty:
+      return False
+
+    submitted = self.__tasks.get(task_id)
+    if submitted is None:
+      # a task of an abandoned run, or one which was put back into the queues but finished after all
+      return True
+
+    run = submitted.run
+    if message == Scraper.message_started:
+      self.__worker_tasks[payload].add(task_id)
+      submitted.worker_index = payload
+      if self.task_timeout is not None:
+        submitted.deadline = time.monotonic() + self.task_timeout + self.stuck_grace
+      return True
+
+    if message == Scraper.message_found:
+      key = (payload.config_index, payload.scrape_config_index, payload.article_url)
+      if key not in run.found:
+        run.found.add(key)
+        self.__submit(run, payload, payload.article_url)
+      return True
+
+    if message == Scraper.message_listed:
+      listing_url, validators = payload
+      run.listed[listing_url] = validators
+      return True
+
+    self.__complete(task_id, payload)
+    return True
+
+  def supervise(self) -> None:
+    """
+    Replaces the processes which exited or are stuck, and abandons the runs which are past their deadline.
+    """
+    now = time.monotonic()
+    for i, p in enumerate(self.__proc):
+      if p.is_alive():
+        stuck = [
+          task_id for task_id in self.__worker_tasks[i]
+          if self.__tasks[task_id].deadline is not None and self.__tasks[task_id].deadline < now
+        ]
+        if len(stuck) == 0:
+          continue
+        self.log.error(f"process {p.name} is stuck on {[self.__tasks[t].task for t in stuck]}, terminating it")
+        self.__terminate(p)
+      elif p.exitcode == 0:
+        self.log.info(f"process {p.name} exited after running its maximum number of tasks")
+      else:
+        self.log.error(f"process {p.name} died with exit code {p.exitcode}")
+
+      self.__restart_worker(i)
+
+    for i, p in enumerate(self.__parser_proc):
+      if not p.is_alive():
+        self.log.error(f"process {p.name} died with exit code {p.exitcode}")
+        # the scraper process waiting for the page it was parsing gets an error instead
+        if self.__parser_queues.fail_in_progress(i, f"process {p.name} died while parsing the page"):
+          self.log.warning(f"failed the page process {p.name} was parsing")
+        self.__parser_proc[i] = self.__start_parser(i)
+
+    for run in [run for run in self.__runs if run.deadline is not None and run.deadline < now]:
+      self.__abandon_run(run)
+
+  def __start_worker(self, worker_index: int) -> mp.Process:
+    # scrape options will be constructed in the child process to avoid unpicklable objects
+    scraper = Scraper(id=worker_index)
+    name = f"Scraper-{worker_index}"
+    p = mp.Process(
+      name=name,
+      target=scraper.scrape_tasks_from_queues,
+      args=(
+        self.__configs,
+        self.__scrape_options_kwargs_list,
+        self.__work_queues,
+        worker_index,
+        self.__output_queue,
+        self.__parser_queues,
+      )
+    )
+    p.start()
+    self.log.info(f"started process {name}")
+    return p
+
+  def __start_parser(self, parser_index: int) -> mp.Process:
+    parser = Parser(id=parser_index, log_level=self.__scrape_options_kwargs_list[0]['log_level'])
+    name = f"Parser-{parser_index}"
+    p = mp.Process(name=name, target=parser.parse_from_queue, args=(self.__configs, self.__parser_queues, parser_index))
+    p.start()
+    self.log.info(f"started process {name}")
+    return p
+
+  def __restart_worker(self, worker_index: int) -> None:
+    # the messages the process sent before it exited
+    while self.process_message(0):
+      pass
+
+    for task_id in list(self.__worker_tasks[worker_index]):
+      submitted = self.__tasks[task_id]
+      if submitted.attempts >= self.max_task_attempts:
+        self.log.error(f"giving up on {submitted.task} after {submitted.attempts} attempts")
+        self.__complete(task_id, [])
+        continue
+
+      submitted.attempts += 1
+      submitted.worker_index = None
+      submitted.deadline = None
+      self.__put(task_id, submitted)
+    self.__worker_tasks[worker_index] = set()
+
+    self.__proc[worker_index] = self.__start_worker(worker_index)
+
+  def __join(self, p: mp.Process, timeout: float | None) -> None:
+    p.join(timeout)
+    if p.is_alive():
+      self.log.error(f"process {p.name} didn't finish in {timeout} seconds, terminating it")
+      self.__terminate(p)
+    self.log.info(f"process {p.name} finished")
+
+  def __terminate(self, p: mp.Process) -> None:
+    p.terminate()
+    p.join(self.kill_grace)
+    if p.is_alive():
+      # last resort, the queues it was using may be left locked or corrupted
+      self.log.error(f"process {p.name} didn't exit in {self.kill_grace} seconds after SIGTERM, killing it")
+      p.kill()
+      p.join()
+
+  def __submit(self, run: ScrapeRun, task: ScrapeTask, url: str) -> None:
+    task_id = self.__next_task_id
+    self.__next_task_id += 1
+    run.pending.add(task_id)
+    self.__tasks[task_id] = SubmittedTask(run, task, url)
+    self.__put(task_id, self.__tasks[task_id])
+
+  def __put(self, task_id: int, submitted: SubmittedTask) -> None:
+    task = submitted.task
+    key = (task.config_index, task.scrape_config_index)
+    if key not in self.__stealable:
+      # every process limits the requests to a host on its own, the limit only holds if one process sends them
+      scrape_config = self.__configs[task.config_index].scrape_configs[task.scrape_config_index]
+      host_scheduler = HostScheduler(self.__scrape_options_kwargs_list[task.config_index].get('host_rate_limit'))
+      self.__stealable[key] = not host_scheduler.is_limited(scrape_config.rate_limit)
+    self.__work_queues.put(task_id, task, submitted.url, self.__stealable[key])
+
+  def __complete(self, task_id: int, scraped_meta: list[dict]) -> None:
+    submitted = self.__tasks.pop(task_id)
+    if submitted.worker_index is not None:
+      self.__worker_tasks[submitted.worker_index].discard(task_id)
+
+    run = submitted.run
+    run.pending.discard(task_id)
+    run.add_scraped_meta(scraped_meta)
+    if submitted.task.article_url is not None and len(scraped_meta) == 0:
+      run.failed_listings.add(submitted.task.listing_url)
+    if run.done:
+      self.__store_validators(run)
+      self.__finish_run(run)
+
+  def __store_validators(self, run: ScrapeRun) -> None:
+    for listing_url, validators in run.listed.items():
+      if listing_url in run.failed_listings:
+        self.log.info(f"not storing the validators of {listing_url}, some of its articles weren't scraped")
+        continue
+      try:
+        self.__validator_cache.store(listing_url, validators)
+      except Exception:
+        self.log.exception(f"failed to store the validators of {listing_url}")
+
+  def __abandon_run(self, run: ScrapeRun) -> None:
+    names = [self.__get_config_name(i) for i in run.config_indexes]
+    self.log.error(f"configs {names} didn't finish in {self.run_timeout} seconds, abandoning {len(run.pending)} unfinished tasks")
+
+    # the processes may still be running some of the tasks or take the queued ones, their messages are ignored
+    for task_id in run.pending:
+      submitted = self.__tasks.pop(task_id)
+      if submitted.worker_index is not None:
+        self.__worker_tasks[submitted.worker_index].discard(task_id)
+    run.pending.clear()
+    # the validators aren't stored, the listing pages are processed again by the next run
+    self.__finish_run(run)
+
+  def __finish_run(self, run: ScrapeRun) -> None:
+    self.__runs.discard(run)
+    names = [self.__get_config_name(i) for i in run.config_indexes]
+    self.log.info(f"finished scraping configs {names}")
+
+    if len(run.scraped_meta) == 0:
       self.log.warning("no scraped article ids found, no notification sent")
-      return 
+      return
+
+    self.notifier.send_done_notification(run.scraped_meta)
+    self.log.info(f"sent a 'done' notification for {len(run.scraped_meta)} articles")
 
-    self.notifier.send_done_notification(scraped_meta)
-    self.log.info(f"sent a 'done' notification for {len(scraped_meta)} articles")
\ No newline at end of file
+  def __get_config_name(self, config_index: int) -> str:
+    config = self.__configs[config_index]
+    return config.file_path if config.file_path is not None else str(config_index)
@@ -0,0 +1,313 @@
+"""
+On-disk archive of http responses, used to record a crawl and replay it later without any network access.
+
+The archive is a directory of segment files with WARC/1.0 'response' records, every record is 
+a separate gzip member so it can be read on its own. Every process writes its own segments and
+its own index file, which maps the requested urls to the position of their record in the segments.
+"""
+
+import gzip
+import io
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from http import client
+from pathlib import Path
+import click
+from cli_aware import ClickCliAware
+from utils import log_utils
+from utils.http_utils import HttpConnectionPool, HttpResponse, HttpException, BodyPolicy, ContentTypeException
+
+# these describe the transfer, the archived bodies are stored decompressed
+_transfer_headers = ["content-encoding", "transfer-encoding", "content-length", "connection", "keep-alive"]
+
+def _strip_transfer_headers(headers: client.HTTPMessage, body: bytes) -> client.HTTPMessage:
+  stripped = client.HTTPMessage()
+  for k, v in headers.items():
+    if k.lower() not in _transfer_headers:
+      stripped[k] = v
+  stripped["Content-Length"] = str(len(body))
+  return stripped
+
+# the archive has the whole responses, the conditional requests are answered from them
+_conditional_headers = ["if-none-match", "if-modified-since"]
+
+def _strip_conditional_headers(headers: dict[str, str] | None) -> dict[str, str] | None:
+  if headers is None:
+    return None
+  return {k: v for k, v in headers.items() if k.lower() not in _conditional_headers}
+
+def _is_not_modified(request_headers: dict[str, str] | None, status: int, response_headers: client.HTTPMessage) -> bool:
+  """
+  Tells if the server would answer 304 Not Modified to the conditional request, If-None-Match takes precedence.
+  """
+  if request_headers is None or status != 200:
+    return False
+  request_headers = {k.lower(): v for k, v in request_headers.items()}
+
+  if "if-none-match" in request_headers:
+    etag = response_headers.get("ETag")
+    etags = [t.strip() for t in request_headers["if-none-match"].split(",")]
+    return etag is not None and (etag in etags or "*" in etags)
+
+  last_modified = response_headers.get("Last-Modified")
+  return last_modified is not None and request_headers.get("if-modified-since") == last_modified
+
+def _create_response(
+    url: str,
+    status: int,
+    reason: str,
+    headers: client.HTTPMessage,
+    body: bytes,
+    request_headers: dict[str, str] | None,
+) -> HttpResponse:
+  if _is_not_modified(request_headers, status, headers):
+    return HttpResponse.from_bytes(url, 304, "Not Modified", _strip_transfer_headers(headers, b""), b"")
+  return HttpResponse.from_bytes(url, status, reason, headers, body)
+
+
+class HttpArchiveWriter:
+
+  def __init__(self, archive_dir: str, segment_size: int = 64 * 1024 * 1024):
+    self.archive_dir = Path(archive_dir)
+    self.archive_dir.mkdir(parents=True, exist_ok=True)
+    self.segment_size = segment_size
+
+    self.__lock = threading.Lock()
+    self.__prefix = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+    self.__segment_number = -1
+    self.__segment = None
+    self.__index = open(self.archive_dir.joinpath(f"index-{self.__prefix}.jsonl"), "a")
+    self.__next_segment()
+
+  def __next_segment(self) -> None:
+    if self.__segment is not None:
+      self.__segment.close()
+    self.__segment_number += 1
+    self.__segment_name = f"segment-{self.__prefix}-{self.__segment_number:05d}.warc.gz"
+    self.__segment = open(self.archive_dir.joinpath(self.__segment_name), "ab")
+
+  def write(
+      self, 
+      url: str, 
+      final_url: str, 
+      status: int, 
+      reason: str, 
+      headers: client.HTTPMessage, 
+      body: bytes,
+  ) -> None:
+    """
+    Appends a response to the archive, 'url' is the requested url, 'final_url' is the url after redirects.
+    """
+    date = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    http_block = io.BytesIO()
+    http_block.write(f"HTTP/1.1 {status} {reason}\r\n".encode("latin-1"))
+    for k, v in _strip_transfer_headers(headers, body).items():
+      http_block.write(f"{k}: {v}\r\n".encode("latin-1", errors="replace"))
+    http_block.write(b"\r\n")
+    http_block.write(body)
+    http_block = http_block.getvalue()
+
+    warc_headers = (
+      "WARC/1.0\r\n"
+      "WARC-Type: response\r\n"
+      f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>\r\n"
+      f"WARC-Date: {date}\r\n"
+      f"WARC-Target-URI: {final_url}\r\n"
+      "Content-Type: application/http; msgtype=response\r\n"
+      f"Content-Length: {len(http_block)}\r\n"
+      "\r\n"
+    )
+    record = gzip.compress(warc_headers.encode("utf-8") + http_block + b"\r\n\r\n")
+
+    with self.__lock:
+      if self.__segment.tell() > 0 and self.__segment.tell() + len(record) > self.segment_size:
+        self.__next_segment()
+
+      offset = self.__segment.tell()
+      self.__segment.write(record)
+      self.__segment.flush()
+
+      entry = {
+        "url": url,
+        "segment": self.__segment_name,
+        "offset": offset,
+        "length": len(record),
+        "status": status,
+        "date": date,
+      }
+      self.__index.write(json.dumps(entry) + "\n")
+      self.__index.flush()
+
+  def close(self) -> None:
+    with self.__lock:
+      self.__segment.close()
+      self.__index.close()
+
+
+class HttpArchiveReader:
+
+  def __init__(self, archive_dir: str):
+    self.archive_dir = Path(archive_dir)
+    if not self.archive_dir.is_dir():
+      raise ValueError(f"http archive directory not found: {archive_dir}")
+
+    # the latest record of a url wins
+    self.__index: dict[str, dict] = {}
+    for index_file in self.archive_dir.glob("index-*.jsonl"):
+      with open(index_file, "r") as f:
+        for line in f:
+          entry = json.loads(line)
+          current = self.__index.get(entry["url"])
+          if current is None or current["date"] <= entry["date"]:
+            self.__index[entry["url"]] = entry
+
+  def __len__(self) -> int:
+    return len(self.__index)
+
+  def get(self, url: str) -> tuple[str, int, str, client.HTTPMessage, bytes] | None:
+    """
+    Returns the final url, status, reason, headers and body archived for 'url', or None if it wasn't archived.
+    """
+    entry = self.__index.get(url)
+    if entry is None:
+      return None
+
+    with open(self.archive_dir.joinpath(entry["segment"]), "rb") as f:
+      f.seek(entry["offset"])
+      record = gzip.decompress(f.read(entry["length"]))
+
+    warc_headers, http_block = record.split(b"\r\n\r\n", 1)
+    final_url = url
+    for line in warc_headers.split(b"\r\n"):
+      if line.startswith(b"WARC-Target-URI:"):
+        final_url = line.split(b":", 1)[1].strip().decode("utf-8")
+
+    fp = io.BytesIO(http_block)
+    status_line = fp.readline().decode("latin-1").rstrip("\r\n")
+    _, status, reason = (status_line.split(" ", 2) + [""])[:3]
+    headers = client.parse_headers(fp)
+    body = fp.read(int(headers.get("Content-Length", 0)))
+    return final_url, int(status), reason, headers, body
+
+
+class RecordingHttpPool:
+  """
+  Sends the requests through 'http_pool' and archives every response. The requests are sent without their conditional
+  headers, so the whole responses are archived, and answered with 304 here if the archived response is not modified.
+  The bodies are read according to 'body_policy':
+  only the headers of the responses with other content types are archived, since the scrapers reject them before
+  reading their body, and the bodies larger than its 'max_size' are aborted without archiving anything.
+  """
+
+  def __init__(self, http_pool: HttpConnectionPool, writer: HttpArchiveWriter, body_policy: BodyPolicy = BodyPolicy()):
+    self.http_pool = http_pool
+    self.writer = writer
+    self.body_policy = body_policy
+
+  def request(self, url: str, headers: dict[str, str] = None) -> HttpResponse:
+    with self.http_pool.request(url, _strip_conditional_headers(headers)) as res:
+      try:
+        res.check_content_type(self.body_policy.content_types)
+        body = res.read(self.body_policy.max_size)
+      except ContentTypeException:
+        body = b""
+    self.writer.write(url, res.url, res.status, res.reason, res.headers, body)
+    return _create_response(res.url, res.status, res.reason, _strip_transfer_headers(res.headers, body), body, headers)
+
+  def close(self) -> None:
+    self.http_pool.close()
+    self.writer.close()
+
+
+class ReplayHttpPool:
+  """
+  Serves the requests from an archive without using the network. Conditional requests get 304 Not Modified
+  if their validators match the archived response.
+  """
+
+  def __init__(self, reader: HttpArchiveReader):
+    self.reader = reader
+
+  def request(self, url: str, headers: dict[str, str] = None) -> HttpResponse:
+    archived = self.reader.get(url)
+    if archived is None:
+      raise HttpException(f"{url} not found in the http archive")
+
+    final_url, status, reason, response_headers, body = archived
+    return _create_response(final_url, status, reason, response_headers, body, headers)
+
+  def close(self) -> None:
+    pass
+
+
+class HttpArchiveFactory(ClickCliAware):
+
+  config = {}
+
+  log = log_utils.create_console_logger(
+    name="HttpArchiveFactory",
+  )
+
+  mode_off = "off"
+  mode_record = "record"
+  mode_replay = "replay"
+
+  @staticmethod
+  def register_cli_options(**kwargs) -> list[click.Option]:
+    return [
+      click.Option(
+        param_decls=["--http-archive-mode"],
+        help="'record' archives every downloaded response, 'replay' serves all requests from the archive without using the network",
+        type=click.Choice([HttpArchiveFactory.mode_off, HttpArchiveFactory.mode_record, HttpArchiveFactory.mode_replay]),
+        default=HttpArchiveFactory.mode_off,
+        envvar="HTTP_ARCHIVE_MODE",
+        show_default=True,
+        show_envvar=True,
+        callback=lambda ctx, param, value: HttpArchiveFactory.config.update({'mode': value})
+      ),
+      click.Option(
+        param_decls=["--http-archive-path"],
+        help="Http archive directory",
+        default="http_archive",
+        envvar="HTTP_ARCHIVE_PATH",
+        show_default=True,
+        show_envvar=True,
+        callback=lambda ctx, param, value: HttpArchiveFactory.config.update({'path': value})
+      ),
+      click.Option(
+        param_decls=["--http-archive-segment-size"],
+        help="Size of the http archive segment files in MiB",
+        type=click.IntRange(min=1),
+        default=64,
+        envvar="HTTP_ARCHIVE_SEGMENT_SIZE",
+        show_default=True,
+        show_envvar=True,
+        callback=lambda ctx, param, value: HttpArchiveFactory.config.update({'segment_size': value})
+      ),
+    ]
+
+  @staticmethod
+  def wrap(
+      http_pool: HttpConnectionPool,
+      body_policy: BodyPolicy = BodyPolicy(),
+  ) -> HttpConnectionPool | RecordingHttpPool | ReplayHttpPool:
+    """
+    Wraps the pool according to the configured archive mode, the recorded bodies are limited by 'body_policy'.
+    """
+    config = HttpArchiveFactory.config
+
+    if config["mode"] == HttpArchiveFactory.mode_record:
+      HttpArchiveFactory.log.info(f"recording http responses to archive {config['path']}")
+      writer = HttpArchiveWriter(config["path"], config["segment_size"] * 1024 * 1024)
+      return RecordingHttpPool(http_pool, writer, body_policy)
+
+    if config["mode"] == HttpArchiveFactory.mode_replay:
+      reader = HttpArchiveReader(config["path"])
+      HttpArchiveFactory.log.info(f"replaying {len(reader)} http responses from archive {config['path']}")
+      return ReplayHttpPool(reader)
+
+    return http_pool
@@ -1,5 +1,18 @@
 from random import randint
-from urllib import request
+import io
+from urllib.parse import urlparse, urljoin
+from http import client
+import ssl
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import zlib
+import codecs
+import re
+import brotli
+import click
+from cli_aware import ClickCliAware
 
 os_versions = [
   "(Windows NT 6.1; Win64; x64; rv:47.0)",
@@ -47,7 +60,640 @@ def __get_random_ua_header() -> str:
   safari = "Safari/537.36"
   return f"{moz} {os} {webkit} {chrome} {safari}"
 
-def create_request(url: str) -> request.Request:
-  req = request.Request(url)
-  req.add_header("User-Agent", __get_random_ua_header())
-  return req
\ No newline at end of file
+accepted_encodings = ["gzip", "deflate", "br"]
+
+def create_headers() -> dict[str, str]:
+  return {
+    "User-Agent": __get_random_ua_header(),
+    "Accept-Encoding": ", ".join(accepted_encodings),
+  }
+
+
+class HttpException(Exception): pass
+
+class HttpStatusException(HttpException):
+
+  def __init__(self, url: str, status: int, reason: str = "", retry_after: float = None):
+    super().__init__(f"http status {status} {reason} for {url}")
+    self.url = url
+    self.status = status
+    # seconds the server asked us to wait with the Retry-After header
+    self.retry_after = retry_after
+
+class BodyTooLargeException(HttpException):
+
+  def __init__(self, url: str, max_size: int):
+    super().__init__(f"response body of {url} is larger than {max_size} bytes")
+    self.url = url
+    self.max_size = max_size
+
+class ContentTypeException(HttpException):
+
+  def __init__(self, url: str, content_type: str):
+    super().__init__(f"content type {content_type} of {url} is not allowed")
+    self.url = url
+    self.content_type = content_type
+
+def parse_retry_after(value: str | None) -> float | None:
+  """
+  Parses a Retry-After header, which is either a number of seconds or an http date.
+  """
+  if value is None:
+    return None
+
+  value = value.strip()
+  if value.isdigit():
+    return float(value)
+
+  try:
+    date = parsedate_to_datetime(value)
+  except (TypeError, ValueError):
+    return None
+  if date.tzinfo is None:
+    date = date.replace(tzinfo=timezone.utc)
+  return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+class _IdentityDecoder:
+
+  def decompress(self, data: bytes) -> bytes:
+    return data
+
+  def flush(self) -> bytes:
+    return b""
+
+class _GzipDecoder:
+
+  def __init__(self):
+    # 16 + MAX_WBITS expects a gzip header and trailer
+    self.__decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+  def decompress(self, data: bytes) -> bytes:
+    return self.__decompressor.decompress(data)
+
+  def flush(self) -> bytes:
+    return self.__decompressor.flush()
+
+class _DeflateDecoder:
+  """
+  'deflate' is supposed to be a zlib stream, 
+  but some servers send raw deflate data without the zlib header
+  """
+
+  def __init__(self):
+    self.__decompressor = None
+    self.__buffer = b""
+
+  def decompress(self, data: bytes) -> bytes:
+    if self.__decompressor is None:
+      # the zlib header is 2 bytes, wait until it arrives to decide the format
+      self.__buffer += data
+      if len(self.__buffer) < 2:
+        return b""
+      data, self.__buffer = self.__buffer, b""
+      is_zlib = data[0] & 0x0F == 8 and ((data[0] << 8) | data[1]) % 31 == 0
+      self.__decompressor = zlib.decompressobj(zlib.MAX_WBITS if is_zlib else -zlib.MAX_WBITS)
+    return self.__decompressor.decompress(data)
+
+  def flush(self) -> bytes:
+    if self.__decompressor is None:
+      # less than 2 bytes arrived in total, it can't be a zlib stream
+      return zlib.decompress(self.__buffer, -zlib.MAX_WBITS) if len(self.__buffer) > 0 else b""
+    return self.__decompressor.flush()
+
+class _BrotliDecoder:
+
+  def __init__(self):
+    self.__decompressor = brotli.Decompressor()
+
+  def decompress(self, data: bytes) -> bytes:
+    return self.__decompressor.process(data)
+
+  def flush(self) -> bytes:
+    return b""
+
+def _create_decoders(content_encoding: str | None) -> list:
+  """
+  Returns the decoders for a Content-Encoding header, in the order they have to be applied.
+  """
+  if content_encoding is None:
+    return [_IdentityDecoder()]
+
+  decoders = []
+  # encodings are listed in the order they were applied, so decode in reverse
+  for encoding in reversed(content_encoding.split(",")):
+    encoding = encoding.strip().lower()
+    if encoding == "" or encoding == "identity":
+      continue
+    elif encoding == "gzip" or encoding == "x-gzip":
+      decoders.append(_GzipDecoder())
+    elif encoding == "deflate":
+      decoders.append(_DeflateDecoder())
+    elif encoding == "br":
+      decoders.append(_BrotliDecoder())
+    else:
+      raise HttpException(f"unsupported content encoding: {encoding}")
+
+  if len(decoders) == 0:
+    return [_IdentityDecoder()]
+  return decoders
+
+
+# browsers look for the meta charset in the first 1024 bytes of the document
+_charset_prescan_size = 1024
+_meta_charset_pattern = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([a-zA-Z0-9_:.-]+)""", re.IGNORECASE)
+_boms = [
+  (codecs.BOM_UTF8, "utf-8-sig"),
+  (codecs.BOM_UTF16_LE, "utf-16"),
+  (codecs.BOM_UTF16_BE, "utf-16"),
+]
+# labels which browsers decode as windows-1252
+_windows_1252_aliases = ["iso-8859-1", "latin-1", "latin1", "us-ascii", "ascii"]
+
+def detect_charset(headers: client.HTTPMessage, head: bytes) -> str:
+  """
+  Detects the charset of a document from its byte order mark, Content-Type header 
+  or meta tags in 'head' (the start of the body), in this order. Defaults to utf-8.
+  """
+  for bom, charset in _boms:
+    if head.startswith(bom):
+      return charset
+
+  candidates = [headers.get_content_charset()]
+  match = _meta_charset_pattern.search(head[:_charset_prescan_size])
+  if match is not None:
+    candidates.append(match.group(1).decode("ascii"))
+
+  for charset in candidates:
+    if charset is None:
+      continue
+    charset = charset.strip().lower()
+    if charset in _windows_1252_aliases:
+      return "cp1252"
+    try:
+      codecs.lookup(charset)
+      return charset
+    except LookupError:
+      continue
+
+  return "utf-8"
+
+
+class BufferedResponse:
+  """
+  In-memory stand-in for http.client.HTTPResponse, 
+  used to serve responses which are not read from a connection.
+  """
+
+  def __init__(self, status: int, reason: str, headers: client.HTTPMessage, body: bytes):
+    self.status = status
+    self.reason = reason
+    self.headers = headers
+    self.will_close = False
+    self.__body = io.BytesIO(body)
+
+  def read(self, amt: int = None) -> bytes:
+    return self.__body.read(amt)
+
+  def close(self) -> None:
+    self.__body.close()
+
+
+class HttpResponse:
+  """
+  Response returned by HttpConnectionPool.request.
+
+  The body is decompressed while it is being read according to its Content-Encoding.
+  The underlying connection is given back to the pool after the whole body 
+  has been read, closing the response before that discards the connection.
+  """
+
+  chunk_size = 64 * 1024
+
+  def __init__(self, url: str, response: client.HTTPResponse, release):
+    self.url = url
+    self.status = response.status
+    self.reason = response.reason
+    self.headers = response.headers
+    self.__response = response
+    self.__release = release
+    self.__released = False
+
+  @staticmethod
+  def from_bytes(url: str, status: int, reason: str, headers: client.HTTPMessage, body: bytes) -> "HttpResponse":
+    """
+    Creates a response with an already downloaded (and decompressed) body.
+    """
+    return HttpResponse(url, BufferedResponse(status, reason, headers, body), lambda reusable: None)
+
+  @property
+  def content_type(self) -> str | None:
+    content_type = self.headers.get("Content-Type")
+    if content_type is None:
+      return None
+    return self.headers.get_content_type()
+
+  def check_content_type(self, content_types: list[str]) -> None:
+    """
+    Closes the response before downloading the body if its Content-Type is not 
+    in 'content_types'. Responses without a Content-Type and empty lists are allowed.
+    """
+    if len(content_types) == 0 or self.content_type is None:
+      return
+    if self.content_type not in content_types:
+      self.close()
+      raise ContentTypeException(self.url, self.content_type)
+
+  def iter_chunks(self, max_size: int = None):
+    """
+    Yields the decompressed body in chunks as it is downloaded.
+    The download is aborted if the decompressed body gets larger than 'max_size' bytes.
+    """
+    try:
+      content_length = self.headers.get("Content-Length")
+      if max_size is not None and content_length is not None and content_length.isdigit() and int(content_length) > max_size:
+        raise BodyTooLargeException(self.url, max_size)
+
+      size = 0
+      decoders = _create_decoders(self.headers.get("Content-Encoding"))
+      while True:
+        chunk = self.__response.read(HttpResponse.chunk_size)
+        if not chunk:
+          break
+        for d in decoders:
+          chunk = d.decompress(chunk)
+        if chunk:
+          size += len(chunk)
+          if max_size is not None and size > max_size:
+            raise BodyTooLargeException(self.url, max_size)
+          yield chunk
+
+      # flush the decoders, the output of each one is the input of the next
+      tail = b""
+      for d in decoders:
+        tail = d.decompress(tail) + d.flush()
+      if tail:
+        size += len(tail)
+        if max_size is not None and size > max_size:
+          raise BodyTooLargeException(self.url, max_size)
+        yield tail
+    except (zlib.error, brotli.error) as e:
+      self.close()
+      raise HttpException(f"failed to decompress response body of {self.url}: {e}")
+    except Exception:
+      self.close()
+      raise
+
+    self.__release_connection(reusable=True)
+
+  def read(self, max_size: int = None) -> bytes:
+    return b"".join(self.iter_chunks(max_size))
+
+  def text(self, max_size: int = None) -> str:
+    return "".join(self.iter_text(max_size))
+
+  def iter_text(self, max_size: int = None):
+    """
+    Yields the body decoded in chunks while it is downloaded, the charset is detected by 'detect_charset'
+    and invalid characters are replaced instead of failing the whole page.
+    """
+    head = b""
+    decoder = None
+    for chunk in self.iter_chunks(max_size):
+      if decoder is None:
+        # wait for enough of the body to find the meta charset
+        head += chunk
+        if len(head) < _charset_prescan_size:
+          continue
+        decoder = codecs.getincrementaldecoder(detect_charset(self.headers, head))(errors="replace")
+        chunk = head
+      text = decoder.decode(chunk)
+      if text:
+        yield text
+
+    if decoder is None:
+      decoder = codecs.getincrementaldecoder(detect_charset(self.headers, head))(errors="replace")
+      text = decoder.decode(head)
+      if text:
+        yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+      yield text
+
+  def raise_for_status(self) -> None:
+    if self.status >= 400:
+      self.close()
+      raise HttpStatusException(self.url, self.status, self.reason, parse_retry_after(self.headers.get("Retry-After")))
+
+  def close(self) -> None:
+    if not self.__released:
+      self.__response.close()
+    self.__release_connection(reusable=False)
+
+  def __release_connection(self, reusable: bool) -> None:
+    if self.__released:
+      return
+    self.__released = True
+    self.__release(reusable and not self.__response.will_close)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+
+class _TlsResumingHTTPSConnection(client.HTTPSConnection):
+  """
+  https connection which offers a previously negotiated tls session 
+  in the handshake, so the server can skip the full key exchange
+  """
+
+  def __init__(self, *args, tls_session: ssl.SSLSession = None, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.tls_session = tls_session
+    # keep a reference to the tls socket, http.client drops self.sock on 'Connection: close'
+    self.tls_socket = None
+
+  def connect(self):
+    client.HTTPConnection.connect(self)
+    server_hostname = self._tunnel_host if self._tunnel_host else self.host
+    self.sock = self._context.wrap_socket(
+      self.sock, 
+      server_hostname=server_hostname, 
+      session=self.tls_session,
+    )
+    self.tls_socket = self.sock
+
+
+class HttpConnectionPool:
+  """
+  Thread-safe pool of persistent (keep-alive) http connections, keyed by scheme, host and port.
+
+  Idle connections are reused for requests to the same host, and new https connections 
+  resume the last tls session of their host.
+  """
+
+  redirect_statuses = [301, 302, 303, 307, 308]
+
+  def __init__(
+      self, 
+      pool_size: int = 10, 
+      idle_timeout: float = 30, 
+      timeout: float = 15, 
+      max_redirects: int = 10,
+  ):
+    self.pool_size = pool_size
+    self.idle_timeout = idle_timeout
+    self.timeout = timeout
+    self.max_redirects = max_redirects
+
+    self.__ssl_context = ssl.create_default_context()
+    self.__lock = threading.Lock()
+    self.__idle_connections: dict[tuple, list[tuple[client.HTTPConnection, float]]] = {}
+    self.__tls_sessions: dict[tuple, ssl.SSLSession] = {}
+
+  def request(self, url: str, headers: dict[str, str] = None) -> HttpResponse:
+    """
+    Sends a GET request to 'url', following redirects.
+    The returned response must be read or closed, otherwise its connection is leaked.
+    """
+    for _ in range(self.max_redirects + 1):
+      response = self.__request_once(url, headers)
+      location = response.headers.get("Location")
+      if response.status not in HttpConnectionPool.redirect_statuses or location is None:
+        return response
+
+      # read the (usually empty) redirect body so the connection can be reused
+      response.read()
+      url = urljoin(url, location)
+
+    raise HttpException(f"more than {self.max_redirects} redirects for {url}")
+
+  def __request_once(self, url: str, headers: dict[str, str] = None) -> HttpResponse:
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    if scheme != "http" and scheme != "https":
+      raise HttpException(f"unsupported url scheme {scheme} in {url}")
+    
+    key = (scheme, parsed.hostname, parsed.port)
+    path = parsed.path or "/"
+    if parsed.query:
+      path += "?" + parsed.query
+
+    request_headers = create_headers()
+    if headers is not None:
+      request_headers |= headers
+
+    conn, reused = self.__acquire(key)
+    try:
+      conn.request("GET", path, headers=request_headers)
+      res = conn.getresponse()
+    except (client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+      conn.close()
+      if not reused:
+        raise
+      # the server closed the idle connection in the meantime, try once more on a new one
+      conn = self.__create_connection(key)
+      try:
+        conn.request("GET", path, headers=request_headers)
+        res = conn.getresponse()
+      except Exception:
+        conn.close()
+        raise
+    except Exception:
+      conn.close()
+      raise
+
+    self.__store_tls_session(key, conn)
+    return HttpResponse(url, res, lambda reusable: self.__release(key, conn, reusable))
+
+  def __acquire(self, key: tuple) -> tuple[client.HTTPConnection, bool]:
+    now = time.monotonic()
+    with self.__lock:
+      idle = self.__idle_connections.get(key, [])
+      while len(idle) > 0:
+        conn, last_used = idle.pop()
+        if now - last_used < self.idle_timeout:
+          return conn, True
+        conn.close()
+    return self.__create_connection(key), False
+
+  def __create_connection(self, key: tuple) -> client.HTTPConnection:
+    scheme, host, port = key
+    if scheme == "https":
+      with self.__lock:
+        tls_session = self.__tls_sessions.get(key)
+      return _TlsResumingHTTPSConnection(
+        host, 
+        port, 
+        timeout=self.timeout, 
+        context=self.__ssl_context, 
+        tls_session=tls_session,
+      )
+    return client.HTTPConnection(host, port, timeout=self.timeout)
+
+  def __store_tls_session(self, key: tuple, conn: client.HTTPConnection) -> None:
+    # the session is read after the response headers, 
+    # tls 1.3 servers only send their session tickets after the handshake
+    if not isinstance(conn, _TlsResumingHTTPSConnection) or conn.tls_socket is None:
+      return
+    session = conn.tls_socket.session
+    if session is not None:
+      with self.__lock:
+        self.__tls_sessions[key] = session
+
+  def __release(self, key: tuple, conn: client.HTTPConnection, reusable: bool) -> None:
+    if not reusable or conn.sock is None:
+      conn.close()
+      return
+
+    with self.__lock:
+      idle = self.__idle_connections.setdefault(key, [])
+      if len(idle) < self.pool_size:
+        idle.append((conn, time.monotonic()))
+        return
+    conn.close()
+
+  def close(self) -> None:
+    with self.__lock:
+      for idle in self.__idle_connections.values():
+        for conn, _ in idle:
+          conn.close()
+      self.__idle_connections.clear()
+
+
+class HttpConnectionPoolFactory(ClickCliAware):
+
+  config = {}
+
+  @staticmethod
+  def register_cli_options(**kwargs) -> list[click.Option]:
+    return [
+      click.Option(
+        param_decls=["--http-pool-size"],
+        help="Maximum number of idle keep-alive connections kept per host",
+        type=click.IntRange(min=0),
+        default=10,
+        envvar="HTTP_POOL_SIZE",
+        show_default=True,
+        show_envvar=True,
+        callback=lambda ctx, param, value: HttpConnectionPoolFactory.config.update({'pool_size': value})
+      ),
+      click.Option(
+        param_decls=["--http-pool-idle-timeout"],
+        help="Seconds after which an idle keep-alive connection is closed instead of reused",
+        type=click.FLOAT,
+        default=30,
+        envvar="HTTP_POOL_IDLE_TIMEOUT",
+        show_default=True,
+        show_envvar=True,
+        callback=lambda ctx, param, value: HttpConnectionPoolFactory.config.update({'idle_timeout': value})
+      ),
+      click.Option(
+        param_decls=["--http-timeout"],
+        help="Timeout in seconds for connecting to a host and for every read from it",
+        type=click.FLOAT,
+        default=15,
+        envvar="HTTP_TIMEOUT",
+        show_default=True,
+        show_envvar=True,
+        callback=lambda ctx, param, value: HttpConnectionPoolFactory.config.update({'timeout': value})
+      ),
+    ]
+
+  @staticmethod
+  def create() -> HttpConnectionPool:
+
+    config = HttpConnectionPoolFactory.config
+
+    return HttpConnectionPool(
+      config["pool_size"],
+      config["idle_timeout"],
+      config["timeout"],
+    )
+
+
+class BodyPolicy:
+  """
+  Limits the responses whose body is downloaded. Responses with a Content-Type which is not in 
+  'content_types' are closed before reading the body, and bodies larger than 'max_size' bytes 
+  are aborted as soon as they go over the limit.
+  """
+
+  default_max_size = 10 * 1024 * 1024
+  default_content_types = ["text/html", "application/xhtml+xml"]
+
+  def __init__(self, max_size: int = default_max_size, content_types: list[str] = default_content_types):
+    self.max_size = max_size
+    self.content_types = [t.lower() for t in content_types]
+
+  def read_text(self, res: HttpResponse) -> str:
+    res.check_content_type(self.content_types)
+    return res.text(self.max_size)
+
+  def iter_text(self, res: HttpResponse):
+    res.check_content_type(self.content_types)
+    return res.iter_text(self.max_size)
+
+
+class Page:
+  """
+  A downloaded page, 'content' is the body as returned by the body reader of the request
+  (the decoded text by default), it's None if the server answered 304 Not Modified.
+  """
+
+  def __init__(self, url: str, status: int, headers, content):
+    self.url = url
+    self.status = status
+    self.headers = headers
+    self.content = content
+
+  @property
+  def not_modified(self) -> bool:
+    return self.status == 304
+
+
+def create_conditional_headers(validators: dict | None) -> dict[str, str]:
+  """
+  Creates the If-None-Match and If-Modified-Since headers from the 
+  "etag" and "last_modified" validators of a previous response.
+  """
+  headers = {}
+  if validators is None:
+    return headers
+
+  if validators.get("etag") is not None:
+    headers["If-None-Match"] = validators["etag"]
+  if validators.get("last_modified") is not None:
+    headers["If-Modified-Since"] = validators["last_modified"]
+  return headers
+
+def get_validators(page: Page) -> dict | None:
+  """
+  Returns the ETag and Last-Modified validators of a page, or None if it has neither.
+  """
+  validators = {
+    "etag": page.headers.get("ETag"),
+    "last_modified": page.headers.get("Last-Modified"),
+  }
+  if validators["etag"] is None and validators["last_modified"] is None:
+    return None
+  return validators
+
+
+def fetch(
+    url: str, 
+    pool: HttpConnectionPool, 
+    headers: dict[str, str] = None, 
+    read_body = HttpResponse.text,
+) -> Page:
+  """
+  Downloads the page at 'url', its body is read by 'read_body', 
+  which receives the HttpResponse, and decodes it as text by default.
+  """
+  with pool.request(url, headers) as res:
+    res.raise_for_status()
+    if res.status == 304:
+      return Page(res.url, res.status, res.headers, None)
+    return Page(res.url, res.status, res.headers, read_body(res))
@@ -0,0 +1,39 @@
+from validator_cache.validator_cache import ValidatorCache
+from validator_cache.file_cache import FileValidatorCache, FileValidatorCacheFactory
+from validator_cache.noop_cache import NoOpValidatorCache, NoOpValidatorCacheFactory
+from validator_cache.redis_cache import RedisValidatorCache, RedisValidatorCacheFactory
+import click
+from cli_aware import ClickCliAware
+
+
+cache_factories = {
+  "noop": NoOpValidatorCacheFactory,
+  "file": FileValidatorCacheFactory,
+  "redis": RedisValidatorCacheFactory
+}
+
+class ValidatorCacheFactory(ClickCliAware):
+
+  config = {}
+
+  def register_cli_options() -> list:
+    opts = []
+    
+    cache_opt = click.Option(
+      param_decls=["--validator-cache"],
+      help="Cache for the ETag/Last-Modified validators of listing pages, unchanged pages are not downloaded again",
+      type=click.Choice(cache_factories.keys()),
+      default="noop",
+      show_default=True,
+      envvar="VALIDATOR_CACHE_TYPE",
+      show_envvar=True,
+      callback=lambda ctx, param, value: ValidatorCacheFactory.config.update({'type': value})
+    )
+    opts.append(cache_opt)
+    for factory in cache_factories.values():
+      opts.extend(factory.register_cli_options())
+    return opts
+
+  @staticmethod
+  def create() -> ValidatorCache:
+    return cache_factories[ValidatorCacheFactory.config['type']].create()
@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta
+import json
+import os
+from pathlib import Path
+from validator_cache import ValidatorCache
+from utils import log_utils
+import logging
+import click
+from cli_aware import ClickCliAware
+
+
+class FileValidatorCache(ValidatorCache):
+
+  @classmethod
+  def configure_logging(cls, level: int):
+    cls.loglevel = level
+    cls.log = log_utils.create_console_logger(
+      name=cls.__name__,
+      level=level
+    )
+
+  def __init__(self, cache_file_path: str, log_level: int = logging.INFO):
+    self.configure_logging(log_level)
+
+    self.__cache_file_path = cache_file_path
+    self.__cache = {} 
+    # (modification time, size) of the file when it was last loaded
+    self.__file_version = None
+    self.__create_cache_file()
+    self.__load_cache()
+    # prune expired and overwritten entries
+    self.__recreate_file()
+    self.__file_version = self.__get_file_version()
+  
+  def __create_cache_file(self):
+    file = Path(self.__cache_file_path)
+    file.parent.mkdir(parents=True, exist_ok=True)
+    file.touch(exist_ok=True)
+    self.log.info(f"created/asserted validator cache file: {self.__cache_file_path}")
+
+  def __load_cache(self):
+    # entries are appended on every update, the last line of a url wins
+    with open(self.__cache_file_path, "r") as f:
+      for line in f:
+        url, validators, exp_date = self.__parse_line(line)
+        self.__cache[url] = (validators, exp_date)
+    self.log.debug(f"loaded validator cache from file")
+  
+  def __parse_line(self, line: str) -> tuple[str, dict, datetime]:
+    try:
+      d = json.loads(line)
+      validators = {
+        "etag": d["etag"],
+        "last_modified": d["last_modified"],
+      }
+      return d["url"], validators, datetime.fromisoformat(d["expiration_date"])
+    except json.decoder.JSONDecodeError as e:
+      raise ValueError(f"Invalid cache file: {self.__cache_file_path}, json decoder error at line {line}, json error: {e}")
+    except KeyError as e:
+      raise ValueError(f"Invalid cache file: {self.__cache_file_path}, key {e.args} not found in line {line}")
+
+  def __recreate_file(self):
+    # recreates the file with only the latest, valid entries
+    self.log.debug(f"recreating validator cache file for entries with valid TTLs")
+    now = datetime.now()
+    self.__cache = {url: entry for url, entry in self.__cache.items() if entry[1] > now}
+    with open(self.__cache_file_path, "w") as f:
+      for url, (validators, exp_date) in self.__cache.items():
+        self.__write_line_to_file(f, url, validators, exp_date)
+
+  def __get_file_version(self) -> tuple[int, int] | None:
+    try:
+      stat = os.stat(self.__cache_file_path)
+    except FileNotFoundError:
+      return None
+    return stat.st_mtime_ns, stat.st_size
+
+  def __reload_if_changed(self):
+    # the validators are stored by the manager process, the scraper processes read them
+    version = self.__get_file_version()
+    if version is None or version == self.__file_version:
+      return
+    self.__file_version = version
+    try:
+      self.__load_cache()
+    except ValueError:
+      # the last line may be half written, it's loaded again the next time
+      self.__file_version = None
+
+  def get(self, url: str) -> dict | None:
+    self.__reload_if_changed()
+    entry = self.__cache.get(url)
+    if entry is None:
+      return None
+
+    validators, exp_date = entry
+    if exp_date <= datetime.now():
+      return None
+    return validators
+
+  def store(self, url: str, validators: dict, ttl: timedelta = timedelta(weeks=1)) -> None:
+    # prevent overflow
+    now = datetime.now()
+    if now > datetime.max - ttl:
+      exp_date = datetime.max
+    else:
+      exp_date = now + ttl
+    
+    validators = {
+      "etag": validators.get("etag"),
+      "last_modified": validators.get("last_modified"),
+    }
+    self.__cache[url] = (validators, exp_date)
+    with open(self.__cache_file_path, "a") as f:
+      self.__write_line_to_file(f, url, validators, exp_date)
+      
+  def __write_line_to_file(self, fdesc, url: str, validators: dict, exp_date: datetime) -> None:
+    d = {
+      "url": url,
+      "etag": validators["etag"],
+      "last_modified": validators["last_modified"],
+      "expiration_date": exp_date.isoformat()
+    }
+    fdesc.write(json.dumps(d) + "\n")
+  
+
+class FileValidatorCacheFactory(ClickCliAware):
+
+  config = {}
+
+  @staticmethod
+  def register_cli_options(**kwargs) -> list[click.Option]:
+    return [
+      click.Option(
+        param_decls=["--file-validator-cache-path"],
+        help="File validator cache path",
+        default="validator_cache",
+        envvar="FILE_VALIDATOR_CACHE_PATH",
+        show_default=True,
+        show_envvar=True,
+        callback=lambda ctx, param, value: FileValidatorCacheFactory.config.update({'path': value})
+      ),
+    ]
+
+  @staticmethod
+  def create() -> FileValidatorCache:
+
+    config = FileValidatorCacheFactory.config
+
+    return FileValidatorCache(
+      config["path"],
+    )     
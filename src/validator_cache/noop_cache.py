@@ -0,0 +1,19 @@
+from validator_cache import ValidatorCache
+from cli_aware import ClickCliAware
+
+class NoOpValidatorCache(ValidatorCache):
+  def get(self, *args, **kwargs) -> dict | None: 
+    return None
+
+  def store(self, *args, **kwargs) -> None:
+    pass
+
+
+class NoOpValidatorCacheFactory(ClickCliAware):
+
+  def register_cli_options(*args, **kwargs) -> list: 
+    return []
+
+  @staticmethod
+  def create() -> ValidatorCache: 
+    return NoOpValidatorCache()
@@ -0,0 +1,101 @@
+import logging
+import time
+import redis
+from datetime import timedelta
+from validator_cache import ValidatorCache
+from utils import log_utils
+import click
+from cli_aware import ClickCliAware
+
+
+class RedisValidatorCache(ValidatorCache):
+
+  @classmethod
+  def configure_logging(cls, level: int):
+    cls.loglevel = level
+    cls.log = log_utils.create_console_logger(
+      name=cls.__name__,
+      level=level
+    )
+
+  def __init__(self, redis_host: str, redis_port: int, log_level: int = logging.INFO):
+    self.configure_logging(log_level)
+
+    try:
+      self.__redis = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
+      backoff = 1
+      while not self.__redis.ping():
+        print(f"redis not ready, waiting {backoff} seconds")
+        time.sleep(backoff)
+        backoff *= 2
+
+    except Exception as e:
+      self.log.exception("failed to connect to redis")
+      raise e
+
+
+  def get(self, url: str) -> dict | None:
+    validators = self.__redis.hgetall(f"scraper_cache:validators:{url}")
+    if len(validators) == 0:
+      return None
+    return {
+      "etag": validators.get("etag"),
+      "last_modified": validators.get("last_modified"),
+    }
+
+  def store(self, url: str, validators: dict, ttl: timedelta = timedelta(weeks=1)) -> None:
+    key = f"scraper_cache:validators:{url}"
+    # redis can't store None values, leave out the missing validators
+    mapping = {k: validators[k] for k in ["etag", "last_modified"] if validators.get(k) is not None}
+    if len(mapping) == 0:
+      return
+
+    pipe = self.__redis.pipeline()
+    pipe.delete(key)
+    pipe.hset(key, mapping=mapping)
+    pipe.expire(key, ttl)
+    pipe.execute()
+
+  def close(self) -> None:
+    self.__redis.close()
+  
+
+class RedisValidatorCacheFactory(ClickCliAware):
+
+  config = {}
+
+  @staticmethod
+  def register_cli_options(**kwargs) -> list[click.Option]:
+    return [
+      click.Option(
+        param_decls=["--redis-validator-cache-host"],
+        help="Redis validator cache hostname",
+        default="localhost",
+        envvar="VALIDATOR_CACHE_REDIS_HOST",
+        show_default=True,
+        show_envvar=True,
+        callback=lambda ctx, param, value: RedisValidatorCacheFactory.config.update({'host': value})
+      ),
+      click.Option(
+        param_decls=["--redis-validator-cache-port"],
+        help="Redis validator cache port",
+        default=6379,
+        envvar="VALIDATOR_CACHE_REDIS_PORT",
+        type=click.INT,
+        show_default=True,
+        show_envvar=True,
+        callback=lambda ctx, param, value: RedisValidatorCacheFactory.config.update({'port': value})
+      ),
+    ]
+
+  @staticmethod
+  def create() -> RedisValidatorCache:
+
+    config = RedisValidatorCacheFactory.config
+
+    print(f"using redis validator cache with host {config['host']}, port {config['port']}")
+
+    return RedisValidatorCache(
+      config["host"],
+      config["port"],
+    )
@@ -0,0 +1,33 @@
+from abc import ABC, abstractmethod
+from datetime import timedelta
+
+class ValidatorCache(ABC):
+  """
+  Stores the http cache validators (ETag, Last-Modified) of listing pages,
+  so they are only downloaded again if they have changed.
+  """
+
+  @abstractmethod
+  def get(self, url: str) -> dict | None:
+    """
+    Returns the validators stored for "url" as a dict with 
+    "etag" and "last_modified" keys (any of them can be None),
+    or None if nothing is stored or the TTL has expired
+    """
+    raise NotImplementedError
+  
+
+  @abstractmethod
+  def store(self, url: str, validators: dict, ttl: timedelta = timedelta(weeks=1)) -> None:
+    """
+    Stores the "validators" of "url" with a TTL, they are 
+    valid until datetime.now() + "ttl" timedelta
+    """
+    raise NotImplementedError
+
+
+  def close(self) -> None:
+    """
+    Releases the connections and files of the cache, it isn't used after this.
+    """
+    pass
@@ -0,0 +1,44 @@
+from datetime import timedelta
+import json
+from article_cache.file_cache import FileArticleCache
+
+
+def read_urls(path) -> list[str]:
+  with open(path) as f:
+    return [json.loads(line)["url"] for line in f]
+
+
+class TestFileArticleCache:
+
+  def test_processes_keep_each_others_entries(self, tmp_path):
+    path = str(tmp_path / "cache")
+    # two scraper processes sharing the cache file
+    a = FileArticleCache(path)
+    b = FileArticleCache(path)
+
+    a.store("https://a.com/1")
+    b.store("https://a.com/2")
+    a.store("https://a.com/3")
+    assert read_urls(path) == ["https://a.com/1", "https://a.com/2", "https://a.com/3"]
+
+    # rewriting the file for the update keeps the entry appended by the other process
+    b.store("https://a.com/4")
+    a.store("https://a.com/1", timedelta(weeks=2))
+    b.store("https://a.com/5")
+    assert sorted(read_urls(path)) == [f"https://a.com/{i}" for i in range(1, 6)]
+    for cache in [a, b, FileArticleCache(path)]:
+      assert all(cache.contains(f"https://a.com/{i}") for i in range(1, 6))
+
+  def test_expired_entries_are_pruned(self, tmp_path):
+    path = str(tmp_path / "cache")
+    a = FileArticleCache(path)
+    b = FileArticleCache(path)
+    a.store("https://a.com/1")
+    a.store("https://a.com/old", timedelta(0))
+    b.store("https://a.com/2")
+
+    # the update prunes the file without dropping the entry the other process appended
+    a.store("https://a.com/1", timedelta(weeks=2))
+    assert read_urls(path) == ["https://a.com/1", "https://a.com/2"]
+    assert not b.contains("https://a.com/old")
+    assert b.contains("https://a.com/1") and b.contains("https://a.com/2")
@@ -0,0 +1,101 @@
+from datetime import datetime, timezone
+import gzip
+from http import client
+import pytest
+from utils.http_utils import HttpResponse, BodyTooLargeException, ContentTypeException
+from scraper.feed_parser import read_feed, parse_feed_date
+
+
+def create_response(body: str | bytes, content_type: str = None) -> HttpResponse:
+  headers = client.HTTPMessage()
+  if content_type is not None:
+    headers["Content-Type"] = content_type
+  if isinstance(body, str):
+    body = body.encode()
+  res = HttpResponse.from_bytes("https://a.com/feed", 200, "OK", headers, body)
+  # force the parser to work on partial documents
+  res.chunk_size = 16
+  return res
+
+
+class TestFeedParser:
+
+  def test_rss(self):
+    entries = read_feed(create_response("""<?xml version="1.0"?>
+      <rss version="2.0"><channel>
+        <title>News</title>
+        <link>https://a.com/</link>
+        <item><title>1</title><link>https://a.com/1</link><pubDate>Tue, 10 Jun 2003 04:00:00 GMT</pubDate></item>
+        <item><title>2</title><guid>https://a.com/2</guid></item>
+        <item><title>3</title><guid isPermaLink="false">id-3</guid></item>
+      </channel></rss>"""))
+
+    assert [e.url for e in entries] == ["https://a.com/1", "https://a.com/2"]
+    assert entries[0].date == datetime(2003, 6, 10, 4, tzinfo=timezone.utc)
+    assert entries[1].date is None
+    assert not any(e.is_sitemap for e in entries)
+
+  def test_atom(self):
+    entries = read_feed(create_response("""<?xml version="1.0" encoding="utf-8"?>
+      <feed xmlns="http://www.w3.org/2005/Atom">
+        <link href="https://a.com/"/>
+        <entry>
+          <link rel="self" href="https://a.com/1.atom"/>
+          <link href="https://a.com/1"/>
+          <updated>2003-12-13T18:30:02Z</updated>
+        </entry>
+      </feed>"""))
+
+    assert [e.url for e in entries] == ["https://a.com/1"]
+    assert entries[0].date == datetime(2003, 12, 13, 18, 30, 2, tzinfo=timezone.utc)
+
+  def test_sitemap_index(self):
+    entries = read_feed(create_response("""<?xml version="1.0" encoding="UTF-8"?>
+      <sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+        <sitemap><loc>https://a.com/sitemap1.xml</loc><lastmod>2004-10-01</lastmod></sitemap>
+      </sitemapindex>"""))
+
+    assert [e.url for e in entries] == ["https://a.com/sitemap1.xml"]
+    assert entries[0].is_sitemap
+    assert entries[0].date == datetime(2004, 10, 1, tzinfo=timezone.utc)
+
+  def test_news_sitemap(self):
+    entries = read_feed(create_response("""<?xml version="1.0" encoding="UTF-8"?>
+      <urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"
+              xmlns:news="http://www.google.com/schemas/sitemap-news/0.9">
+        <url>
+          <loc>https://a.com/1</loc>
+          <news:news><news:publication_date>2008-12-23T10:00:00+02:00</news:publication_date></news:news>
+        </url>
+        <url><loc>https://a.com/2</loc></url>
+      </urlset>"""))
+
+    assert [e.url for e in entries] == ["https://a.com/1", "https://a.com/2"]
+    assert entries[0].date == datetime(2008, 12, 23, 8, tzinfo=timezone.utc)
+    assert not entries[0].is_sitemap
+
+  def test_invalid_dates(self):
+    assert parse_feed_date("yesterday") is None
+
+  def test_gzipped_sitemap(self):
+    sitemap = """<?xml version="1.0" encoding="UTF-8"?>
+      <urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+        <url><loc>https://a.com/1</loc></url>
+        <url><loc>https://a.com/2</loc></url>
+      </urlset>"""
+    entries = read_feed(create_response(gzip.compress(sitemap.encode()), "application/x-gzip"))
+
+    assert [e.url for e in entries] == ["https://a.com/1", "https://a.com/2"]
+
+  def test_gzipped_sitemap_size_is_limited(self):
+    sitemap = "<urlset>" + " " * 10000 + "</urlset>"
+    with pytest.raises(BodyTooLargeException):
+      read_feed(create_response(gzip.compress(sitemap.encode()), "application/gzip"), max_size=1000)
+
+  def test_content_types(self):
+    feed = "<rss><channel><item><link>https://a.com/1</link></item></channel></rss>"
+    with pytest.raises(ContentTypeException):
+      read_feed(create_response(feed, "text/html"))
+
+    entries = read_feed(create_response(feed, "text/html"), content_types=["text/html"])
+    assert [e.url for e in entries] == ["https://a.com/1"]
@@ -0,0 +1,41 @@
+import asyncio
+import time
+import pytest
+from scraper.fetcher import AsyncFetcher
+from scraper.retry import CircuitBreaker, CircuitOpenException
+from utils import http_utils
+from utils.http_utils import BodyTooLargeException, HttpConnectionPool
+
+
+class TestAsyncFetcher:
+
+  @pytest.mark.parametrize("end_trial", ["cancel", "body_too_large"])
+  def test_trial_without_result_lets_the_next_one_through(self, monkeypatch, end_trial: str):
+    def fetch(url, pool, headers=None, read_body=None):
+      if end_trial == "cancel":
+        time.sleep(0.2)
+      else:
+        raise BodyTooLargeException(url, 10)
+      return http_utils.Page(url, 200, {}, "")
+    monkeypatch.setattr(http_utils, "fetch", fetch)
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    breaker.record_failure("https://a.com/1")
+    fetcher = AsyncFetcher(HttpConnectionPool(), circuit_breaker=breaker)
+
+    async def run_trial():
+      await asyncio.sleep(0.1)
+      try:
+        await asyncio.wait_for(fetcher.fetch("https://a.com/2"), 0.05)
+      except (asyncio.TimeoutError, BodyTooLargeException):
+        pass
+
+    try:
+      with pytest.raises(CircuitOpenException):
+        breaker.check("https://a.com/3")
+      asyncio.run(run_trial())
+    finally:
+      fetcher.close()
+
+    # the host isn't blocked forever, another trial is let through
+    assert breaker.check("https://a.com/4")
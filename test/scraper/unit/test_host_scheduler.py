@@ -0,0 +1,62 @@
+import asyncio
+import time
+import pytest
+from scraper.config import RateLimitConfig, ConfigValidationException
+from scraper.host_scheduler import HostScheduler, TokenBucket
+
+
+class TestHostScheduler:
+
+  def test_token_bucket_allows_burst_then_waits(self):
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.take() == 0
+    assert bucket.take() == 0
+    assert 0 < bucket.take() <= 0.1
+
+  def test_max_in_flight_per_host(self):
+    scheduler = HostScheduler(RateLimitConfig({"max_in_flight": 2}))
+    in_flight = {"a.com": 0, "b.com": 0}
+    max_in_flight = {"a.com": 0, "b.com": 0}
+
+    async def request(host: str):
+      async with scheduler.slot(f"https://{host}/article"):
+        in_flight[host] += 1
+        max_in_flight[host] = max(max_in_flight[host], in_flight[host])
+        await asyncio.sleep(0.01)
+        in_flight[host] -= 1
+
+    async def run():
+      await asyncio.gather(*[request(host) for host in ["a.com", "b.com"] * 5])
+
+    asyncio.run(run())
+    assert max_in_flight == {"a.com": 2, "b.com": 2}
+
+  def test_scrape_config_limits_override_defaults(self):
+    scheduler = HostScheduler(RateLimitConfig({"requests_per_second": 1000}))
+    limits = RateLimitConfig({"requests_per_second": 20})
+
+    async def run():
+      for _ in range(5):
+        async with scheduler.slot("https://a.com/", limits):
+          pass
+
+    start = time.monotonic()
+    asyncio.run(run())
+    # the first request uses the only token, the other 4 wait 1/20 s each
+    assert time.monotonic() - start >= 0.15
+
+  def test_is_limited(self):
+    assert not HostScheduler().is_limited()
+    assert HostScheduler(RateLimitConfig({"max_in_flight": 4})).is_limited()
+    # the scrape config overrides the defaults
+    assert not HostScheduler(RateLimitConfig({"max_in_flight": 4})).is_limited(RateLimitConfig({"max_in_flight": 0}))
+    assert HostScheduler().is_limited(RateLimitConfig({"requests_per_second": 1}))
+
+  @pytest.mark.parametrize("config", [
+    {"requests_per_second": -1},
+    {"burst": 0},
+    {"max_in_flight": "2"},
+  ])
+  def test_invalid_rate_limit_raises(self, config: dict):
+    with pytest.raises(ConfigValidationException):
+      RateLimitConfig(config)
@@ -0,0 +1,84 @@
+import pytest
+from urllib.parse import urljoin, urldefrag
+from scraper.link_extractor import LinkExtractor, HtmlParserLinkFeeder
+from scraper.parser_backend import parser_backends
+
+
+html = """
+<html>
+  <head><title>News</title></head>
+  <body>
+    <nav><a href="/about">About</a></nav>
+    <main id="news" class="listing wide">
+      <ul>
+        <li><a href="/2024/1">1</a>
+        <li><a href="2024/2#comments">2</a><br>
+        <li><a href=" https://b.com/3 ">3</a><img src="x.png">
+      </ul>
+      <div class="more"><a href="/2024/4"/><p>text<a href="mailto:a@a.com">mail</a></div>
+      <a href="#top">top</a>
+      <a>no href</a>
+    </main>
+    <footer><a href="/contact">Contact</a></footer>
+  </body>
+</html>
+"""
+
+all_links = [
+  "https://a.com/about",
+  "https://a.com/2024/1",
+  "https://a.com/news/2024/2",
+  "https://b.com/3",
+  "https://a.com/2024/4",
+  "https://a.com/contact",
+]
+
+main_links = all_links[1:5]
+
+
+class TestLinkExtractor:
+
+  @pytest.mark.parametrize("container, links", [
+    (None, all_links),
+    ("main", main_links),
+    ("#news", main_links),
+    (".listing.wide", main_links),
+    ("main.listing#news", main_links),
+    (".missing", []),
+    ("div.more", ["https://a.com/2024/4"]),
+    ("footer, nav", ["https://a.com/about", "https://a.com/contact"]),
+    ("main > ul", main_links[:3]),
+  ])
+  @pytest.mark.parametrize("parser", parser_backends.keys())
+  def test_links(self, container: str, links: list[str], parser: str):
+    extractor = LinkExtractor(container)
+    assert list(extractor.iter_links(html, "https://a.com/news/", parser)) == links
+
+  @pytest.mark.parametrize("href", ["/a/b?c=d", "/a/./b", "/a/../b", "//b.com/c", "/a#b", "../a", "a/b", "?a=b", "/ä b"])
+  def test_same_as_urljoin(self, href: str):
+    page = f'<html><a href="{href}">a</a></html>'
+    base_url = "https://a.com:8080/x/y"
+    assert list(LinkExtractor().iter_links(page, base_url)) == [urldefrag(urljoin(base_url, href))[0]]
+
+  @pytest.mark.parametrize("parser", parser_backends.keys())
+  @pytest.mark.parametrize("page", ["", " ", "<!-- a -->", "<p>a"])
+  def test_no_links(self, page: str, parser: str):
+    assert list(LinkExtractor().iter_links(page, "https://a.com/", parser)) == []
+
+  def test_base_url(self):
+    page = '<html><head><base href="https://c.com/x/"><base href="https://d.com/"></head><a href="y">y</a><a href="/z">z</a></html>'
+    assert list(LinkExtractor().iter_links(page, "https://a.com/")) == ["https://c.com/x/y", "https://c.com/z"]
+
+  def test_stops_parsing_when_the_caller_stops(self, monkeypatch):
+    fed = []
+    original_feed = HtmlParserLinkFeeder.feed
+    monkeypatch.setattr(HtmlParserLinkFeeder, "feed", lambda self, data: fed.append(data) or original_feed(self, data))
+
+    extractor = LinkExtractor()
+    extractor.chunk_size = 64
+    page = "<html>" + "".join(f'<p><a href="/{i}">{i}</a></p>' for i in range(1000)) + "</html>"
+
+    links = extractor.iter_links(page, "https://a.com/")
+    assert [next(links) for _ in range(3)] == ["https://a.com/0", "https://a.com/1", "https://a.com/2"]
+    links.close()
+    assert len(fed) < 5
@@ -0,0 +1,47 @@
+import inspect
+import pytest
+from bs4 import BeautifulSoup
+from bs4.builder._htmlparser import BeautifulSoupHTMLParser
+from scraper.parser_backend import IncrementalParser, HtmlParserBackend
+
+
+class TestIncrementalParser:
+
+  @pytest.mark.parametrize("name", ["endData", "popTag", "ROOT_TAG_NAME"])
+  def test_bs4_class_internals_exist(self, name: str):
+    # IncrementalParser relies on these private parts of bs4, they aren't covered by its version policy.
+    # hasattr can't tell, BeautifulSoup.__getattr__ falls back to find()
+    try:
+      inspect.getattr_static(BeautifulSoup, name)
+    except AttributeError:
+      pytest.fail(f"BeautifulSoup.{name} is gone, IncrementalParser needs to be updated")
+
+  def test_bs4_instance_internals_exist(self):
+    incremental_parser = IncrementalParser()
+    incremental_parser.feed("<html><p>foo<br>")
+    soup = incremental_parser.soup
+
+    for name in ["tagStack", "currentTag", "builder"]:
+      assert name in vars(soup), f"BeautifulSoup.{name} is gone, IncrementalParser needs to be updated"
+    assert "parser_args" in vars(soup.builder), "the builder's parser_args are gone, IncrementalParser needs to be updated"
+
+    parser = BeautifulSoupHTMLParser(*soup.builder.parser_args[0], **soup.builder.parser_args[1])
+    assert "already_closed_empty_element" in vars(parser), \
+      "BeautifulSoupHTMLParser.already_closed_empty_element is gone, IncrementalParser needs to be updated"
+    assert [tag.name for tag in soup.tagStack] == ["[document]", "html", "p"]
+
+  def test_same_tree_as_parsing_at_once(self):
+    html = "<html><body><div><p>foo<br>bar</p><p>baz</div><span>qux</body></html>"
+    incremental_parser = IncrementalParser()
+    for i in range(0, len(html), 7):
+      incremental_parser.feed(html[i:i + 7])
+    incremental_parser.close()
+
+    assert str(incremental_parser.soup) == str(HtmlParserBackend().parse(html))
+
+  def test_open_elements(self):
+    incremental_parser = IncrementalParser()
+    incremental_parser.feed("<html><div><p>foo</p><span>")
+
+    open_names = {tag.name for tag in incremental_parser.soup.find_all() if id(tag) in incremental_parser.get_open_elements()}
+    assert open_names == {"html", "div", "span"}
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+import threading
+import pytest
+from scraper import parser_pool
+from scraper.config import ConfigFactory
+from scraper.parser_backend import default_parser_backend
+from scraper.parser_pool import AsyncParserClient, Parser, ParserException, ParserQueues
+
+
+config = ConfigFactory.from_yaml_str("""
+version: "1.0.0"
+pages:
+- urls: ["https://news.test/list"]
+  url_selectors:
+    key: links
+    selector: a
+    select: all
+    extract: {type: attribute, key: href}
+  selectors:
+    key: article
+    selector: div.main
+    children:
+    - key: title
+      selector: h1
+""")
+
+
+class TestParserPool:
+
+  def test_parse_pages(self):
+    parser_queues = ParserQueues(1, 2)
+    # the parser runs in a thread instead of a process, it only communicates through the queues
+    parser = threading.Thread(target=Parser(0, logging.INFO).parse_from_queue, args=([config], parser_queues))
+    parser.start()
+
+    async def parse_all():
+      client = AsyncParserClient(parser_queues, 0)
+      client.start()
+      try:
+        # more pages than the size of the request queue
+        pages = [f"<html><div class='main'><h1>Title {i}</h1></div></html>" for i in range(10)]
+        results = await asyncio.gather(*[client.parse(0, 0, html, default_parser_backend, False) for html in pages])
+
+        with pytest.raises(ParserException):
+          # no such scrape config
+          await client.parse(0, 1, pages[0], default_parser_backend, False)
+        return results
+      finally:
+        client.close()
+
+    try:
+      results = asyncio.run(parse_all())
+    finally:
+      parser_queues.request_queue.put(None)
+      parser.join()
+      parser_queues.close()
+
+    assert results == [{"article": [{"title": f"Title {i}"}]} for i in range(10)]
+
+  def test_page_of_dead_parser_fails(self, monkeypatch):
+    class CrashingPlan:
+      def __init__(self, *args):
+        self.selectors = self
+
+      def process_html(self, *args):
+        os._exit(1)
+    monkeypatch.setattr(parser_pool, "ScrapePlan", CrashingPlan)
+
+    parser_queues = ParserQueues(1, 2)
+    parser = mp.Process(target=Parser(0, logging.INFO).parse_from_queue, args=([config], parser_queues, 0))
+    parser.start()
+
+    async def parse():
+      client = AsyncParserClient(parser_queues, 0)
+      client.start()
+      try:
+        request = asyncio.create_task(client.parse(0, 0, "<html></html>", default_parser_backend, False))
+        # what the manager does when it finds the process dead
+        await asyncio.to_thread(parser.join)
+        assert parser_queues.fail_in_progress(0, "parser died")
+        with pytest.raises(ParserException, match="parser died"):
+          await request
+      finally:
+        client.close()
+
+    try:
+      asyncio.run(parse())
+    finally:
+      parser.join()
+      parser_queues.close()
+
+  def test_page_without_result_fails(self, monkeypatch):
+    monkeypatch.setattr(AsyncParserClient, "result_timeout", 0.1)
+    # no parser process takes the page
+    parser_queues = ParserQueues(1, 2)
+
+    async def parse():
+      client = AsyncParserClient(parser_queues, 0)
+      client.start()
+      try:
+        with pytest.raises(ParserException):
+          await client.parse(0, 0, "<html></html>", default_parser_backend, False)
+      finally:
+        client.close()
+
+    try:
+      asyncio.run(parse())
+    finally:
+      parser_queues.close()
+
+  def test_result_of_previous_process_is_ignored(self):
+    parser_queues = ParserQueues(1, 2)
+    parser = threading.Thread(target=Parser(0, logging.INFO).parse_from_queue, args=([config], parser_queues))
+
+    async def parse():
+      client = AsyncParserClient(parser_queues, 0)
+      client.start()
+      try:
+        request = asyncio.create_task(client.parse(0, 0, "<html><div class='main'><h1>new</h1></div></html>", default_parser_backend, False))
+        await asyncio.sleep(0.1)
+        # the late result of the same request id, sent to the process which had the front-end index before
+        parser_queues.result_queues[0].put((os.getpid() + 1, 0, {"article": [{"title": "stale"}]}, None))
+        await asyncio.sleep(0.1)
+        assert not request.done()
+
+        parser.start()
+        return await request
+      finally:
+        client.close()
+
+    try:
+      result = asyncio.run(parse())
+    finally:
+      if parser.ident is not None:
+        parser_queues.request_queue.put(None)
+        parser.join()
+      parser_queues.close()
+
+    assert result == {"article": [{"title": "new"}]}
@@ -0,0 +1,62 @@
+import pytest
+from scraper.retry import RetryPolicy, CircuitBreaker, CircuitOpenException
+from utils.http_utils import HttpStatusException
+
+
+class TestRetryPolicy:
+
+  @pytest.mark.parametrize("error, retryable", [
+    (HttpStatusException("https://a.com", 503), True),
+    (HttpStatusException("https://a.com", 429), True),
+    (HttpStatusException("https://a.com", 404), False),
+    (TimeoutError(), True),
+    (ConnectionRefusedError(), True),
+    (ValueError(), False),
+  ])
+  def test_is_retryable(self, error: Exception, retryable: bool):
+    assert RetryPolicy().is_retryable(error) == retryable
+
+  def test_backoff_is_capped_and_jittered(self):
+    policy = RetryPolicy(max_retries=10, backoff=1, max_backoff=4)
+    error = TimeoutError()
+    for attempt in range(10):
+      assert 0 <= policy.get_delay(attempt, error) <= min(4, 2 ** attempt)
+    assert policy.get_delay(10, error) is None
+
+  def test_retry_after_is_honored(self):
+    policy = RetryPolicy(max_backoff=10)
+    assert policy.get_delay(0, HttpStatusException("https://a.com", 429, retry_after=7)) == 7
+    # too long waits are not retried
+    assert policy.get_delay(0, HttpStatusException("https://a.com", 429, retry_after=3600)) is None
+
+
+class TestCircuitBreaker:
+
+  def test_opens_after_consecutive_failures(self):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+      breaker.record_failure("https://a.com/1")
+    breaker.check("https://a.com/2")
+
+    breaker.record_failure("https://a.com/3")
+    with pytest.raises(CircuitOpenException):
+      breaker.check("https://a.com/4")
+    # other hosts are not affected
+    breaker.check("https://b.com/1")
+
+  def test_success_resets_failures(self):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure("https://a.com/1")
+    breaker.record_success("https://a.com/2")
+    breaker.record_failure("https://a.com/3")
+    breaker.check("https://a.com/4")
+
+  def test_single_trial_after_reset_timeout(self):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure("https://a.com/1")
+    # the first request after the timeout is let through, the others wait for its result
+    breaker.check("https://a.com/2")
+    with pytest.raises(CircuitOpenException):
+      breaker.check("https://a.com/3")
+    breaker.record_success("https://a.com/2")
+    breaker.check("https://a.com/4")
@@ -1,3 +1,146 @@
 # TODO: 
 # test preserving metadata config part
-# test parsing urls
\ No newline at end of file
+# test parsing urls
+import asyncio
+import pytest
+from scraper.config import ConfigFactory
+from scraper.feed_parser import FeedEntry
+from scraper.scraper import Scraper, ScrapeOptions, WorkerResources
+from scraper.selector_processor import ScrapePlan
+from utils import http_utils
+from utils.http_utils import BodyPolicy
+from validator_cache import ValidatorCache
+
+
+class FakeResource:
+
+  def __init__(self, fail_close: bool = False):
+    self.fail_close = fail_close
+    self.closed = False
+
+  def close(self):
+    self.closed = True
+    if self.fail_close:
+      raise RuntimeError("close failed")
+
+
+class FakeFactory:
+
+  def __init__(self, create):
+    self.created = []
+    self.__create = create
+
+  def create(self):
+    resource = self.__create()
+    self.created.append(resource)
+    return resource
+
+  def wrap(self, http_pool, body_policy):
+    return http_pool
+
+
+def create_kwargs(validator_cache_create=FakeResource, store_create=FakeResource) -> dict:
+  return {
+    "http_pool_factory": FakeFactory(FakeResource),
+    "http_archive_factory": FakeFactory(FakeResource),
+    "article_cache_factory": FakeFactory(FakeResource),
+    "article_store_factory": FakeFactory(lambda: [store_create(), FakeResource()]),
+    "validator_cache_factory": FakeFactory(validator_cache_create),
+    "body_policy": BodyPolicy(),
+  }
+
+
+class TestWorkerResources:
+
+  def test_close_all_even_if_one_fails(self):
+    kwargs = create_kwargs(store_create=lambda: FakeResource(fail_close=True))
+    resources = WorkerResources(kwargs)
+
+    with pytest.raises(RuntimeError):
+      resources.close()
+
+    stores = kwargs["article_store_factory"].created[0]
+    assert all(s.closed for s in stores)
+    assert resources.http_pool.closed
+    assert resources.article_cache.closed
+    assert resources.validator_cache.closed
+
+  def test_close_created_ones_if_creation_fails(self):
+    def fail():
+      raise ConnectionError("no redis")
+    kwargs = create_kwargs(validator_cache_create=fail)
+
+    with pytest.raises(ConnectionError):
+      WorkerResources(kwargs)
+
+    assert kwargs["http_pool_factory"].created[0].closed
+    assert kwargs["article_cache_factory"].created[0].closed
+    assert all(s.closed for s in kwargs["article_store_factory"].created[0])
+
+
+class DictValidatorCache(ValidatorCache):
+
+  def __init__(self):
+    self.validators = {}
+
+  def get(self, url: str) -> dict | None:
+    return self.validators.get(url)
+
+  def store(self, url: str, validators: dict, ttl=None) -> None:
+    self.validators[url] = validators
+
+
+class FakeFetcher:
+  """
+  Serves feeds, and answers 304 if the request's If-None-Match is the ETag of the feed.
+  """
+
+  def __init__(self, feeds: dict):
+    self.feeds = feeds
+
+  async def fetch(self, url, headers=None, rate_limit=None, read_body=None) -> http_utils.Page:
+    etag, entries = self.feeds[url]
+    if headers is not None and headers.get("If-None-Match") == etag:
+      return http_utils.Page(url, 304, {"ETag": etag}, None)
+    return http_utils.Page(url, 200, {"ETag": etag}, entries)
+
+
+class TestFindArticleUrls:
+
+  def test_unchanged_sitemap_index_is_checked_again(self):
+    config = ConfigFactory.from_yaml_str("""
+version: "1.0.0"
+pages:
+- urls: ["https://a.com/sitemap_index.xml"]
+  feed: {}
+  selectors:
+    key: title
+    selector: h1
+""")
+    scrape_config = config.scrape_configs[0]
+    scrape_plan = ScrapePlan(scrape_config, config.common_selectors)
+    validator_cache = DictValidatorCache()
+    scrape_options = ScrapeOptions(validator_cache=validator_cache)
+    scraper = Scraper(0)
+
+    index = ("index", [FeedEntry("https://a.com/sitemap.xml", None, is_sitemap=True)])
+    def find(feeds: dict) -> list[str]:
+      async def run():
+        found = []
+        on_listed = validator_cache.store
+        async for _, article_url in scraper._find_article_urls(scrape_config, scrape_plan, scrape_options, FakeFetcher(feeds), on_listed):
+          found.append(article_url)
+        return found
+      return asyncio.run(run())
+
+    assert find({
+      "https://a.com/sitemap_index.xml": index,
+      "https://a.com/sitemap.xml": ("1", [FeedEntry("https://a.com/1", None)]),
+    }) == ["https://a.com/1"]
+    assert "https://a.com/sitemap_index.xml" not in validator_cache.validators
+
+    # the index is the same, the sitemap it lists has a new article
+    assert find({
+      "https://a.com/sitemap_index.xml": index,
+      "https://a.com/sitemap.xml": ("2", [FeedEntry("https://a.com/1", None), FeedEntry("https://a.com/2", None)]),
+    }) == ["https://a.com/1", "https://a.com/2"]
@@ -1,5 +1,18 @@
 import pytest
 from src.scraper import *
+from src.scraper.parser_backend import parser_backends
+import json
+from dateutil.parser import parse
+from datetime import date as datetime_date
+from bs4 import BeautifulSoup
+from concurrent.futures.process import BrokenProcessPool
+import os
+from scraper import selector_processor
+
+
+def exit_process(html: str):
+  # kills the worker process like the os would
+  os._exit(1)
 
 class TestProcessSelector:
 
@@ -653,14 +666,16 @@ class TestProcessSelector:
       }
     ),
   ])
+  @pytest.mark.parametrize("parser", parser_backends.keys())
   def test_selector_result_no_common_selectors(
     self, 
     html: str, 
     selector_config: dict, 
     expected: dict,
+    parser: str,
   ):
     s = ComponentSelectorConfig(selector_config)
-    result = SelectorProcessor.process_html(s, [], html)
+    result = SelectorProcessor.process_html(s, [], html, parser)
     assert result == expected
 
 
@@ -691,17 +706,19 @@ class TestProcessSelector:
       }
     )
   ])
+  @pytest.mark.parametrize("parser", parser_backends.keys())
   def test_selector_result_with_common_selectors(
     self, 
     html: str, 
     common_selectors: list[dict], 
     selector_config: dict, 
     expected: dict,
+    parser: str,
   ):
     cs = CommonComponentSelectorsConfig(common_selectors)
     s = ComponentSelectorConfig(selector_config)
     
-    result = SelectorProcessor.process_html(s, cs, html)
+    result = SelectorProcessor.process_html(s, cs, html, parser)
     assert result == expected
 
   @pytest.mark.parametrize("common_selectors, selector_config, expectation", [
@@ -743,4 +760,368 @@ class TestProcessSelector:
         ],
         "common_selectors": common_selectors,
       })
-    
\ No newline at end of file
+    
+
+class TestSelectorPlan:
+
+  def test_plan_is_reused_for_multiple_documents(self):
+    cs = CommonComponentSelectorsConfig([
+      {
+        "name": "title",
+        "selector": {
+          "key": "title",
+          "selector": "h1",
+        }
+      },
+    ])
+    s = ComponentSelectorConfig({
+      "key": "article",
+      "children": [
+        {"common_selector": "title"},
+        {
+          "key": "paragraphs",
+          "selector": "p",
+          "select": "all",
+        },
+      ]
+    })
+
+    plan = SelectorProcessor.compile(s, cs)
+    for i in range(3):
+      html = f"<html><h1>title {i}</h1><p>foo {i}</p><p>bar {i}</p></html>"
+      expected = SelectorProcessor.process_html(s, cs, html)
+      assert plan.process_html(html) == expected
+      assert expected == {"article": [{"title": f"title {i}"}, {"paragraphs": [f"foo {i}", f"bar {i}"]}]}
+
+  def test_common_selectors_are_compiled_once(self):
+    cs = CommonComponentSelectorsConfig([
+      {
+        "name": "title",
+        "selector": {
+          "key": "title",
+          "selector": "h1",
+        }
+      },
+    ])
+    s = ComponentSelectorConfig({
+      "key": "article",
+      "children": [
+        {"common_selector": "title"},
+        {"common_selector": "title"},
+      ]
+    })
+
+    compiled = {}
+    SelectorProcessor.compile(s, cs, compiled)
+    # the article and the title
+    assert len(compiled) == 2
+
+  @pytest.mark.parametrize("parser", parser_backends.keys())
+  @pytest.mark.parametrize("selector_config", [
+    {
+      "key": "article",
+      "selector": "div.main.article",
+      "select": "all",
+      "children": [
+        {"key": "title", "selector": "h1"},
+        {"key": "paragraphs", "selector": "p", "select": "all"},
+      ]
+    },
+    {
+      "key": "article",
+      "selector": "#content",
+      "select": "all",
+      "child": {"key": "html", "selector": "h1", "extract": {"type": "html"}},
+    },
+    {
+      "key": "article",
+      "selector": "div.main.article",
+      "children": [
+        {"key": "title", "selector": "h1"},
+        {"key": "bold", "selector": "b"},
+      ]
+    },
+    {
+      # too complex for a strainer, parsed fully
+      "key": "paragraphs",
+      "selector": "body > div p",
+      "select": "all",
+    },
+  ])
+  def test_partial_parse_has_same_results(self, selector_config: dict, parser: str):
+    html = """
+      <html>
+        <head><script>var nav = "<div class='main article'>";</script></head>
+        <body>
+          <nav><div class="main"><p>nav</p></div></nav>
+          <div id="content" class="main article">
+            <h1>title <b>bold</b></h1>
+            <p>foo</p>
+            <div class="main article"><p>nested</p></div>
+          </div>
+          <footer><p>footer</p></footer>
+        </body>
+      </html>
+    """
+    plan = SelectorProcessor.compile(ComponentSelectorConfig(selector_config), None)
+    expected = plan.process_html(html, parser)
+    assert expected is not None
+    assert plan.process_html(html, parser, partial=True) == expected
+
+  @pytest.mark.parametrize("parser", parser_backends.keys())
+  @pytest.mark.parametrize("selector_config", [
+    {
+      # the shape of the abc news config, the children are applied to the whole document
+      "key": "article",
+      "selector": "div.article_body",
+      "children": [
+        {"key": "title", "selector": "h1"},
+        {"key": "author", "selector": "[data-testid=byline] div:first-of-type span:nth-of-type(2)"},
+        {"key": "paragraphs", "selector": "[data-testid=body] p", "select": "all"},
+      ]
+    },
+    {
+      "key": "article",
+      "selector": "div.article_body",
+      "select": "all",
+      "child": {"key": "first", "selector": "div + p"},
+    },
+  ])
+  def test_partial_parse_falls_back_to_full_parse(self, selector_config: dict, parser: str):
+    html = """
+      <html>
+        <body>
+          <h1>headline</h1>
+          <div data-testid="byline"><div><span>by</span><span>author</span></div><div>date</div></div>
+          <div class="article_body">
+            <h1>title</h1>
+            <div>image</div><p>caption</p>
+            <div data-testid="body"><p>foo</p><p>bar</p></div>
+          </div>
+        </body>
+      </html>
+    """
+    plan = SelectorProcessor.compile(ComponentSelectorConfig(selector_config), None)
+    expected = plan.process_html(html, parser)
+    assert expected is not None
+    assert plan.strainer is None
+    assert plan.process_html(html, parser, partial=True) == expected
+    assert plan.process_chunks([html], parser, partial=True) == expected
+
+  @pytest.mark.parametrize("selector_config, stops_early", [
+    (
+      {
+        "key": "meta",
+        "children": [
+          {"key": "title", "selector": "h1"},
+          {"key": "author", "selector": "meta[name=author]", "extract": {"type": "attribute", "key": "content"}},
+        ]
+      },
+      True,
+    ),
+    (
+      # every paragraph is needed
+      {"key": "paragraphs", "selector": "p", "select": "all"},
+      False,
+    ),
+    (
+      # the last child can only be known at the end of its parent
+      {"key": "last", "selector": "p:last-of-type"},
+      False,
+    ),
+  ])
+  def test_incremental_parse_has_same_results(self, selector_config: dict, stops_early: bool):
+    html = (
+      "<html><head><meta name='author' content='foo'></head><body><h1>title</h1>" 
+      + "".join(f"<p>paragraph {i}</p>" for i in range(100)) 
+      + "</body></html>"
+    )
+    plan = SelectorProcessor.compile(ComponentSelectorConfig(selector_config), None)
+
+    read_chunks = []
+    def chunks():
+      for i in range(0, len(html), 100):
+        read_chunks.append(i)
+        yield html[i:i + 100]
+
+    assert plan.process_chunks(chunks()) == plan.process_html(html)
+    assert (len(read_chunks) < len(html) // 100) == stops_early
+
+  @pytest.mark.parametrize("processes", [1, 2])
+  def test_process_many_keeps_order(self, processes: int):
+    s = ComponentSelectorConfig({
+      "key": "article",
+      "children": [
+        {"key": "title", "selector": "h1"},
+        {"key": "paragraphs", "selector": "p", "select": "all"},
+      ]
+    })
+    documents = [f"<html><h1>title {i}</h1><p>foo {i}</p><p>bar {i}</p></html>" for i in range(10)]
+    documents.append("not html")
+
+    results = list(SelectorProcessor.process_many(s, [], iter(documents), processes))
+    assert results == [SelectorProcessor.process_html(s, [], d) for d in documents]
+    assert results[3] == {"article": [{"title": "title 3"}, {"paragraphs": ["foo 3", "bar 3"]}]}
+    assert results[-1] is None
+
+  def test_process_many_fails_if_worker_dies(self, monkeypatch):
+    monkeypatch.setattr(selector_processor, "_process_html_in_worker", exit_process)
+    s = ComponentSelectorConfig({"key": "title", "selector": "h1"})
+
+    with pytest.raises(BrokenProcessPool):
+      list(SelectorProcessor.process_many(s, [], iter(["<html><h1>title</h1></html>"] * 4), 2))
+
+
+class TestIncludeSelf:
+
+  html = """
+    <html>
+      <article>
+        <p class="lead">foo</p>
+        <p>bar</p>
+      </article>
+    </html>
+    """
+
+  @pytest.mark.parametrize("parser", parser_backends.keys())
+  def test_document_is_not_modified(self, parser: str):
+    s = ComponentSelectorConfig({
+      "key": "article",
+      "selector": "article",
+      "children": [
+        {"key": "leads", "selector": "p.lead", "select": "all", "child": {"key": "text", "selector": "p", "include_self": True}},
+        {"key": "paragraphs", "selector": "article > p", "select": "all"},
+      ]
+    })
+    result = SelectorProcessor.process_html(s, [], self.html, parser)
+    assert result == {"article": [{"leads": [{"text": "foo"}]}, {"paragraphs": ["foo", "bar"]}]}
+
+  def test_element_is_matched_in_its_tree(self):
+    soup = BeautifulSoup(self.html, "html.parser")
+    lead = soup.select_one("p.lead")
+
+    s = ComponentSelectorConfig({"key": "text", "selector": "article > p:first-child", "include_self": True})
+    assert SelectorProcessor.process(s, [], lead) == {"text": "foo"}
+    assert lead.parent.name == "article"
+
+    s = ComponentSelectorConfig({"key": "text", "selector": "p", "select": "all"})
+    assert SelectorProcessor.process(s, [], lead) is None
+
+
+class TestJsonpathExtractor:
+
+  data = {
+    "@graph": [{"@type": "NewsArticle", "author": {"name": "foo"}, "empty": None}],
+    "a": {"b": [1, {"c": 2}], "d-e": 3},
+    "list": [{"x": 1}, {"x": 2}],
+    "string": "bar",
+  }
+
+  @pytest.mark.parametrize("path, is_simple", [
+    ("$.a.b[1].c", True),
+    ("$.a.b[-1].c", True),
+    ("$.a.b[5]", True),
+    ("$['@graph'][0]['@type']", True),
+    ("$.@graph[0].author.name", True),
+    ("$.@graph[0].empty", True),
+    ("$.a.d-e", True),
+    ("$.list.x", True),
+    ("$.string.x", True),
+    ("$.string[0]", True),
+    ("$.missing", True),
+    ("$", True),
+    ("$.list[*].x", False),
+    ("$..name", False),
+    ("$.a.*", False),
+  ])
+  def test_simple_paths_match_jsonpath_ng(self, path: str, is_simple: bool):
+    expr = JsonpathExtractConfig({"path": path}).jsonpath_expr
+    steps = JsonpathExtractorProcessor.compile_simple_path(expr)
+    assert (steps is not None) == is_simple
+    if is_simple:
+      assert JsonpathExtractorProcessor.find_simple_path(steps, self.data) == [m.value for m in expr.find(self.data)]
+
+  def test_json_is_parsed_once_per_element(self, monkeypatch):
+    loads = []
+    original_loads = json.loads
+    monkeypatch.setattr(json, "loads", lambda s: loads.append(s) or original_loads(s))
+
+    html = '<html><script type="application/ld+json">{"headline": "foo", "author": {"name": "bar"}}</script></html>'
+    s = ComponentSelectorConfig({
+      "key": "ld",
+      "children": [
+        {"key": "headline", "selector": "script", "extract": {"type": "jsonpath", "path": "$.headline"}},
+        {"key": "author", "selector": "script", "extract": {"type": "jsonpath", "path": "$.author.name"}},
+        {"key": "both", "selector": "script", "extract": {"type": "jsonpath", "path": "$..name"}},
+      ]
+    })
+    result = SelectorProcessor.process_html(s, [], html)
+    assert result == {"ld": [{"headline": "foo"}, {"author": "bar"}, {"both": "bar"}]}
+    assert len(loads) == 1
+
+
+class TestIsoDateParser:
+
+  @pytest.mark.parametrize("dates", [
+    ["2024-02-13", "2024-02-13T16:17", "2024-02-13T16:17:10.123Z", "2024-02-13 16:17:10+02:00"],
+    ["Tue, 13 Feb 2024 16:17:10 GMT", "Wed, 14 Feb 2024 08:00:00 +0100", "Thu, 15 Feb 2024 08:00:00 UTC"],
+    ["13 Feb 2024 16:17:10 -0000", "February 13, 2024", "Feb 13, 2024", "13 February 2024", "2024/02/13"],
+    ["Published February 13, 2024", "2024-02-13T16:17:10 EST", "Tue, 13 Feb 2024 16:17:10 PST", "02/13/2024", "13 Feb 2024"],
+  ])
+  def test_same_as_fuzzy_parser(self, dates: list[str]):
+    process = IsoDateParserModifierProcessor.bind()
+    for date in dates * 2:
+      expected = parse(date, fuzzy=True, tzinfos=IsoDateParserModifierProcessor.tz_seconds).isoformat()
+      assert process(date) == expected
+
+  def test_missing_parts_taken_from_the_current_day(self, monkeypatch):
+    class FakeDate(datetime_date):
+      day = datetime_date(2024, 12, 31)
+
+      @classmethod
+      def today(cls):
+        return cls.day
+
+    monkeypatch.setattr(selector_processor, "date", FakeDate)
+    process = IsoDateParserModifierProcessor.bind()
+    assert process("Published at 10:30") == "2024-12-31T10:30:00"
+
+    # the memoized result of the previous day isn't used
+    FakeDate.day = datetime_date(2025, 1, 1)
+    assert process("Published at 10:30") == "2025-01-01T10:30:00"
+
+
+class TestRegexModifier:
+
+  @pytest.mark.parametrize("regex, return_type, is_combined", [
+    (["foo", "ba[rz]"], "original", True),
+    (["foo"], "original", False),
+    (["foo", "ba[rz]"], "first", False),
+    (["(foo)", "bar"], "original", False),
+    (["(?i)foo", "bar"], "original", False),
+    (["(?i:foo)", "bar"], "original", True),
+  ])
+  def test_combined_pattern(self, regex: list[str], return_type: str, is_combined: bool):
+    config = ModifierConfig({"type": "regex", "regex": regex, "return": return_type})
+    assert (config.specific_modifier_config.combined_pattern is not None) == is_combined
+
+  def test_invalid_pattern(self):
+    with pytest.raises(ConfigValidationException):
+      ModifierConfig({"type": "regex", "regex": ["foo", "ba("]})
+
+  @pytest.mark.parametrize("modifiers", [
+    [{"type": "regex", "regex": ["foo", "^b.r", "(?i:BAZ)$"]}],
+    [{"type": "regex", "regex": ["o+", "a."], "return": "first"}],
+    [{"type": "regex", "regex": ["bar"]}, {"type": "regex", "regex": ["\\d"], "return": "first"}],
+    [{"type": "regex", "regex": ["(\\d+) \\1"]}, {"type": "iso_date_parser"}],
+  ])
+  def test_list_modifiers_same_as_single(self, modifiers: list[dict]):
+    infos = ["foo", "bar 1", "baz", "a foo b", "BAZ", "x bar 2", "2024", "11 11", "no"]
+    bound = []
+    for m in map(ModifierConfig, modifiers):
+      process = ModifierProcessor.bind(m)
+      bound.append((m.type, process, ModifierProcessor.bind_all(m, process)))
+
+    expected = [LeafSelectorProcessor.process_modifiers_single_info(bound, info) for info in infos]
+    expected = [info for info in expected if info is not None]
+    assert LeafSelectorProcessor.process_modifiers_all(bound, infos) == expected
@@ -0,0 +1,60 @@
+import time
+from scraper.work_queues import ScrapeTask, WorkQueues
+
+
+def get_eventually(work_queues: WorkQueues, worker_index: int):
+  # the items put into a multiprocessing queue become visible after a short delay
+  deadline = time.monotonic() + 5
+  while time.monotonic() < deadline:
+    item = work_queues.get_nowait(worker_index)
+    if item is not None:
+      return item
+    time.sleep(0.01)
+  return None
+
+
+class TestWorkQueues:
+
+  def test_same_host_same_worker(self):
+    work_queues = WorkQueues(4)
+    assert work_queues.route("https://a.com/1") == work_queues.route("https://A.com/2?x=y")
+    assert len({work_queues.route(f"https://{i}.com/") for i in range(100)}) == 4
+    work_queues.close()
+
+  def test_own_tasks_first(self):
+    work_queues = WorkQueues(2)
+    url = "https://a.com/1"
+    own = work_queues.route(url)
+    other_url = next(f"https://{i}.com/" for i in range(100) if work_queues.route(f"https://{i}.com/") != own)
+
+    work_queues.put(1, ScrapeTask(0, 0, other_url), other_url)
+    work_queues.put(2, ScrapeTask(0, 0, url), url)
+    time.sleep(0.1)
+
+    assert get_eventually(work_queues, own)[0] == 2
+    # stolen from the other worker
+    assert get_eventually(work_queues, own)[0] == 1
+    assert work_queues.get_nowait(own) is None
+    work_queues.close()
+
+  def test_pinned_tasks_are_not_stolen(self):
+    work_queues = WorkQueues(2)
+    url = "https://a.com/1"
+    own = work_queues.route(url)
+
+    work_queues.put(1, ScrapeTask(0, 0, url), url, stealable=False)
+    time.sleep(0.1)
+
+    assert work_queues.get_nowait(1 - own) is None
+    assert get_eventually(work_queues, own)[0] == 1
+    work_queues.close()
+
+  def test_exit_messages_are_not_stolen(self):
+    work_queues = WorkQueues(2)
+    work_queues.put_sentinels()
+    time.sleep(0.1)
+
+    assert get_eventually(work_queues, 0) == (None, None)
+    assert work_queues.get_nowait(0) is None
+    assert get_eventually(work_queues, 1) == (None, None)
+    work_queues.close()
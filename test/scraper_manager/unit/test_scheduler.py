@@ -0,0 +1,36 @@
+import random
+from scraper.config import ScheduleConfig
+from scraper_manager.scheduler import Scheduler
+
+
+class TestScheduler:
+
+  def test_configs_run_on_their_intervals(self):
+    default_schedule = ScheduleConfig({"interval": 10})
+    scheduler = Scheduler([None, ScheduleConfig({"interval": 25})], default_schedule, 100)
+    assert scheduler.pop_due(100) == [0, 1]
+
+    scheduler.schedule_next(0, 100)
+    scheduler.schedule_next(1, 100)
+    runs = []
+    for now in range(101, 151):
+      for i in scheduler.pop_due(now):
+        runs.append((now, i))
+        scheduler.schedule_next(i, now)
+
+    assert runs == [(110, 0), (120, 0), (125, 1), (130, 0), (140, 0), (150, 0), (150, 1)]
+
+  def test_jitter_delays_the_runs(self):
+    default_schedule = ScheduleConfig({"interval": 10, "jitter": 5})
+    scheduler = Scheduler([None, ScheduleConfig({"jitter": 0})] * 50, default_schedule, 0, random.Random(1))
+
+    first_runs = scheduler.pop_due(5)
+    assert len(first_runs) == 100
+    assert scheduler.next_run_time() is None
+
+    for i in first_runs:
+      scheduler.schedule_next(i, 0)
+    assert scheduler.pop_due(9.99) == []
+    assert sorted(scheduler.pop_due(10)) == list(range(1, 100, 2))
+    assert 10 < scheduler.next_run_time() <= 15
+    assert len(set(scheduler.pop_due(15))) == 50
@@ -0,0 +1,161 @@
+import os
+import time
+from scraper.config import ConfigFactory
+from scraper.scraper import Scraper
+from scraper.work_queues import ScrapeTask
+from scraper_manager import ScraperManager
+from scraper_manager.notifier.notifier import Notifier
+from validator_cache import ValidatorCache
+
+
+def create_config(url: str):
+  return ConfigFactory.from_yaml_str(f"""
+version: "1.0.0"
+pages:
+- urls: ["{url}"]
+  url_selectors:
+    key: links
+    selector: a
+  selectors:
+    key: title
+    selector: h1
+""")
+
+
+class RecordingValidatorCache(ValidatorCache):
+
+  def __init__(self):
+    self.validators = {}
+
+  def get(self, url: str) -> dict | None:
+    return self.validators.get(url)
+
+  def store(self, url: str, validators: dict, ttl=None) -> None:
+    self.validators[url] = validators
+
+  def create(self):
+    return self
+
+
+class RecordingNotifier(Notifier):
+
+  def __init__(self):
+    self.notifications = []
+
+  def send_done_notification(self, ids: list[dict]):
+    self.notifications.append(ids)
+
+
+def create_fake_worker(marker_dir):
+  """
+  Follows the protocol of the scraper processes without downloading anything. Every config finds 3 articles
+  on a listing page with an ETag. The articles with 'crash' in their url kill the process the first time, the second ones
+  of the configs with 'lost' in their url kill it before it announces them, the second ones of the 'hang' configs never finish,
+  and the ones of the configs with 'fail' in their url aren't stored.
+  """
+  def get_marker(task: ScrapeTask) -> str:
+    return os.path.join(marker_dir, task.article_url.replace("/", "_"))
+
+  def scrape_tasks_from_queues(self, configs, scrape_options_kwargs_list, work_queues, worker_index, output_queue, parser_queues=None):
+    while True:
+      item = work_queues.get_nowait(worker_index)
+      if item is None:
+        time.sleep(0.01)
+        continue
+
+      task_id, task = item
+      if task_id is None:
+        return
+
+      if task.article_url is not None and "lost" in task.article_url and task.article_url.endswith("/1"):
+        # let the queue send the messages of the previous tasks
+        time.sleep(0.1)
+        os._exit(1)
+
+      output_queue.put((Scraper.message_started, task_id, worker_index))
+      if task.article_url is None:
+        url = configs[task.config_index].scrape_configs[task.scrape_config_index].urls[0]
+        for i in range(3):
+          output_queue.put((Scraper.message_found, task_id, ScrapeTask(task.config_index, task.scrape_config_index, f"{url}/{i}", url)))
+        output_queue.put((Scraper.message_listed, task_id, (url, {"etag": "1", "last_modified": None})))
+        output_queue.put((Scraper.message_done, task_id, []))
+        continue
+
+      if "crash" in task.article_url and not os.path.exists(get_marker(task)):
+        open(get_marker(task), "w").close()
+        # let the queue send the 'started' message
+        time.sleep(0.1)
+        os._exit(1)
+      if "hang" in task.article_url and task.article_url.endswith("/1"):
+        time.sleep(1000)
+      if "fail" in task.article_url and task.article_url.endswith("/1"):
+        output_queue.put((Scraper.message_done, task_id, []))
+        continue
+      output_queue.put((Scraper.message_done, task_id, [{"id": task.article_url}]))
+
+  return scrape_tasks_from_queues
+
+
+class TestScraperManager:
+
+  def test_tasks_of_dead_process_are_run_again(self, monkeypatch, tmp_path):
+    monkeypatch.setattr(Scraper, "scrape_tasks_from_queues", create_fake_worker(str(tmp_path)))
+    notifier = RecordingNotifier()
+    manager = ScraperManager(notifier, task_timeout=10)
+    manager.supervise_interval = 0.05
+
+    manager.scrape([create_config("https://crash.test")], [{"log_level": 20}])
+
+    assert len(notifier.notifications) == 1
+    assert sorted(m["id"] for m in notifier.notifications[0]) == [f"https://crash.test/{i}" for i in range(3)]
+
+  def test_task_taken_by_dead_process_is_given_up_with_its_run(self, monkeypatch, tmp_path):
+    monkeypatch.setattr(Scraper, "scrape_tasks_from_queues", create_fake_worker(str(tmp_path)))
+    notifier = RecordingNotifier()
+    manager = ScraperManager(notifier, task_timeout=10, run_timeout=1)
+    manager.supervise_interval = 0.05
+
+    manager.scrape([create_config("https://lost.test")], [{"log_level": 20}])
+
+    # the manager doesn't know the process took the unannounced article, it isn't run again
+    assert sorted(m["id"] for m in notifier.notifications[0]) == ["https://lost.test/0", "https://lost.test/2"]
+
+  def test_stuck_process_is_killed(self, monkeypatch, tmp_path):
+    monkeypatch.setattr(Scraper, "scrape_tasks_from_queues", create_fake_worker(str(tmp_path)))
+    notifier = RecordingNotifier()
+    manager = ScraperManager(notifier, task_timeout=0.1)
+    manager.supervise_interval = 0.05
+    manager.stuck_grace = 0.1
+
+    start = time.monotonic()
+    manager.scrape([create_config("https://hang.test")], [{"log_level": 20}])
+
+    # the stuck article is given up after it's tried twice
+    assert time.monotonic() - start < 5
+    assert sorted(m["id"] for m in notifier.notifications[0]) == ["https://hang.test/0", "https://hang.test/2"]
+
+  def test_run_is_abandoned_after_its_timeout(self, monkeypatch, tmp_path):
+    monkeypatch.setattr(Scraper, "scrape_tasks_from_queues", create_fake_worker(str(tmp_path)))
+    notifier = RecordingNotifier()
+    manager = ScraperManager(notifier, task_timeout=0.3, run_timeout=0.2)
+    manager.supervise_interval = 0.05
+    manager.stuck_grace = 0.1
+
+    start = time.monotonic()
+    manager.scrape([create_config("https://hang.test")], [{"log_level": 20}])
+
+    # the only process is stuck on the second article, the hung process is killed when stopping
+    assert time.monotonic() - start < 2
+    assert [m["id"] for m in notifier.notifications[0]] == ["https://hang.test/0"]
+
+  def test_validators_are_stored_after_the_articles(self, monkeypatch, tmp_path):
+    monkeypatch.setattr(Scraper, "scrape_tasks_from_queues", create_fake_worker(str(tmp_path)))
+    validator_cache = RecordingValidatorCache()
+    manager = ScraperManager(RecordingNotifier(), task_timeout=10)
+    manager.supervise_interval = 0.05
+
+    kwargs = {"log_level": 20, "validator_cache_factory": validator_cache}
+    manager.scrape([create_config("https://ok.test"), create_config("https://fail.test")], [kwargs, kwargs])
+
+    # the listing page with the failed article is downloaded again by the next run
+    assert validator_cache.validators == {"https://ok.test": {"etag": "1", "last_modified": None}}
@@ -0,0 +1,101 @@
+from http import client
+import pytest
+from utils.http_archive import HttpArchiveWriter, HttpArchiveReader, RecordingHttpPool, ReplayHttpPool
+from utils.http_utils import BodyPolicy, BodyTooLargeException, HttpResponse
+
+
+def create_headers(headers: dict) -> client.HTTPMessage:
+  message = client.HTTPMessage()
+  for k, v in headers.items():
+    message[k] = v
+  return message
+
+
+class FakeHttpPool:
+
+  def __init__(self, responses: dict):
+    self.responses = responses
+
+  def request(self, url: str, headers: dict[str, str] = None) -> HttpResponse:
+    response_headers, body = self.responses[url]
+    if headers is not None and headers.get("If-None-Match") == response_headers.get("ETag"):
+      return HttpResponse.from_bytes(url, 304, "Not Modified", create_headers(response_headers), b"")
+    return HttpResponse.from_bytes(url, 200, "OK", create_headers(response_headers), body)
+
+  def close(self) -> None:
+    pass
+
+
+class TestHttpArchive:
+
+  def test_replays_recorded_responses(self, tmp_path):
+    writer = HttpArchiveWriter(str(tmp_path), segment_size=512)
+    for i in range(10):
+      headers = create_headers({"Content-Type": "text/html", "Content-Encoding": "gzip", "ETag": f'"{i}"'})
+      body = f"<html><p>article {i}</p></html>".encode() * 10
+      writer.write(f"https://a.com/{i}", f"https://a.com/final/{i}", 200, "OK", headers, body)
+    writer.close()
+
+    # small segments force multiple segment files
+    assert len(list(tmp_path.glob("segment-*.warc.gz"))) > 1
+
+    pool = ReplayHttpPool(HttpArchiveReader(str(tmp_path)))
+    for i in range(10):
+      res = pool.request(f"https://a.com/{i}")
+      assert res.url == f"https://a.com/final/{i}"
+      assert res.status == 200
+      assert res.headers["ETag"] == f'"{i}"'
+      # bodies are archived decompressed
+      assert res.headers.get("Content-Encoding") is None
+      assert res.text() == f"<html><p>article {i}</p></html>" * 10
+
+  def test_latest_record_wins(self, tmp_path):
+    writer = HttpArchiveWriter(str(tmp_path))
+    writer.write("https://a.com/", "https://a.com/", 503, "Service Unavailable", create_headers({}), b"")
+    writer.write("https://a.com/", "https://a.com/", 200, "OK", create_headers({}), b"<html></html>")
+    writer.close()
+
+    reader = HttpArchiveReader(str(tmp_path))
+    assert len(reader) == 1
+    assert reader.get("https://a.com/")[1] == 200
+    assert reader.get("https://b.com/") is None
+
+  def test_recording_follows_the_body_policy(self, tmp_path):
+    pool = FakeHttpPool({
+      "https://a.com/page": ({"Content-Type": "text/html"}, b"<html></html>"),
+      "https://a.com/image": ({"Content-Type": "image/png"}, b"png"),
+      "https://a.com/large": ({"Content-Type": "text/html"}, b"x" * 100),
+    })
+    recording_pool = RecordingHttpPool(pool, HttpArchiveWriter(str(tmp_path)), BodyPolicy(max_size=50))
+
+    assert recording_pool.request("https://a.com/page").read() == b"<html></html>"
+    # rejected by the content type, only the headers are archived
+    assert recording_pool.request("https://a.com/image").read() == b""
+    with pytest.raises(BodyTooLargeException):
+      recording_pool.request("https://a.com/large")
+    recording_pool.close()
+
+    reader = HttpArchiveReader(str(tmp_path))
+    assert len(reader) == 2
+    assert reader.get("https://a.com/image")[3]["Content-Type"] == "image/png"
+    assert reader.get("https://a.com/large") is None
+
+  def test_conditional_requests_are_answered_from_the_archive(self, tmp_path):
+    pool = FakeHttpPool({"https://a.com/": ({"Content-Type": "text/html", "ETag": '"1"'}, b"<html></html>")})
+    recording_pool = RecordingHttpPool(pool, HttpArchiveWriter(str(tmp_path)), BodyPolicy())
+
+    res = recording_pool.request("https://a.com/", {"If-None-Match": '"1"'})
+    assert res.status == 304
+    assert res.read() == b""
+    recording_pool.close()
+
+    # the whole response is archived, not the 304
+    reader = HttpArchiveReader(str(tmp_path))
+    assert reader.get("https://a.com/")[1] == 200
+
+    replay_pool = ReplayHttpPool(reader)
+    assert replay_pool.request("https://a.com/").read() == b"<html></html>"
+    assert replay_pool.request("https://a.com/", {"If-None-Match": '"0"'}).read() == b"<html></html>"
+    res = replay_pool.request("https://a.com/", {"If-None-Match": '"1"'})
+    assert res.status == 304
+    assert res.headers["ETag"] == '"1"'
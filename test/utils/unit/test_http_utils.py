@@ -0,0 +1,127 @@
+import codecs
+import gzip
+import io
+from http import client
+import zlib
+import brotli
+import pytest
+from utils.http_utils import HttpResponse, HttpException, BodyTooLargeException, ContentTypeException, BodyPolicy, detect_charset
+
+class FakeHTTPResponse:
+
+  def __init__(self, body: bytes, headers: dict):
+    self.status = 200
+    self.reason = "OK"
+    self.headers = headers
+    self.will_close = False
+    self.__body = io.BytesIO(body)
+
+  def read(self, amt: int = None) -> bytes:
+    return self.__body.read(amt)
+
+  def close(self):
+    pass
+
+
+def create_headers(headers: dict) -> client.HTTPMessage:
+  message = client.HTTPMessage()
+  for k, v in headers.items():
+    message[k] = v
+  return message
+
+
+def raw_deflate(data: bytes) -> bytes:
+  compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+  return compressor.compress(data) + compressor.flush()
+
+
+class TestHttpResponse:
+
+  html = ("<html><p>" + "foo bar baz " * 20000 + "</p></html>").encode()
+
+  @pytest.mark.parametrize("content_encoding, encode", [
+    (None, lambda b: b),
+    ("identity", lambda b: b),
+    ("gzip", gzip.compress),
+    ("deflate", zlib.compress),
+    # raw deflate stream without the zlib header
+    ("deflate", raw_deflate),
+    ("br", brotli.compress),
+    # multiple encodings are applied in the listed order
+    ("deflate, gzip", lambda b: gzip.compress(zlib.compress(b))),
+  ])
+  def test_body_is_decompressed(self, content_encoding: str, encode):
+    headers = {} if content_encoding is None else {"Content-Encoding": content_encoding}
+    released = []
+    res = HttpResponse("http://test", FakeHTTPResponse(encode(self.html), headers), released.append)
+
+    assert res.read() == self.html
+    # fully read responses give their connection back to the pool
+    assert released == [True]
+
+  def test_chunks_are_streamed(self):
+    # uncompressed gzip blocks, so the body spans multiple network chunks
+    body = gzip.compress(self.html, compresslevel=0)
+    res = HttpResponse("http://test", FakeHTTPResponse(body, {"Content-Encoding": "gzip"}), lambda _: None)
+    chunks = list(res.iter_chunks())
+    assert len(chunks) > 1
+    assert b"".join(chunks) == self.html
+
+  def test_unsupported_encoding_raises(self):
+    released = []
+    res = HttpResponse("http://test", FakeHTTPResponse(b"foo", {"Content-Encoding": "compress"}), released.append)
+    with pytest.raises(HttpException):
+      res.read()
+    assert released == [False]
+
+  def test_corrupt_body_raises(self):
+    res = HttpResponse("http://test", FakeHTTPResponse(b"not gzip", {"Content-Encoding": "gzip"}), lambda _: None)
+    with pytest.raises(HttpException):
+      res.read()
+
+  def test_body_larger_than_max_size_is_aborted(self):
+    released = []
+    body = gzip.compress(self.html, compresslevel=0)
+    res = HttpResponse("http://test", FakeHTTPResponse(body, {"Content-Encoding": "gzip"}), released.append)
+    chunks = res.iter_chunks(max_size=100000)
+    with pytest.raises(BodyTooLargeException):
+      for _ in chunks:
+        pass
+    # the rest of the body is not downloaded, the connection can't be reused
+    assert released == [False]
+
+  def test_content_length_larger_than_max_size_is_not_read(self):
+    res = HttpResponse("http://test", FakeHTTPResponse(self.html, {"Content-Length": str(len(self.html))}), lambda _: None)
+    with pytest.raises(BodyTooLargeException):
+      res.read(max_size=100)
+
+  def test_content_type_not_allowed(self):
+    released = []
+    res = HttpResponse("http://test", FakeHTTPResponse(b"%PDF", create_headers({"Content-Type": "application/pdf"})), released.append)
+    with pytest.raises(ContentTypeException):
+      BodyPolicy().read_text(res)
+    assert released == [False]
+
+  @pytest.mark.parametrize("headers, body, expected_charset", [
+    ({}, "<html>ă</html>".encode("utf-8"), "utf-8"),
+    ({"Content-Type": "text/html; charset=ISO-8859-2"}, "<html>ă</html>".encode("iso-8859-2"), "iso-8859-2"),
+    # latin-1 is decoded as windows-1252 like browsers do
+    ({"Content-Type": "text/html; charset=iso-8859-1"}, "<html>€</html>".encode("cp1252"), "cp1252"),
+    ({}, '<html><head><meta charset="windows-1250"></head>ă</html>'.encode("cp1250"), "windows-1250"),
+    ({}, '<html><head><meta http-equiv="Content-Type" content="text/html; charset=koi8-r"></head>я</html>'.encode("koi8-r"), "koi8-r"),
+    # the header wins over the meta tag
+    ({"Content-Type": "text/html; charset=utf-8"}, '<html><meta charset="iso-8859-2">ă</html>'.encode("utf-8"), "utf-8"),
+    ({"Content-Type": "text/html; charset=unknown"}, "<html>ă</html>".encode("utf-8"), "utf-8"),
+    ({}, codecs.BOM_UTF8 + "<html>ă</html>".encode("utf-8"), "utf-8-sig"),
+  ])
+  def test_charset_detection(self, headers: dict, body: bytes, expected_charset: str):
+    assert detect_charset(create_headers(headers), body) == expected_charset
+
+    # pad the body so the charset is detected from the first chunk only
+    padded = body + b" " * 200000
+    res = HttpResponse("http://test", FakeHTTPResponse(padded, create_headers(headers)), lambda _: None)
+    assert res.text() == padded.decode(expected_charset)
+
+  def test_invalid_characters_are_replaced(self):
+    res = HttpResponse("http://test", FakeHTTPResponse(b"<html>\xff</html>", create_headers({})), lambda _: None)
+    assert res.text() == "<html>�</html>"